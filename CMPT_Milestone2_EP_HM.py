@@ -3,9 +3,35 @@
 # Programming Project - Milestone#2
 # -------------------------------
 
+from __future__ import annotations
+
+import argparse
+import json
+import os
 import pickle
-from datetime import date
-from graphics4 import *
+import queue
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, TextIO
+from geometry import GridClusters, SpatialGrid, build_distance_index, segment_at_distance, simplify
+from heatmap import heatmap_png, sample_line
+import metrics
+from memory import deep_size, format_size, traced_size
+from profiling import CommandProfiler
+from tracing import FrameTracer
+from renderer import RasterCanvas, SvgCanvas
+
+# graphics4 is only imported once the interactive map is opened,
+# so the menu and command line start without loading Tk
+if TYPE_CHECKING:
+    from graphics4 import Entry, GraphWin, Image, LayerManager, Point, Rectangle, Text
+
+# Called by the loaders with the number of characters and rows read so far
+Progress = Callable[[int, int], None]
 
 
 class SrtParser:
@@ -276,20 +302,46 @@ class Route:
 
 
 class Disruption:
-    """Holds the coordinates of a disruption point and its finish date"""
+    """Holds the coordinates of a disruption point and its start and finish dates"""
 
-    def __init__(self, finish_date: date, coords: Coordinates):
+    def __init__(self, finish_date: date, coords: Coordinates, start_date: date | None = None):
         """
         purpose:
             Constructs a Disruption object
         parameters:
             finish_date: The initialized finish date
             coords: The initialized Coordinate point
+            start_date: The initialized start date. None if the start date is unknown.
         returns:
             None
         """
         self.finish_date = finish_date
         self.coords = coords
+        self.start_date = start_date
+
+    def is_in_effect(self, day: date) -> bool:
+        """
+        purpose:
+            Checks whether the disruption is in effect on a day, from its start date through its finish date,
+            the same as DisruptionTimeline
+        parameters:
+            day: The day to check
+        returns:
+            Returns True if the disruption is in effect. Disruptions without a start date count as started.
+        """
+        return (self.start_date or date.min) <= day <= self.finish_date
+
+    def __setstate__(self, state: dict) -> None:
+        """
+        purpose:
+            Restores a pickled Disruption, including ones saved before start dates were kept
+        parameters:
+            state: The pickled attributes
+        returns:
+            None
+        """
+        self.start_date = None
+        self.__dict__.update(state)
 
     def __repr__(self) -> str:
         return (
@@ -297,9 +349,263 @@ class Disruption:
         )
 
 
+class DisruptionTimeline:
+    """Tracks which disruptions are in effect on a chosen day. Every start and finish is kept in one
+    date-sorted event list, so moving the day only visits the disruptions that start or finish
+    between the old and new days."""
+
+    def __init__(self, disruptions: Iterable[Disruption], day: date):
+        """
+        purpose:
+            Constructs a DisruptionTimeline object
+        parameters:
+            disruptions: The disruptions to track
+            day: The first chosen day
+        returns:
+            None
+        """
+        self.disruptions = list(disruptions)
+        # Each event is (day, index, starts). A disruption is in effect from its start date
+        # through its finish date, so it leaves on the day after it finishes.
+        events: list[tuple[date, int, bool]] = []
+        for i, disruption in enumerate(self.disruptions):
+            events.append((disruption.start_date or date.min, i, True))
+            if disruption.finish_date < date.max:
+                events.append((disruption.finish_date + timedelta(days=1), i, False))
+        events.sort()
+        self.events = events
+        self.event_days = [event[0] for event in events]
+        # The disruptions in effect once the first applied events have happened
+        self.active: set[int] = set()
+        self.applied = 0
+        self.day = day
+        self.set_day(day)
+
+    def set_day(self, day: date) -> tuple[list[int], list[int]]:
+        """
+        purpose:
+            Moves the chosen day, updating the disruptions in effect
+        parameters:
+            day: The new day
+        returns:
+            The sorted indices of the disruptions that came into effect and of those that stopped being in effect
+        """
+        old = self.applied
+        new = bisect_right(self.event_days, day)
+        # Remembers whether each visited disruption was in effect before the move
+        before: dict[int, bool] = {}
+        if new > old:
+            for _, i, starts in self.events[old:new]:
+                before.setdefault(i, i in self.active)
+                if starts:
+                    self.active.add(i)
+                else:
+                    self.active.discard(i)
+        else:
+            # Moving back in time undoes the events in reverse order
+            for _, i, starts in reversed(self.events[new:old]):
+                before.setdefault(i, i in self.active)
+                if starts:
+                    self.active.discard(i)
+                else:
+                    self.active.add(i)
+        self.applied = new
+        self.day = day
+
+        added = sorted(i for i, was in before.items() if not was and i in self.active)
+        removed = sorted(i for i, was in before.items() if was and i not in self.active)
+        return added, removed
+
+    def get_bounds(self) -> tuple[date, date] | None:
+        """
+        purpose:
+            Gets the earliest start date and the latest finish date of the disruptions
+        parameters:
+            None
+        returns:
+            A tuple of both dates. Returns None if no disruption has a start date.
+        """
+        starts = [disruption.start_date for disruption in self.disruptions if disruption.start_date]
+        if not starts:
+            return None
+        return min(starts), max(disruption.finish_date for disruption in self.disruptions)
+
+
+class LoadStats:
+    """Measurements of loading one data file. The parse, convert and build phases are timed on every
+    sample_every-th row only and scaled up to every row, so measuring costs almost nothing."""
+
+    sample_every = 32
+
+    def __init__(self, path: str):
+        """
+        purpose:
+            Constructs a LoadStats object and starts its clocks
+        parameters:
+            path: The path of the loaded file
+        returns:
+            None
+        """
+        self.path = path
+        self.rows = 0
+        self.bytes_read = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        # How many bytes the process's resident memory grew during the load. None where it can't be measured.
+        self.rss_growth: int | None = None
+        # Maps each phase with the seconds spent in it. Row phases hold the sampled time until finish.
+        self.phases: dict[str, float] = {"parse": 0.0, "convert": 0.0, "build": 0.0}
+        self.samples = 0
+        self.__rss_start = LoadStats.get_rss()
+        self.__wall_start = time.perf_counter()
+        self.__cpu_start = time.process_time()
+
+    def __setstate__(self, state: dict) -> None:
+        """
+        purpose:
+            Restores pickled LoadStats, including ones saved before the memory growth was kept
+        parameters:
+            state: The pickled attributes
+        returns:
+            None
+        """
+        self.rss_growth = None
+        self.__dict__.update(state)
+
+    def __repr__(self) -> str:
+        return f"LoadStats({self.path!r}, rows={self.rows}, wall_time={self.wall_time:.3f})"
+
+    def sample(self, parse: float, convert: float, build: float) -> None:
+        """
+        purpose:
+            Adds the phase times of one sampled row
+        parameters:
+            parse: Seconds spent splitting the line into fields
+            convert: Seconds spent converting fields into numbers and dates
+            build: Seconds spent creating and storing objects
+        returns:
+            None
+        """
+        self.phases["parse"] += parse
+        self.phases["convert"] += convert
+        self.phases["build"] += build
+        self.samples += 1
+
+    def finish(self, rows: int, bytes_read: int, **phases: float) -> None:
+        """
+        purpose:
+            Stops the clocks and scales the sampled phase times up to every row
+        parameters:
+            rows: The number of rows parsed, not counting the header
+            bytes_read: The number of bytes read from the file
+            phases: The seconds spent in phases that aren't per row, such as building indices
+        returns:
+            None
+        """
+        self.wall_time = time.perf_counter() - self.__wall_start
+        self.cpu_time = time.process_time() - self.__cpu_start
+        self.rows = rows
+        self.bytes_read = bytes_read
+        if self.samples:
+            scale = rows / self.samples
+            for phase in ("parse", "convert", "build"):
+                self.phases[phase] *= scale
+        self.phases.update(phases)
+        rss_end = LoadStats.get_rss()
+        if self.__rss_start is not None and rss_end is not None:
+            self.rss_growth = rss_end - self.__rss_start
+
+    def rows_per_second(self) -> float:
+        return self.rows / self.wall_time if self.wall_time else 0.0
+
+    def bytes_per_second(self) -> float:
+        return self.bytes_read / self.wall_time if self.wall_time else 0.0
+
+    def to_dict(self) -> dict:
+        """
+        purpose:
+            Converts the measurements into a dictionary for logging or JSON
+        parameters:
+            None
+        returns:
+            A dictionary of every measurement
+        """
+        return {
+            "path": self.path,
+            "rows": self.rows,
+            "bytes": self.bytes_read,
+            "wall_seconds": self.wall_time,
+            "cpu_seconds": self.cpu_time,
+            "rows_per_second": self.rows_per_second(),
+            "bytes_per_second": self.bytes_per_second(),
+            "rss_growth_bytes": self.rss_growth,
+            "phases": dict(self.phases),
+        }
+
+    def summary(self) -> list[str]:
+        """
+        purpose:
+            Describes the measurements for printing after a load
+        parameters:
+            None
+        returns:
+            A list of lines
+        """
+        megabytes = 1024 * 1024
+        lines = [
+            f"Read {self.rows} rows ({self.bytes_read / megabytes:.1f} MB) in {self.wall_time:.2f} s "
+            f"({self.cpu_time:.2f} s CPU): {self.rows_per_second():.0f} rows/s, "
+            f"{self.bytes_per_second() / megabytes:.1f} MB/s"
+        ]
+        phases = ", ".join(f"{phase} {seconds:.2f} s" for phase, seconds in self.phases.items())
+        if self.rss_growth is None:
+            lines.append(f"Phases: {phases}")
+        else:
+            lines.append(f"Phases: {phases}; memory grew {self.rss_growth / megabytes:.1f} MB")
+        return lines
+
+    @staticmethod
+    def get_rss() -> int | None:
+        """
+        purpose:
+            Gets the amount of memory the process holds now
+        parameters:
+            None
+        returns:
+            The resident set size in bytes. Returns None where /proc/self/statm doesn't exist (only Linux has it).
+        """
+        try:
+            with open("/proc/self/statm") as f:
+                pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        return pages * os.sysconf("SC_PAGE_SIZE")
+
+    @staticmethod
+    def get_peak_rss() -> int | None:
+        """
+        purpose:
+            Gets the largest amount of memory the process has held so far
+        parameters:
+            None
+        returns:
+            The peak resident set size in bytes. Returns None where the resource module doesn't exist (Windows).
+        """
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes and macOS reports bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
 class RouteData:
     """Provides an interface to load and access routes, shape IDs, and disruption data"""
 
+    # Loaders given a progress callback call it after this many rows
+    progress_rows = 10000
+
     def __init__(self):
         """
         purpose:
@@ -313,43 +619,122 @@ class RouteData:
         self.__routes: dict[str, Route] = {}
         # Maps the shape ID with its corresponding Shape object
         self.__shape_ids: dict[str, Shape] = {}
+        # Maps the shape ID with the distance travelled at each of its coordinates
+        self.__shape_distances: dict[str, array] = {}
         self.__disruptions: set[Disruption] = set()
+        # Maps a ranking name with its (ID, value) pairs presorted from largest to smallest.
+        # Built on the first ranking query and cleared whenever routes or shapes are reloaded.
+        self.__rankings: dict[str, list[tuple[str, float]]] = {}
+        # Maps "trips", "shapes" and "disruptions" with the measurements of their latest load
+        self.__load_stats: dict[str, LoadStats] = {}
+
+    def __setstate__(self, state: dict) -> None:
+        """
+        purpose:
+            Restores a pickled RouteData object.
+            Attributes missing from older pickles keep the defaults set by the constructor.
+        parameters:
+            state: The pickled attribute dictionary
+        returns:
+            None
+        """
+        self.__init__()
+        self.__dict__.update(state)
 
     def __repr__(self) -> str:
         return f"RouteData: Routes: {self.routes_loaded()}, Shape IDs: {self.shapes_loaded()}, Disruptions: {self.disruptions_loaded()}"
 
-    def load_trips_data(self, trips_path: str) -> None:
+    def load_trips_data(self, trips_path: str, progress: Progress | None = None) -> None:
         """
         purpose:
             Attempts to load the trips data file. Raises an IOError exception if trips_path is invalid.
         parameter:
             trips_path: A string pointing to a path to a trips data file.
+            progress: Called with the characters and rows read so far while the file is parsed
         return:
             None
         """
-        self.__routes = self.__load_trips_data(trips_path)
+        stats = LoadStats(trips_path)
+        routes, rows, bytes_read = self.__load_trips_data(trips_path, progress, stats)
+        stats.finish(rows, bytes_read)
+        self.__routes = routes
+        self.__rankings = {}
+        self.__load_stats["trips"] = stats
 
-    def load_shapes_data(self, shapes_path: str) -> None:
+    def load_shapes_data(self, shapes_path: str, progress: Progress | None = None) -> None:
         """
         purpose:
             Attempts to load the shapes data file. Raises an IOError exception if shapes_path is invalid.
         parameter:
             shapes_path: The file path to the shapes data file.
+            progress: Called with the characters and rows read so far while the file is parsed
         return:
             None
         """
-        self.__shape_ids = self.__load_shapes_data(shapes_path)
+        stats = LoadStats(shapes_path)
+        shape_ids, rows, bytes_read = self.__load_shapes_data(shapes_path, progress, stats)
+        start = time.perf_counter()
+        shape_distances = self.__build_shape_distances(shape_ids)
+        stats.finish(rows, bytes_read, index=time.perf_counter() - start)
+        # Everything is built before it is assigned, and the distances before the shapes,
+        # so a background load never shows the map shapes without their distances
+        self.__shape_distances = shape_distances
+        self.__shape_ids = shape_ids
+        self.__rankings = {}
+        self.__load_stats["shapes"] = stats
 
-    def load_disruptions_data(self, disruptions_path: str) -> None:
+    def load_disruptions_data(self, disruptions_path: str, progress: Progress | None = None) -> None:
         """
         purpose:
             Attempts to load the disruptions data file. Raises an IOError exception if disruptions_path is invalid.
         parameter:
             disruptions_path: The file path to the disruptions data file.
+            progress: Called with the characters and rows read so far while the file is parsed
         return:
             None
         """
-        self.__disruptions = self.__load_disruptions_data(disruptions_path)
+        stats = LoadStats(disruptions_path)
+        disruptions, rows, bytes_read = self.__load_disruptions_data(disruptions_path, progress, stats)
+        stats.finish(rows, bytes_read)
+        self.__disruptions = disruptions
+        self.__load_stats["disruptions"] = stats
+
+    def load_stats(self) -> dict[str, LoadStats]:
+        """
+        purpose:
+            Gets the measurements of the latest load of each data file
+        parameters:
+            None
+        returns:
+            A dictionary mapping "trips", "shapes" and "disruptions" with a LoadStats object.
+            Files that haven't been loaded are left out.
+        """
+        return dict(self.__load_stats)
+
+    def memory_parts(self) -> dict[str, tuple[object, int, str]]:
+        """
+        purpose:
+            Gets each part of the loaded data, so the memory of each can be measured.
+            Indexes and caches are only included once a query has built them.
+        parameters:
+            None
+        returns:
+            A dictionary mapping each part name with the structure holding it,
+            how many entities it holds, and what the entities are
+        """
+        coordinates = sum(len(shape.coordinates) for shape in self.__shape_ids.values())
+        return {
+            "routes": (self.__routes, len(self.__routes), "routes"),
+            "shape coordinates": (self.__shape_ids, coordinates, "coordinates"),
+            "disruptions": (self.__disruptions, len(self.__disruptions), "disruptions"),
+            "distance index": (
+                self.__shape_distances,
+                sum(map(len, self.__shape_distances.values())),
+                "distances",
+            ),
+            "rankings": (self.__rankings, sum(map(len, self.__rankings.values())), "entries"),
+            "load stats": (self.__load_stats, len(self.__load_stats), "files"),
+        }
 
     def get_routes(self) -> list[Route] | None:
         """
@@ -441,6 +826,99 @@ class RouteData:
         largest = max(tracker)
         return tracker[largest], largest
 
+    def get_shape_length(self, shape_id: str) -> float | None:
+        """
+        purpose:
+            Returns the distance along a shape from its first to its last coordinate.
+        parameter:
+            shape_id: The shape ID to get the length of.
+        return:
+            Returns the length of the shape in kilometres. Returns None if the shape_id does not exist.
+        """
+        distances = self.__get_shape_distances(shape_id)
+        if distances is None:
+            return None
+        if not distances:
+            return 0.0
+        return distances[-1]
+
+    def get_position_at_distance(self, shape_id: str, distance: float) -> Coordinates | None:
+        """
+        purpose:
+            Returns the point that lies a distance along a shape.
+        parameter:
+            shape_id: The shape ID to travel along.
+            distance: The distance in kilometres from the start of the shape.
+        return:
+            Returns the interpolated Coordinates. Returns None if the shape_id does not exist.
+        """
+        distances = self.__get_shape_distances(shape_id)
+        if not distances:
+            return None
+        # Only the two points around the distance are read, instead of converting the whole shape
+        coordinates = self.__shape_ids[shape_id].coordinates
+        i, t = segment_at_distance(distances, distance)
+        lat1, lon1 = coordinates[i].get_coords()
+        if t == 0:
+            return Coordinates(lat1, lon1)
+        lat2, lon2 = coordinates[i + 1].get_coords()
+        return Coordinates(lat1 + (lat2 - lat1) * t, lon1 + (lon2 - lon1) * t)
+
+    def get_longest_shape_by_distance_from_route_id(
+        self, route_id: str
+    ) -> tuple[str, float] | None:
+        """
+        purpose:
+            Returns the shape_id, and length in kilometres of the longest shape associated with the route_id.
+        parameter:
+            route_id: The route ID to search the longest shape for.
+        return:
+            Returns the shape_id string and its length in kilometres as a tuple. Returns None if the route_id does not exist.
+        """
+        shape_ids = self.get_shape_ids_from_route_id(route_id)
+        if not shape_ids:
+            return None
+
+        longest: tuple[str, float] | None = None
+        for shape_id in shape_ids:
+            length = self.get_shape_length(shape_id)
+            if length is None:
+                continue
+            if longest is None or length > longest[1]:
+                longest = shape_id, length
+        return longest
+
+    def get_top_shapes(self, k: int, by: str = "distance") -> list[tuple[str, float]]:
+        """
+        purpose:
+            Returns the k longest shapes across every route.
+        parameter:
+            k: The number of shapes to return.
+            by: "distance" to measure shapes in kilometres, or "coordinates" to count their points.
+        return:
+            Returns a list of (shape_id, length) tuples from longest to shortest.
+            Raises a ValueError if k is negative or by is not a known ranking.
+        """
+        if k < 0:
+            raise ValueError(f"Can't return {k} shapes")
+        if by not in ("distance", "coordinates"):
+            raise ValueError(f"Unknown shape ranking {by}")
+        return self.__get_ranking(f"shapes_by_{by}")[:k]
+
+    def get_top_routes_by_shape_count(self, k: int) -> list[tuple[str, int]]:
+        """
+        purpose:
+            Returns the k routes with the most shape variants.
+        parameter:
+            k: The number of routes to return.
+        return:
+            Returns a list of (route_id, shape count) tuples from most to fewest shapes.
+            Raises a ValueError if k is negative.
+        """
+        if k < 0:
+            raise ValueError(f"Can't return {k} routes")
+        return self.__get_ranking("routes_by_shape_count")[:k]
+
     def routes_loaded(self) -> bool:
         """
         purpose:
@@ -467,6 +945,17 @@ class RouteData:
             return True
         return False
 
+    def get_shape_count(self) -> int:
+        """
+        purpose:
+            Counts the loaded shapes.
+        parameter:
+            None
+        return:
+            Returns the number of shapes. Returns 0 if the shapes file has not been loaded.
+        """
+        return len(self.__shape_ids)
+
     def disruptions_loaded(self) -> bool:
         """
         purpose:
@@ -480,34 +969,151 @@ class RouteData:
             return True
         return False
 
+    def __get_shape_distances(self, shape_id: str) -> array | None:
+        """
+        purpose:
+            Gets the cumulative distance array of a shape.
+            The arrays are built on demand for RouteData objects that were pickled without them.
+        parameter:
+            shape_id: The shape ID to get the distance array of.
+        return:
+            Returns the distance array. Returns None if the shape_id does not exist.
+        """
+        shapes = self.__shape_ids
+        if shape_id not in shapes:
+            return None
+        distances = self.__shape_distances
+        if shape_id not in distances:
+            distances = self.__shape_distances = self.__build_shape_distances(shapes)
+        return distances[shape_id]
+
+    def __get_ranking(self, name: str) -> list[tuple[str, float]]:
+        """
+        purpose:
+            Gets a presorted ranking, building every ranking the first time one is asked for.
+            Queries after the build only slice the front of a list.
+        parameter:
+            name: The name of the ranking.
+        return:
+            Returns the list of (ID, value) tuples sorted from largest to smallest value.
+        """
+        if not self.__rankings:
+            self.__rankings = self.__build_rankings()
+        return self.__rankings[name]
+
+    def __build_rankings(self) -> dict[str, list[tuple[str, float]]]:
+        """
+        purpose:
+            Sorts every shape and route once for the ranking queries.
+            Ties are broken by ID so the results are always in the same order.
+        parameter:
+            None
+        return:
+            Returns a dictionary with the ranking name as key and its sorted (ID, value) tuples as value.
+        """
+
+        def ranked(pairs) -> list[tuple[str, float]]:
+            return sorted(pairs, key=lambda pair: (-pair[1], pair[0]))
+
+        return {
+            "shapes_by_distance": ranked(
+                (shape_id, self.get_shape_length(shape_id)) for shape_id in self.__shape_ids
+            ),
+            "shapes_by_coordinates": ranked(
+                (shape_id, len(shape.coordinates)) for shape_id, shape in self.__shape_ids.items()
+            ),
+            "routes_by_shape_count": ranked(
+                (route_id, len(route.shape_ids)) for route_id, route in self.__routes.items()
+            ),
+        }
+
+    @staticmethod
+    def __build_shape_distances(shapes: dict[str, Shape]) -> dict[str, array]:
+        """
+        purpose:
+            Computes the cumulative distance arrays of every shape.
+        parameter:
+            shapes: The dictionary mapping shape IDs with Shape objects
+        return:
+            Returns a dictionary with the shape ID as key and its distance array as value.
+        """
+        return build_distance_index(
+            {shape_id: [coord.get_coords() for coord in shape.coordinates] for shape_id, shape in shapes.items()}
+        )
+
+    @staticmethod
+    def __track_progress(f: TextIO, progress: Progress | None) -> Iterable[str]:
+        """
+        purpose:
+            Reads the remaining lines of a data file, reporting progress every progress_rows rows and at the end
+        parameters:
+            f: The open data file
+            progress: Called with the characters and rows read so far. The file is returned unchanged if None.
+        returns:
+            An iterable of the file's lines
+        """
+        if progress is None:
+            return f
+
+        def lines() -> Iterator[str]:
+            chars = f.tell()
+            rows = 0
+            for line in f:
+                chars += len(line)
+                rows += 1
+                if rows % RouteData.progress_rows == 0:
+                    progress(chars, rows)
+                yield line
+            progress(chars, rows)
+
+        return lines()
+
     # REMARK:
     # Does not check if trips_path points to a proper trips.txt.
     # May result in incorrect data being saved rather than raising an exception.
-    def __load_trips_data(self, trips_path: str) -> dict[str, Route]:
+    def __load_trips_data(
+        self, trips_path: str, progress: Progress | None, stats: LoadStats
+    ) -> tuple[dict[str, Route], int, int]:
         """
         purpose:
             Parses the trips data file and saves it.
         parameter:
             trips_path: A string pointing to a path to a trips data file.
+            progress: Called with the characters and rows read so far
+            stats: Receives the phase times of sampled rows
         return:
-            Returns a dictionary with the route id as key and a Route object as value.
+            Returns a dictionary with the route id as key and a Route object as value,
+            and the number of rows and bytes read from the trips file
         """
         routes_path = "data/routes.txt"
         routes: dict[str, Route] = {}
+        clock = time.perf_counter
+        sample_every = LoadStats.sample_every
+        rows = 0
 
         with open(trips_path) as f:
             f.readline()  # We skip the CSV header line
-            for line in f:
+            for line in self.__track_progress(f, progress):
+                rows += 1
+                sampled = rows % sample_every == 0
+                if sampled:
+                    start = clock()
                 spl = line.strip().split(",")
                 # Get the route_id and shape_id by index
                 route_id = spl[0]
                 shape_id = spl[6]
+                if sampled:
+                    parsed = clock()
                 if route_id in routes:
                     routes[route_id].set_shape_id(shape_id)
                 else:
                     route = Route(route_id)
                     route.set_shape_id(shape_id)
                     routes[route_id] = route
+                if sampled:
+                    # Every field is kept as a string, so nothing is converted
+                    stats.sample(parsed - start, 0.0, clock() - parsed)
+            bytes_read = f.tell()
 
         with open(routes_path) as f:
             f.readline()
@@ -520,144 +1126,254 @@ class RouteData:
                 # This can result in a KeyError exception when routes.txt has a route_id not in trips.txt
                 routes[route_id].set_route_name(route_name)
 
-        return routes
+        return routes, rows, bytes_read
 
-    def __load_shapes_data(self, shapes_path: str) -> dict[str, Shape]:
+    def __load_shapes_data(
+        self, shapes_path: str, progress: Progress | None, stats: LoadStats
+    ) -> tuple[dict[str, Shape], int, int]:
         """
         purpose:
             Parses the shapes data file and saves the shape IDs and its coordinate points.
         parameter:
             shapes_path: The file path to the shapes data file.
+            progress: Called with the characters and rows read so far
+            stats: Receives the phase times of sampled rows
         return:
-            None
+            The dictionary mapping shape IDs with Shape objects, and the number of rows and bytes read
         """
         shapes: dict[str, Shape] = {}
+        clock = time.perf_counter
+        sample_every = LoadStats.sample_every
+        rows = 0
         with open(shapes_path) as f:
             f.readline()  # Skip header line
-            for line in f:
+            for line in self.__track_progress(f, progress):
+                rows += 1
+                sampled = rows % sample_every == 0
+                if sampled:
+                    start = clock()
                 spl = line.strip().split(",")
                 shape_id = spl[0]
+                if sampled:
+                    parsed = clock()
                 # shapes.txt orders its coordinates by latitude, longitude
-                coord = Coordinates(float(spl[1]), float(spl[2]))
+                latitude, longitude = float(spl[1]), float(spl[2])
+                if sampled:
+                    converted = clock()
+                coord = Coordinates(latitude, longitude)
 
                 if shape_id in shapes:
                     shapes[shape_id].coordinates.append(coord)
                 else:
                     shapes[shape_id] = Shape(shape_id)
                     shapes[shape_id].coordinates.append(coord)
-        return shapes
+                if sampled:
+                    stats.sample(parsed - start, converted - parsed, clock() - converted)
+            bytes_read = f.tell()
+        return shapes, rows, bytes_read
 
-    def __load_disruptions_data(self, disruptions_path: str) -> set[Disruption]:
+    def __load_disruptions_data(
+        self, disruptions_path: str, progress: Progress | None, stats: LoadStats
+    ) -> tuple[set[Disruption], int, int]:
         """
         purpose:
             Parses the disruptions data file and saves the finish dates and coordinates of each disruption
         parameters:
             disruptions_path: The file path to the shapes data file
+            progress: Called with the characters and rows read so far
+            stats: Receives the phase times of sampled rows
         returns:
-            None
+            The set of Disruption objects, and the number of rows and bytes read
         """
         disruptions: set[Disruption] = set()
+        clock = time.perf_counter
+        sample_every = LoadStats.sample_every
+        rows = 0
         with open(disruptions_path) as f:
             f.readline()
-            for line in f:
+            for line in self.__track_progress(f, progress):
+                rows += 1
+                sampled = rows % sample_every == 0
+                if sampled:
+                    start = clock()
                 # First, parse the line into a list of strings
                 data = SrtParser.parse_line(line)
-                # Convert the finish date string to a date object
+                if sampled:
+                    parsed = clock()
+                # Convert the start and finish date strings to date objects
+                start_date = DateConvert.strtodate(data[2]) if data[2] else None
                 finish_date = DateConvert.strtodate(data[3])
                 # Convert the point string into a Coordinate object
                 coords = Coordinates.parse(data[-1])
+                if sampled:
+                    converted = clock()
                 # Finally, create a Disruption object with the above objects
-                disruption = Disruption(finish_date, coords)
+                disruption = Disruption(finish_date, coords, start_date)
                 disruptions.add(disruption)
+                if sampled:
+                    stats.sample(parsed - start, converted - parsed, clock() - converted)
+            bytes_read = f.tell()
 
-        return disruptions
+        return disruptions, rows, bytes_read
 
 
-class InteractiveMap:
-    """Contains methods for creating and manipulating an interactive map"""
+class BackgroundLoader:
+    """Loads data files into a RouteData object on a worker thread. Progress and results are sent
+    through a thread-safe queue, so the Tk thread can poll for them without ever waiting."""
 
-    @staticmethod
-    def start(data: RouteData) -> None:
+    def __init__(self, data: RouteData):
         """
         purpose:
-            Starts an interactive map window
+            Constructs a BackgroundLoader object
         parameters:
-            data: The RouteData object to get data from.
+            data: The RouteData object to load the files into
         returns:
             None
         """
-        win, from_entry_box, to_entry_box, search_box, clear_box, feedback_label = (
-            InteractiveMap.create_map_window()
-        )
-        InteractiveMap.draw_disruptions(win, data)
-        running = True
-        while running:
+        self.data = data
+        # Holds ("progress", kind, characters read, file size, rows read), ("loaded", kind, path),
+        # ("error", kind, path, description) and finally ("done",) messages
+        self.queue: queue.Queue[tuple] = queue.Queue()
+        self.thread: threading.Thread | None = None
+
+    def start(self, jobs: list[tuple[str, str]]) -> None:
+        """
+        purpose:
+            Starts loading files on the worker thread
+        parameters:
+            jobs: The (kind, path) pairs to load in order, where kind is "trips", "shapes" or "disruptions"
+        returns:
+            None
+        """
+        # A daemon thread doesn't keep the program open if the window is closed mid-load
+        self.thread = threading.Thread(target=self.__run, args=(jobs,), daemon=True)
+        self.thread.start()
+
+    def poll(self) -> list[tuple]:
+        """
+        purpose:
+            Takes every message sent since the last poll without waiting for more
+        parameters:
+            None
+        returns:
+            The list of messages in the order they were sent
+        """
+        messages = []
+        while True:
             try:
-                click_point = win.getMouse()
-            except GraphicsError as ex:
-                # Gracefully exit loop when clicking the close window button
-                running = False
-                continue
+                messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                return messages
 
-            if InteractiveMap.in_rectangle(click_point, search_box):
-                # make entries case insensitive
-                from_s = from_entry_box.text.get().strip().lower()
-                to_s = to_entry_box.text.get().strip().lower()
-                routes = data.get_routes()
-                if not routes:
-                    feedback_label.setText("ROUTES NOT LOADED")
+    def __run(self, jobs: list[tuple[str, str]]) -> None:
+        """
+        purpose:
+            Loads each file, reporting its progress. Runs on the worker thread.
+        parameters:
+            jobs: The (kind, path) pairs to load in order
+        returns:
+            None
+        """
+        loaders = {
+            "trips": self.data.load_trips_data,
+            "shapes": self.data.load_shapes_data,
+            "disruptions": self.data.load_disruptions_data,
+        }
+        try:
+            for kind, path in jobs:
+                try:
+                    size = os.path.getsize(path)
+                    loaders[kind](path, lambda chars, rows: self.queue.put(("progress", kind, chars, size, rows)))
+                except IOError:
+                    self.queue.put(("error", kind, path, f"IOError: Couldn't open {path}"))
                     continue
-                if not data.shapes_loaded():
-                    feedback_label.setText("SHAPES NOT LOADED")
+                except Exception as ex:
+                    # A malformed file mustn't end the thread without telling the map why
+                    self.queue.put(("error", kind, path, f"Couldn't load {path}: {type(ex).__name__}: {ex}"))
                     continue
+                # Each load replaces its data in one assignment once it is complete,
+                # so the map can use it as soon as this message arrives
+                self.queue.put(("loaded", kind, path))
+        finally:
+            self.queue.put(("done",))
 
-                route = InteractiveMap.search(routes, from_s, to_s)
-                # route has not been found. do not draw route
-                if not route:
-                    feedback_label.setText("NOT FOUND")
-                    continue
 
-                feedback_label.setText(f"Drawing route {route.route_id}")
-                # route has been found. draw it
-                InteractiveMap.draw_route(win, data, route)
+class InteractiveMap:
+    """Contains methods for creating and manipulating an interactive map"""
 
-            # Clear all entry boxes
-            elif InteractiveMap.in_rectangle(click_point, clear_box):
-                from_entry_box.setText("")
-                to_entry_box.setText("")
-                feedback_label.setText("")
+    # The size of the map window and its background image
+    width, height = 800, 920
+    map_path = "edmonton.png"
+    # The size of the control panel in the top left corner, where pressing the mouse doesn't pan the map
+    panel_width, panel_height = 240, 260
+    # The canvas tag of the controls, which are kept above the routes and overlays
+    ui_tag = "ui"
 
     @staticmethod
-    def draw_disruptions(win: GraphWin, data: RouteData) -> None:
+    def start(data: RouteData, jobs: list[tuple[str, str]] | None = None, trace_path: str | None = None) -> None:
         """
         purpose:
-            Draws all disruption points on the map
+            Starts an interactive map window and handles its events until it is closed
         parameters:
-            win: The GraphWin object to draw to
-            data: The RouteData object to get disruption data from
+            data: The RouteData object to get data from.
+            jobs: The (kind, path) data files to load in the background while the map is open
+            trace_path: Where to write the stage timings of each search as Chrome trace events
+                once the window is closed, or None to not write them
         returns:
             None
         """
+        session = MapSession(data, trace_path)
+        if jobs:
+            session.load_in_background(jobs)
+        session.run()
+
+    @staticmethod
+    def get_active_disruptions(data: RouteData, day: date | None = None) -> list[tuple[float, float]] | None:
+        """
+        purpose:
+            Gets the coordinates of every disruption in effect on a day
+        parameters:
+            data: The RouteData object to get disruption data from
+            day: The day disruptions must be in effect on. Defaults to today
+        returns:
+            A list of (latitude, longitude) tuples. Returns None if disruptions aren't loaded
+        """
         disruptions = data.get_disruptions()
-        today = date.today()
         if not disruptions:
             return None
-        for disruption in disruptions:
-            # Don't draw point if disruption date has passed
-            if disruption.finish_date < today:
-                continue
-            lat, lon = disruption.coords.get_coords()
-            # Transform coordinates to pixel values
-            x, y = InteractiveMap.lonlat_to_xy(win, lon, lat)
-
-            # Draw red circles where disruptions occur
-            point = Circle(Point(x, y), 3)
-            point.setFill("red")
-            point.draw(win)
+        day = day or date.today()
+        # Don't draw disruptions that haven't started or have finished
+        return [disruption.coords.get_coords() for disruption in disruptions if disruption.is_in_effect(day)]
+
+    @staticmethod
+    def get_route_coords(data: RouteData, route: Route) -> list[tuple[float, float]] | None:
+        """
+        purpose:
+            Gets the points of the longest shape of a route
+        parameters:
+            data: The RouteData object containing route information
+            route: The route to get its longest shape from
+        returns:
+            A list of (latitude, longitude) tuples. Returns None if the route has no shape
+        """
+        # First, get the longest shape; as specified by the project specification
+        out = data.get_longest_shape_from_route_id(route.route_id)
+
+        # We then check if out is a valid tuple.
+        if not out:
+            return None
+
+        # Now that we know for certain that out is a valid tuple, get the shape_id string.
+        # We don't need the length of the coordinate list, so discard.
+        shape_id = out[0]
+        coords = data.get_coords_from_shape_id(shape_id)
+        if not coords:
+            return None
+        return [coord.get_coords() for coord in coords]
 
     @staticmethod
     def create_map_window() -> (
-        tuple[GraphWin, Entry, Entry, Rectangle, Rectangle, Text]
+        tuple[GraphWin, Entry, Entry, Rectangle, Rectangle, Text, Image]
     ):
         """
         purpose:
@@ -667,17 +1383,24 @@ class InteractiveMap:
         return:
             A tuple returning the following in order:
             The main window, from_entry_box, to_entry_box,
-            search_box, clear_box, feedback_label
+            search_box, clear_box, feedback_label, background
         """
-        map_path = "edmonton.png"
-        ui_width, ui_height = 800, 920
+        from graphics4 import Entry, GraphWin, Image, ImagePyramid, Point, Rectangle, Text
+
+        map_path = InteractiveMap.map_path
+        ui_width, ui_height = InteractiveMap.width, InteractiveMap.height
 
         # Initiate window
         win = GraphWin("ETS Data", ui_width, ui_height)
+        # Redraw at most once per frame, however many items change
+        win.setFrameRate(60)
+        # Reuse the canvas items of undrawn objects instead of creating new ones
+        win.setPooling(True)
         win.setBackground("gray")
 
-        # Draw the Edmonton map
-        background = Image(Point(ui_width / 2, ui_height / 2), map_path)
+        # Draw the Edmonton map. The decoded image is kept between map sessions,
+        # so only the first session of the process pays for decoding it.
+        background = Image(Point(ui_width / 2, ui_height / 2), ImagePyramid.load(map_path).level(1))
         background.draw(win)
 
         # Create the from entry box
@@ -716,56 +1439,20 @@ class InteractiveMap:
         feedback_label.setStyle("bold")
         feedback_label.draw(win)
 
-        return win, from_entry_box, to_entry_box, search_box, clear_box, feedback_label
-
-    @staticmethod
-    def draw_route(win: GraphWin, data: RouteData, route: Route) -> None:
-        """
-        purpose:
-            Draws a path from the longest shape_id stored by route.
-        parameters:
-            win: The GraphWin object where the route will be drawn
-            data: The RouteData object containing route information
-            route: The route to get its longest shape from, and draw it
-        returns:
-            None
-        """
-        points: list[Point] = []
-
-        # First, get the longest shape; as specified by the project specification
-        out = data.get_longest_shape_from_route_id(route.route_id)
-
-        # We then check if out is a valid tuple.
-        if not out:
-            return
-
-        # Now that we know for certain that out is a valid tuple, get the shape_id string.
-        # We don't need the length of the coordinate list, so discard.
-        shape_id = out[0]
-        coords = data.get_coords_from_shape_id(shape_id)
-        if not coords:
-            return
-
-        # Create points from coordinates and save into points list
-        for coord in coords:
-            lat, lon = coord.get_coords()
-            # Transform from geographic coordinates to pixel values
-            x, y = InteractiveMap.lonlat_to_xy(win, lon, lat)
-            point = Point(x, y)
-            points.append(point)
-
-        # Connect each points with lines
-        # Each new line starts from the terminating point of the previous line
-        i = len(points) - 1
-        last = points[-1]
-        while i >= 0:
-            pt = points[i]
-            line = Line(last, pt)
-            line.setWidth(4)
-            line.setFill("blue")
-            line.draw(win)
-            last = pt
-            i -= 1
+        for control in (
+            from_entry_box,
+            from_entry_box_label,
+            to_entry_box,
+            to_entry_box_label,
+            search_box,
+            search_box_label,
+            clear_box,
+            clear_box_label,
+            feedback_label,
+        ):
+            win.addtag_withtag(InteractiveMap.ui_tag, control.id)
+
+        return win, from_entry_box, to_entry_box, search_box, clear_box, feedback_label, background
 
     @staticmethod
     def search(routes: list[Route], from_s: str, to_s: str) -> Route | None:
@@ -828,33 +1515,1036 @@ class InteractiveMap:
         return int(x), int(y)
 
     @staticmethod
-    def in_rectangle(click_point, rect) -> bool:
+    def in_rectangle(click_point, rect) -> bool:
+        """
+        Purpose:
+            Determines if the mouse is clicked inside a rectangle
+        Parameters:
+            click_point - Point object at which the mouse was clicked
+            rect - Rectangle object to be checked for mouse click
+        Returns:
+            True if click-point is inside rect, False otherwise
+        """
+
+        # Return True if both the x and y components of the mouse click are inside the rectangle.
+        # Rectangle corner points can be any two opposite corner points. There is no guarantee
+        # that P1 has lower x- and y-coordinates than P2, unless you program it that way.
+        # This method works for all combinations of corner points.
+
+        x_check = (
+            rect.getP1().getX() < click_point.getX() < rect.getP2().getX()
+            or rect.getP2().getX() < click_point.getX() < rect.getP1().getX()
+        )
+
+        y_check = (
+            rect.getP1().getY() < click_point.getY() < rect.getP2().getY()
+            or rect.getP2().getY() < click_point.getY() < rect.getP1().getY()
+        )
+
+        return x_check and y_check
+
+
+class Viewport:
+    """The part of the map shown in the window, as a zoom level and the offset of the
+    window's top left corner on the zoomed map"""
+
+    # Each zoom level has a scaled copy of the map background in its ImagePyramid
+    zoom_levels = (1, 2, 4)
+
+    def __init__(self, width: int, height: int):
+        """
+        purpose:
+            Constructs a Viewport object showing the whole map
+        parameters:
+            width: The width of the window in pixels
+            height: The height of the window in pixels
+        returns:
+            None
+        """
+        self.width = width
+        self.height = height
+        self.zoom = 1
+        self.x = 0
+        self.y = 0
+
+    def __repr__(self) -> str:
+        return f"Viewport(zoom={self.zoom}, x={self.x}, y={self.y})"
+
+    def getWidth(self) -> int:
+        # Named like GraphWin's so lonlat_to_xy projects onto the whole zoomed map
+        return self.width * self.zoom
+
+    def getHeight(self) -> int:
+        return self.height * self.zoom
+
+    def get_bounds(self) -> tuple[int, int, int, int]:
+        """
+        purpose:
+            Gets the rectangle of the zoomed map shown in the window
+        parameters:
+            None
+        returns:
+            The x1, y1, x2, y2 corners of the rectangle in zoomed map pixels
+        """
+        return self.x, self.y, self.x + self.width, self.y + self.height
+
+    def zoom_at(self, x: float, y: float, steps: int) -> bool:
+        """
+        purpose:
+            Zooms in or out while keeping the point of the map under the mouse in place
+        parameters:
+            x, y: The window position of the mouse
+            steps: The number of zoom levels to zoom in by. Negative values zoom out.
+        returns:
+            True if the zoom level changed
+        """
+        level = self.zoom_levels.index(self.zoom) + steps
+        zoom = self.zoom_levels[min(max(level, 0), len(self.zoom_levels) - 1)]
+        if zoom == self.zoom:
+            return False
+        self.x = round((self.x + x) * zoom / self.zoom - x)
+        self.y = round((self.y + y) * zoom / self.zoom - y)
+        self.zoom = zoom
+        self.__clamp()
+        return True
+
+    def pan(self, dx: float, dy: float) -> bool:
+        """
+        purpose:
+            Moves the map with the mouse
+        parameters:
+            dx, dy: The distance the mouse moved in pixels
+        returns:
+            True if the viewport moved
+        """
+        x, y = self.x, self.y
+        self.x -= round(dx)
+        self.y -= round(dy)
+        self.__clamp()
+        return (x, y) != (self.x, self.y)
+
+    def __clamp(self) -> None:
+        """
+        purpose:
+            Keeps the window inside the edges of the zoomed map
+        parameters:
+            None
+        returns:
+            None
+        """
+        self.x = min(max(self.x, 0), self.width * (self.zoom - 1))
+        self.y = min(max(self.y, 0), self.height * (self.zoom - 1))
+
+
+class ShapeIndex:
+    """The points of a shape projected onto the map at each zoom level, simplified to the
+    detail that can be seen and indexed by the area each segment covers"""
+
+    # The width and height of each grid cell in pixels
+    cell_size = 128
+    # Points closer than this many pixels to the simplified line can't be seen, so they are dropped
+    tolerance = 1.0
+
+    def __init__(self, coords: list[tuple[float, float]]):
+        """
+        purpose:
+            Constructs a ShapeIndex object. Each zoom level is built the first time it is shown.
+        parameters:
+            coords: The (latitude, longitude) points of the shape
+        returns:
+            None
+        """
+        self.coords = coords
+        # Maps each zoom level with its projected points and a grid of the segments between them
+        self.levels: dict[int, tuple[list[tuple[int, int]], SpatialGrid]] = {}
+
+    def get_visible_lines(self, viewport: Viewport) -> list[list[int]]:
+        """
+        purpose:
+            Gets the parts of the shape inside the viewport
+        parameters:
+            viewport: The Viewport object of the window
+        returns:
+            A list with one flat [x1, y1, x2, y2, ...] list of window coordinates for each run
+            of consecutive visible segments
+        """
+        points, grid = self.__get_level(viewport)
+        lines: list[list[int]] = []
+        previous = None
+        for i in sorted(grid.query(*viewport.get_bounds())):
+            if i - 1 != previous:
+                # The previous segment is off screen, so start a new line
+                x, y = points[i]
+                lines.append([x - viewport.x, y - viewport.y])
+            x, y = points[i + 1]
+            lines[-1].extend((x - viewport.x, y - viewport.y))
+            previous = i
+        return lines
+
+    def __get_level(self, viewport: Viewport) -> tuple[list[tuple[int, int]], SpatialGrid]:
+        """
+        purpose:
+            Gets the projected points and segment grid of the viewport's zoom level, building them if needed
+        parameters:
+            viewport: The Viewport object of the window
+        returns:
+            The simplified points and the grid of segment indices
+        """
+        level = self.levels.get(viewport.zoom)
+        if level is None:
+            points = [InteractiveMap.lonlat_to_xy(viewport, lon, lat) for lat, lon in self.coords]
+            points = [points[i] for i in simplify(points, self.tolerance)]
+            # A shape with a single coordinate still needs two points for a line
+            if len(points) == 1:
+                points.append(points[0])
+            grid = SpatialGrid(self.cell_size)
+            for i in range(len(points) - 1):
+                grid.insert(i, *points[i], *points[i + 1])
+            level = self.levels[viewport.zoom] = points, grid
+        return level
+
+
+class PointIndex:
+    """Points projected onto the map at each zoom level and merged into clusters of nearby points,
+    so overlapping markers are drawn as one marker with a count"""
+
+    # The width and height in pixels of the area merged into one cluster
+    cell_size = 24
+
+    def __init__(self, coords: dict[int, tuple[float, float]], width: int, height: int):
+        """
+        purpose:
+            Constructs a PointIndex object. Each zoom level is built the first time it is shown.
+        parameters:
+            coords: Maps the key of each point with its (latitude, longitude)
+            width, height: The size of the unzoomed map in pixels
+        returns:
+            None
+        """
+        self.coords = dict(coords)
+        self.width = width
+        self.height = height
+        # Maps each zoom level with the clusters of the points.
+        # The grid is fixed to the zoomed map, so panning doesn't change any cluster.
+        self.levels: dict[int, GridClusters] = {}
+
+    def add(self, key: int, coords: tuple[float, float]) -> None:
+        """
+        purpose:
+            Adds a point, updating only its own cluster at each built zoom level
+        parameters:
+            key: The key of the point
+            coords: The (latitude, longitude) of the point
+        returns:
+            None
+        """
+        self.coords[key] = coords
+        for zoom, clusters in self.levels.items():
+            clusters.add(*self.__project(zoom, coords))
+
+    def remove(self, key: int) -> None:
+        """
+        purpose:
+            Removes a point, updating only its own cluster at each built zoom level
+        parameters:
+            key: The key of the point
+        returns:
+            None
+        """
+        coords = self.coords.pop(key)
+        for zoom, clusters in self.levels.items():
+            clusters.remove(*self.__project(zoom, coords))
+
+    def get_visible_clusters(self, viewport: Viewport) -> list[tuple[int, int, int]]:
+        """
+        purpose:
+            Gets the clusters of points inside the viewport
+        parameters:
+            viewport: The Viewport object of the window
+        returns:
+            A list of (x, y, count) tuples, where x and y are the window coordinates of the
+            cluster and count is the number of points in it
+        """
+        clusters = self.levels.get(viewport.zoom)
+        if clusters is None:
+            clusters = self.levels[viewport.zoom] = GridClusters(self.cell_size)
+            for coords in self.coords.values():
+                clusters.add(*self.__project(viewport.zoom, coords))
+
+        return [
+            (round(x) - viewport.x, round(y) - viewport.y, count)
+            for x, y, count in clusters.query(*viewport.get_bounds())
+        ]
+
+    def __project(self, zoom: int, coords: tuple[float, float]) -> tuple[int, int]:
+        """
+        purpose:
+            Projects a point onto the map at a zoom level
+        parameters:
+            zoom: The zoom level
+            coords: The (latitude, longitude) of the point
+        returns:
+            The x and y position of the point on the zoomed map
+        """
+        # lonlat_to_xy only needs the size of the zoomed map, which an unpanned viewport gives
+        viewport = Viewport(self.width, self.height)
+        viewport.zoom = zoom
+        lat, lon = coords
+        return InteractiveMap.lonlat_to_xy(viewport, lon, lat)
+
+
+class MapSession:
+    """Holds an open interactive map window and responds to its mouse and key events"""
+
+    # The H key cycles through these heatmap overlays
+    heatmap_modes = (None, "disruptions", "routes")
+    # The width and height in pixels of each heatmap cell
+    heatmap_cell = 4
+    # The furthest number of days the date slider reaches from today
+    slider_days = 730
+    # How often the background loader is checked for progress, in milliseconds
+    poll_ms = 100
+    # The timed stages of a search, from the click until the route is on the screen
+    trace_stages = ("search", "longest shape", "projection", "canvas items", "flush")
+    # The timed stages of redrawing the map after it is panned or zoomed,
+    # which should take less than the frame budget in milliseconds to keep up with the mouse
+    redraw_stages = ("background", "heatmap", "disruptions", "routes", "flush")
+    frame_budget_ms = 16
+
+    def __init__(self, data: RouteData, trace_path: str | None = None):
+        """
+        purpose:
+            Constructs a MapSession object, opening the map window and drawing the disruptions
+        parameters:
+            data: The RouteData object to get data from.
+            trace_path: Where to write the stage timings of each search when the window is closed,
+                or None to only show them on the map
+        returns:
+            None
+        """
+        self.data = data
+        (
+            self.win,
+            self.from_entry_box,
+            self.to_entry_box,
+            self.search_box,
+            self.clear_box,
+            self.feedback_label,
+            self.background,
+        ) = InteractiveMap.create_map_window()
+        self.viewport = Viewport(InteractiveMap.width, InteractiveMap.height)
+        self.layers = self.create_layers()
+        # The projected points of every drawn route, and the IDs of the routes that aren't cleared
+        self.route_indexes: dict[str, ShapeIndex] = {}
+        self.shown_routes: set[str] = set()
+        # Hidden layers drawn for an older viewport, which are redrawn when shown again
+        self.stale: set[str] = set()
+        self.redraw_pending = False
+        # The shown heatmap, and the points of each heatmap at each zoom level
+        self.heatmap_mode: str | None = None
+        self.heatmap_points: dict[tuple[str, int], list[tuple[float, float]]] = {}
+
+        # The day chosen with the date slider, and the disruptions in effect on it
+        self.day = date.today()
+        self.timeline: DisruptionTimeline | None = None
+        self.disruption_index: PointIndex | None = None
+        self.date_label: Text | None = None
+        # The running background loader, the label showing its progress and the files it couldn't open
+        self.loader: BackgroundLoader | None = None
+        self.progress_label: Text | None = None
+        self.load_errors: list[str] = []
+        # The stage timings of each search and each redraw, and the label showing them
+        self.tracer = FrameTracer(self.trace_stages)
+        self.redraw_tracer = FrameTracer(self.redraw_stages)
+        self.trace_path = trace_path
+        self.trace_label: Text | None = None
+        self.load_disruptions()
+        self.draw_disruptions()
+
+    def create_layers(self) -> LayerManager:
+        """
+        purpose:
+            Creates the layer manager holding the disruption overlay and one layer for each drawn route
+        parameters:
+            None
+        returns:
+            The LayerManager object
+        """
+        from graphics4 import LayerManager
+
+        return LayerManager(self.win, InteractiveMap.ui_tag)
+
+    def run(self) -> None:
+        """
+        purpose:
+            Registers the event handlers and sleeps in the Tk event loop until the window is closed.
+            Each click or key press is handled as soon as it arrives instead of being polled for.
+        parameters:
+            None
+        returns:
+            None
+        """
+        self.win.setMouseHandler(self.on_click)
+        self.win.setWheelHandler(self.on_wheel)
+        self.win.setDragHandler(self.on_drag, self.starts_drag)
+        self.win.bindKey("Return", self.on_search)
+        self.win.bindKey("Escape", self.on_clear)
+        # Typing an "h" into the entry boxes mustn't switch the heatmap
+        self.win.bindKey("h", self.on_heatmap, whileTyping=False)
+        if self.timeline:
+            self.create_date_slider()
+        # The background of each zoom level is scaled the first time it is zoomed to,
+        # since the largest ones take tens of megabytes
+        try:
+            self.win.mainloop()
+        finally:
+            if self.trace_path:
+                try:
+                    self.tracer.write(self.trace_path, self.redraw_tracer)
+                except IOError:
+                    print(f"IOError: Couldn't save to {self.trace_path}")
+
+    def load_disruptions(self) -> None:
+        """
+        purpose:
+            Indexes the disruptions in effect on the chosen day
+        parameters:
+            None
+        returns:
+            None
+        """
+        disruptions = self.data.get_disruptions()
+        if not disruptions:
+            return
+        self.timeline = DisruptionTimeline(disruptions, self.day)
+        coords = {i: self.timeline.disruptions[i].coords.get_coords() for i in self.timeline.active}
+        self.disruption_index = PointIndex(coords, self.viewport.width, self.viewport.height)
+
+    def load_in_background(self, jobs: list[tuple[str, str]]) -> None:
+        """
+        purpose:
+            Loads data files on a worker thread while the map stays responsive.
+            Progress is shown below the date slider, and each file is used as soon as it is loaded.
+        parameters:
+            jobs: The (kind, path) pairs to load in order, where kind is "trips", "shapes" or "disruptions"
+        returns:
+            None
+        """
+        from graphics4 import Point, Text
+
+        if self.progress_label is None:
+            self.progress_label = Text(Point(120, 245), "")
+            self.progress_label.draw(self.win)
+            self.win.addtag_withtag(InteractiveMap.ui_tag, self.progress_label.id)
+        self.load_errors = []
+        self.loader = BackgroundLoader(self.data)
+        self.loader.start(jobs)
+        self.win.after(self.poll_ms, self.poll_loader)
+
+    def poll_loader(self) -> None:
+        """
+        purpose:
+            Shows the progress sent by the background loader since the last poll, then polls again later
+        parameters:
+            None
+        returns:
+            None
+        """
+        if not self.loader:
+            return
+        for message in self.loader.poll():
+            if message[0] == "progress":
+                _, kind, chars, size, rows = message
+                percent = min(100 * chars // size, 100) if size else 100
+                self.progress_label.setText(f"Loading {kind}: {percent}% ({rows} rows)")
+            elif message[0] == "loaded":
+                self.on_loaded(message[1])
+            elif message[0] == "error":
+                self.load_errors.append(message[3])
+            elif message[0] == "done":
+                self.loader = None
+                self.progress_label.setText("\n".join(self.load_errors))
+                return
+        self.win.after(self.poll_ms, self.poll_loader)
+
+    def on_loaded(self, kind: str) -> None:
+        """
+        purpose:
+            Shows the data of a file that finished loading in the background
+        parameters:
+            kind: The kind of file loaded, "trips", "shapes" or "disruptions"
+        returns:
+            None
+        """
+        self.progress_label.setText(f"Loaded {kind}")
+        # Heatmaps count the old data
+        self.heatmap_points = {}
+        if kind == "disruptions":
+            self.load_disruptions()
+            if self.timeline and not self.date_label:
+                self.create_date_slider()
+        self.request_redraw()
+
+    def create_date_slider(self) -> None:
+        """
+        purpose:
+            Draws the slider for choosing the day disruptions are shown for, and its date label
+        parameters:
+            None
+        returns:
+            None
+        """
+        from graphics4 import Point, Slider, Text
+
+        # The slider counts days from today and covers every disruption up to slider_days away
+        today = date.today()
+        low, high = 0, 0
+        bounds = self.timeline.get_bounds()
+        if bounds:
+            low = max(min((bounds[0] - today).days, 0), -self.slider_days)
+            high = min(max((bounds[1] - today).days, 0), self.slider_days)
+        slider = Slider(Point(120, 195), 180, low, high, (self.day - today).days)
+        slider.setHandler(self.on_day)
+        slider.draw(self.win)
+
+        self.date_label = Text(Point(120, 220), self.day.isoformat())
+        self.date_label.draw(self.win)
+        self.win.addtag_withtag(InteractiveMap.ui_tag, self.date_label.id)
+
+    def on_day(self, offset: int) -> None:
+        """
+        purpose:
+            Handles the date slider moving
+        parameters:
+            offset: The chosen number of days from today
+        returns:
+            None
+        """
+        self.set_day(date.today() + timedelta(days=offset))
+
+    def set_day(self, day: date) -> None:
+        """
+        purpose:
+            Shows the disruptions in effect on another day. Only the disruptions that start
+            or finish between both days are added to or removed from their clusters.
+        parameters:
+            day: The day to show
+        returns:
+            None
+        """
+        if not self.timeline or day == self.day:
+            return
+        added, removed = self.timeline.set_day(day)
+        self.day = day
+        for i in removed:
+            self.disruption_index.remove(i)
+        for i in added:
+            self.disruption_index.add(i, self.timeline.disruptions[i].coords.get_coords())
+        if self.date_label:
+            self.date_label.setText(day.isoformat())
+        if added or removed:
+            # The disruption heatmap counts every disruption in effect, so it is rebuilt
+            self.heatmap_points = {
+                key: points for key, points in self.heatmap_points.items() if key[0] != "disruptions"
+            }
+            self.request_redraw()
+
+    def on_click(self, click_point: Point) -> None:
+        """
+        purpose:
+            Handles a mouse click on the map window
+        parameters:
+            click_point: The Point where the mouse was clicked
+        returns:
+            None
+        """
+        if InteractiveMap.in_rectangle(click_point, self.search_box):
+            self.on_search()
+        elif InteractiveMap.in_rectangle(click_point, self.clear_box):
+            self.on_clear()
+
+    def on_wheel(self, point: Point, steps: int) -> None:
+        """
+        purpose:
+            Zooms the map in or out around the mouse
+        parameters:
+            point: The Point of the mouse
+            steps: The number of zoom levels to zoom in by. Negative values zoom out.
+        returns:
+            None
+        """
+        if self.viewport.zoom_at(point.getX(), point.getY(), steps):
+            self.request_redraw()
+
+    def on_drag(self, dx: int, dy: int) -> None:
+        """
+        purpose:
+            Pans the map with the mouse
+        parameters:
+            dx, dy: The distance the mouse moved in pixels
+        returns:
+            None
+        """
+        if self.viewport.pan(dx, dy):
+            self.request_redraw()
+
+    @staticmethod
+    def starts_drag(x: int, y: int) -> bool:
+        """
+        purpose:
+            Checks whether pressing the mouse somewhere starts panning the map
+        parameters:
+            x, y: The window coordinates of the press
+        returns:
+            Returns False inside the control panel, so using the controls doesn't move the map, otherwise True
+        """
+        return not (x < InteractiveMap.panel_width and y < InteractiveMap.panel_height)
+
+    def request_redraw(self) -> None:
+        """
+        purpose:
+            Schedules a redraw once Tk is idle. Every viewport change made before then,
+            such as the many motion events of one drag, is drawn by the same redraw.
+        parameters:
+            None
+        returns:
+            None
+        """
+        if self.redraw_pending:
+            return
+        self.redraw_pending = True
+        self.win.after_idle(self.redraw)
+
+    def redraw(self) -> None:
+        """
+        purpose:
+            Redraws the background, the disruptions and the shown routes for the current viewport
+        parameters:
+            None
+        returns:
+            None
+        """
+        self.redraw_pending = False
+        tracer = self.redraw_tracer
+        tracer.begin("Redraw")
+        with tracer.stage("background"):
+            self.place_background()
+        with tracer.stage("heatmap"):
+            self.draw_heatmap()
+        with tracer.stage("disruptions"):
+            self.draw_disruptions()
+        with tracer.stage("routes"):
+            for route_id in self.route_indexes:
+                if route_id in self.shown_routes:
+                    self.draw_route_layer(route_id)
+                else:
+                    self.stale.add(f"route:{route_id}")
+        with tracer.stage("flush"):
+            self.win.flush()
+        tracer.end()
+        self.show_trace()
+
+    def place_background(self) -> None:
+        """
+        purpose:
+            Shows the background scaled to the zoom level and moved to the viewport
+        parameters:
+            None
+        returns:
+            None
+        """
+        from graphics4 import ImagePyramid
+
+        if not self.background:
+            return
+        viewport = self.viewport
+        photo = ImagePyramid.load(InteractiveMap.map_path).level(viewport.zoom)
+        if self.background.img is not photo:
+            self.background.setImage(photo)
+        # The image is anchored at its centre
+        anchor = self.background.getAnchor()
+        self.background.move(
+            viewport.getWidth() / 2 - viewport.x - anchor.getX(),
+            viewport.getHeight() / 2 - viewport.y - anchor.getY(),
+        )
+
+    def on_heatmap(self) -> None:
+        """
+        purpose:
+            Switches to the next heatmap overlay, or hides the heatmap after the last one
+        parameters:
+            None
+        returns:
+            None
+        """
+        modes = self.heatmap_modes
+        self.heatmap_mode = modes[(modes.index(self.heatmap_mode) + 1) % len(modes)]
+        if self.heatmap_mode:
+            self.feedback_label.setText(f"Heatmap of {self.heatmap_mode}")
+        else:
+            self.feedback_label.setText("")
+        self.request_redraw()
+
+    def get_heatmap_points(self) -> tuple[list[float], list[float]]:
+        """
+        purpose:
+            Gets the points counted by the shown heatmap. These are the active disruptions,
+            or points spaced evenly along every route so the heatmap shows how many routes
+            cover each place.
+        parameters:
+            None
+        returns:
+            The x and y window coordinates of the points as two lists
+        """
+        viewport = self.viewport
+        key = (self.heatmap_mode, viewport.zoom)
+        points = self.heatmap_points.get(key)
+        if points is None:
+            points = []
+            if self.heatmap_mode == "disruptions" and self.disruption_index:
+                for lat, lon in self.disruption_index.coords.values():
+                    points.append(InteractiveMap.lonlat_to_xy(viewport, lon, lat))
+            elif self.heatmap_mode == "routes" and self.data.shapes_loaded():
+                for route in self.data.get_routes() or []:
+                    coords = InteractiveMap.get_route_coords(self.data, route)
+                    if coords:
+                        line = [InteractiveMap.lonlat_to_xy(viewport, lon, lat) for lat, lon in coords]
+                        points.extend(sample_line(line, self.heatmap_cell))
+            self.heatmap_points[key] = points
+
+        xs = [x - viewport.x for x, y in points]
+        ys = [y - viewport.y for x, y in points]
+        return xs, ys
+
+    def draw_heatmap(self) -> None:
+        """
+        purpose:
+            Draws the shown heatmap as one translucent image covering the window
+        parameters:
+            None
+        returns:
+            None
+        """
+        from graphics4 import Image, Point
+
+        self.layers.delete("heatmap")
+        if not self.heatmap_mode:
+            return
+        xs, ys = self.get_heatmap_points()
+        if not xs:
+            return
+        cell = self.heatmap_cell
+        width, height = self.viewport.width, self.viewport.height
+        # The image has one pixel for each cell, which Tk scales up to the size of the window
+        png = heatmap_png(xs, ys, width, height, cell)
+        columns, rows = -(-width // cell), -(-height // cell)
+        overlay = Image.fromData(Point(columns * cell / 2, rows * cell / 2), png, cell)
+        overlay.draw(self.win)
+        self.layers.add("heatmap", overlay)
+
+    def draw_disruptions(self) -> None:
+        """
+        purpose:
+            Draws the disruptions inside the viewport as the disruptions layer.
+            Disruptions close enough to overlap are drawn as one larger circle showing their count.
+        parameters:
+            None
+        returns:
+            None
+        """
+        from graphics4 import MarkerLayer, Point, Text
+
+        if not self.disruption_index:
+            return
+        self.layers.delete("disruptions")
+        clusters = self.disruption_index.get_visible_clusters(self.viewport)
+        singles = [(x, y) for x, y, count in clusters if count == 1]
+        groups = [(x, y, count) for x, y, count in clusters if count > 1]
+
+        # Draw red circles where disruptions occur, all in one pass
+        if singles:
+            xs, ys = zip(*singles)
+            markers = MarkerLayer(xs, ys, 3, tag="disruptions")
+            markers.setFill("red")
+            markers.draw(self.win)
+            self.layers.add("disruptions", markers)
+        if groups:
+            xs, ys, counts = zip(*groups)
+            badges = MarkerLayer(xs, ys, 9, tag="disruption-clusters")
+            badges.setFill("red")
+            badges.draw(self.win)
+            self.layers.add("disruptions", badges)
+            for x, y, count in groups:
+                label = Text(Point(x, y), str(count))
+                label.setSize(8)
+                label.setStyle("bold")
+                label.setTextColor("white")
+                label.draw(self.win)
+                self.layers.add("disruptions", label)
+
+    def on_search(self) -> None:
+        """
+        purpose:
+            Searches for the route between the entered locations and draws it
+        parameters:
+            None
+        returns:
+            None
+        """
+        # make entries case insensitive
+        from_s = self.from_entry_box.text.get().strip().lower()
+        to_s = self.to_entry_box.text.get().strip().lower()
+        routes = self.data.get_routes()
+        if not routes:
+            self.feedback_label.setText("ROUTES NOT LOADED")
+            return
+        if not self.data.shapes_loaded():
+            self.feedback_label.setText("SHAPES NOT LOADED")
+            return
+
+        self.tracer.begin("Search")
+        with self.tracer.stage("search"):
+            route = InteractiveMap.search(routes, from_s, to_s)
+        # route has not been found. do not draw route
+        if not route:
+            self.feedback_label.setText("NOT FOUND")
+            self.finish_trace()
+            return
+
+        if route.route_id in self.route_indexes:
+            # The route was drawn before, so show its existing canvas items again
+            # unless the map has moved since it was hidden
+            self.shown_routes.add(route.route_id)
+            layer = f"route:{route.route_id}"
+            if layer in self.stale:
+                self.draw_route_layer(route.route_id)
+            else:
+                with self.tracer.stage("canvas items"):
+                    self.layers.show(layer)
+            self.feedback_label.setText(f"Showing route {route.route_id}")
+            self.finish_trace()
+            return
+
+        self.feedback_label.setText(f"Drawing route {route.route_id}")
+        # Let the label redraw before the route is drawn, then draw the route once Tk is idle
+        self.win.after_idle(self.draw_route, route)
+
+    def draw_route(self, route: Route) -> None:
+        """
+        purpose:
+            Projects a route for drawing and draws it in its own layer,
+            so it can be hidden and shown without redrawing
+        parameters:
+            route: The route to draw
+        returns:
+            None
+        """
+        with self.tracer.stage("longest shape"):
+            coords = InteractiveMap.get_route_coords(self.data, route)
+        if not coords:
+            self.finish_trace()
+            return
+        with self.tracer.stage("projection"):
+            self.route_indexes[route.route_id] = ShapeIndex(coords)
+        self.shown_routes.add(route.route_id)
+        self.draw_route_layer(route.route_id)
+        self.finish_trace()
+
+    def draw_route_layer(self, route_id: str) -> None:
+        """
+        purpose:
+            Draws the parts of a route inside the viewport, replacing its layer
+        parameters:
+            route_id: The ID of a route in route_indexes
+        returns:
+            None
+        """
+        from graphics4 import Polyline
+
+        layer = f"route:{route_id}"
+        with self.tracer.stage("projection"):
+            visible_lines = self.route_indexes[route_id].get_visible_lines(self.viewport)
+        with self.tracer.stage("canvas items"):
+            self.layers.delete(layer)
+            self.stale.discard(layer)
+            for points in visible_lines:
+                line = Polyline(points)
+                line.setWidth(4)
+                line.setFill("blue")
+                line.draw(self.win)
+                self.layers.add(layer, line)
+
+    def finish_trace(self) -> None:
+        """
+        purpose:
+            Flushes the drawing to the screen as the last stage of the traced search,
+            then shows the stage timings of the last search and the 95th percentile of all searches
+        parameters:
+            None
+        returns:
+            None
+        """
+        if self.tracer.current is None:
+            return
+        with self.tracer.stage("flush"):
+            self.win.flush()
+        self.tracer.end()
+        self.show_trace()
+
+    def show_trace(self) -> None:
+        """
+        purpose:
+            Shows the stage timings of the last search and the 95th percentile of all searches,
+            followed by the 95th percentile of every redraw against the frame budget once the map has been redrawn
+        parameters:
+            None
+        returns:
+            None
+        """
+        from graphics4 import Point, Text
+
+        lines = self.tracer.breakdown()
+        redraws = self.redraw_tracer.histograms["total"]
+        if redraws.count:
+            lines.append(f"redraw p95 {redraws.percentile(95) / 1e6:.1f} of {self.frame_budget_ms} ms")
+        text = "\n".join(lines)
+        if self.trace_label:
+            self.trace_label.setText(text)
+            return
+        self.trace_label = Text(Point(InteractiveMap.width - 100, 60), text)
+        self.trace_label.setFace("courier")
+        self.trace_label.setSize(9)
+        self.trace_label.draw(self.win)
+        self.win.addtag_withtag(InteractiveMap.ui_tag, self.trace_label.id)
+
+    def on_clear(self) -> None:
+        """
+        purpose:
+            Clears all entry boxes and the feedback label, and hides every drawn route
+        parameters:
+            None
+        returns:
+            None
+        """
+        for name in self.layers.names():
+            if name.startswith("route:"):
+                self.layers.hide(name)
+        self.shown_routes.clear()
+        self.from_entry_box.setText("")
+        self.to_entry_box.setText("")
+        self.feedback_label.setText("")
+
+
+class MapRenderer:
+    """Contains methods for drawing the interactive map's routes and disruptions into image files"""
+
+    @staticmethod
+    def create_canvas(image_format: str, background: bool = True) -> RasterCanvas | SvgCanvas:
+        """
+        purpose:
+            Creates a headless canvas the size of the map window
+        parameters:
+            image_format: "png", "ppm" or "svg"
+            background: Whether to draw the Edmonton map behind the drawing
+        returns:
+            A SvgCanvas for "svg". Otherwise, a RasterCanvas
+        """
+        map_path = InteractiveMap.map_path if background else None
+        if image_format == "svg":
+            return SvgCanvas(InteractiveMap.width, InteractiveMap.height, map_path)
+        return RasterCanvas(InteractiveMap.width, InteractiveMap.height, map_path)
+
+    @staticmethod
+    def draw_disruptions(canvas: RasterCanvas | SvgCanvas, data: RouteData, day: date | None = None) -> None:
+        """
+        purpose:
+            Draws the disruption points in effect on a day, like MapSession.draw_disruptions
+            without clustering
+        parameters:
+            canvas: The canvas to draw to
+            data: The RouteData object to get disruption data from
+            day: The day disruptions must be in effect on. Defaults to today
+        returns:
+            None
+        """
+        for lat, lon in InteractiveMap.get_active_disruptions(data, day) or []:
+            x, y = InteractiveMap.lonlat_to_xy(canvas, lon, lat)
+            canvas.draw_circle(x, y, 3, "red", outline="black")
+
+    @staticmethod
+    def draw_route(canvas: RasterCanvas | SvgCanvas, data: RouteData, route: Route) -> None:
         """
-        Purpose:
-            Determines if the mouse is clicked inside a rectangle
-        Parameters:
-            click_point - Point object at which the mouse was clicked
-            rect - Rectangle object to be checked for mouse click
-        Returns:
-            True if click-point is inside rect, False otherwise
+        purpose:
+            Draws the longest shape of a route, like MapSession.draw_route_layer
+        parameters:
+            canvas: The canvas to draw to
+            data: The RouteData object containing route information
+            route: The route to get its longest shape from, and draw it
+        returns:
+            None
         """
+        out = data.get_longest_shape_from_route_id(route.route_id)
+        if not out:
+            return
+        coords = data.get_coords_from_shape_id(out[0])
+        if not coords:
+            return
+        points = []
+        for coord in coords:
+            lat, lon = coord.get_coords()
+            points.append(InteractiveMap.lonlat_to_xy(canvas, lon, lat))
+        canvas.draw_polyline(points, "blue", 4)
 
-        # Return True if both the x and y components of the mouse click are inside the rectangle.
-        # Rectangle corner points can be any two opposite corner points. There is no guarantee
-        # that P1 has lower x- and y-coordinates than P2, unless you program it that way.
-        # This method works for all combinations of corner points.
+    @staticmethod
+    def render_routes(
+        data: RouteData,
+        route_ids: list[str],
+        out_dir: str,
+        image_format: str = "png",
+        background: bool = True,
+        day: date | None = None,
+    ) -> dict[str, str]:
+        """
+        purpose:
+            Renders every route into its own image file.
+            The background and disruptions are drawn once and copied for each route.
+        parameters:
+            data: The RouteData object containing route, shape and disruption information
+            route_ids: The IDs of the routes to render
+            out_dir: The directory to write the images to
+            image_format: "png", "ppm" or "svg"
+            background: Whether to draw the Edmonton map behind the routes
+            day: The day disruptions must be in effect on. Defaults to today
+        returns:
+            A dictionary mapping each rendered route ID to its file path. Unknown route IDs are skipped.
+        """
+        base = MapRenderer.create_canvas(image_format, background)
+        MapRenderer.draw_disruptions(base, data, day)
+        routes = {route.route_id: route for route in data.get_routes() or []}
 
-        x_check = (
-            rect.getP1().getX() < click_point.getX() < rect.getP2().getX()
-            or rect.getP2().getX() < click_point.getX() < rect.getP1().getX()
-        )
+        paths: dict[str, str] = {}
+        for route_id in route_ids:
+            if route_id not in routes:
+                continue
+            canvas = base.copy()
+            MapRenderer.draw_route(canvas, data, routes[route_id])
+            path = os.path.join(out_dir, f"route_{route_id}.{image_format}")
+            if image_format == "png":
+                # Batches favour speed over file size
+                canvas.save(path, level=1)
+            else:
+                canvas.save(path)
+            paths[route_id] = path
+        return paths
 
-        y_check = (
-            rect.getP1().getY() < click_point.getY() < rect.getP2().getY()
-            or rect.getP2().getY() < click_point.getY() < rect.getP1().getY()
-        )
 
-        return x_check and y_check
+# Query latencies are only recorded while metrics are enabled, from the menu or with --metrics
+metrics.registry.instrument(
+    RouteData,
+    ["get_shape_ids_from_route_id", "get_coords_from_shape_id", "get_longest_shape_from_route_id"],
+    "RouteData",
+)
+metrics.registry.instrument(InteractiveMap, ["search"], "InteractiveMap")
 
 
 def print_menu() -> None:
@@ -882,6 +2572,14 @@ Edmonton Transit System
 (8) Load routes and shapes from a pickle
 
 (9) Interactive map
+
+(10) Find longest shape for route by distance
+(11) Rank longest shapes and routes with most shapes
+
+(12) Start or stop timing queries
+(13) Save query timings
+(14) Profile commands
+(15) Report memory use
 (0) Quit
 """
     )
@@ -905,6 +2603,7 @@ def load_route_data(data: RouteData) -> None:
     try:
         data.load_trips_data(path)
         print(f"Data from {path} loaded")
+        print_load_stats(data, "trips")
     except IOError:
         print(f"IOError: Couldn't open {path}")
 
@@ -925,6 +2624,7 @@ def load_shape_data(data: RouteData) -> None:
     try:
         data.load_shapes_data(path)
         print(f"Data from {path} loaded")
+        print_load_stats(data, "shapes")
     except IOError:
         print(f"IOError: Couldn't open {path}")
 
@@ -945,10 +2645,28 @@ def load_disruptions_data(data: RouteData) -> None:
     try:
         data.load_disruptions_data(path)
         print(f"Data from {path} loaded")
+        print_load_stats(data, "disruptions")
     except IOError:
         print(f"IOError: Couldn't open {path}")
 
 
+def print_load_stats(data: RouteData, kind: str) -> None:
+    """
+    purpose:
+        Prints how long the latest load of a data file took and where the time went
+    parameter:
+        data: The RouteData object the file was loaded into
+        kind: "trips", "shapes" or "disruptions"
+    return:
+        None
+    """
+    stats = data.load_stats().get(kind)
+    if not stats:
+        return
+    for line in stats.summary():
+        print(line)
+
+
 def print_shape_ids(data: RouteData) -> None:
     """
     purpose:
@@ -1021,6 +2739,137 @@ def find_longest_shape(data: RouteData) -> None:
     print(f"The longest shape for {route_id} is {shape_id} with {length} coordinates")
 
 
+def find_longest_shape_by_distance(data: RouteData) -> None:
+    """
+    purpose:
+        Asks for a route_id and prints out its shape_id that covers the greatest distance.
+    parameter:
+        data: The RouteData object to get data from.
+    return:
+        None
+    """
+    if not data.routes_loaded():
+        print("Route data hasn't been loaded yet")
+        return
+    if not data.shapes_loaded():
+        print("Shape ID data hasn't been loaded yet")
+        return
+    route_id = input("Enter route ID: ")
+    out = data.get_longest_shape_by_distance_from_route_id(route_id)
+    if not out:
+        print("\t** NOT FOUND **")
+        return
+    shape_id, length = out
+    print(f"The longest shape for {route_id} is {shape_id} at {length:.2f} km")
+
+
+def print_rankings(data: RouteData) -> None:
+    """
+    purpose:
+        Asks for a number of results and a shape ranking, then prints the longest shapes
+        and the routes with the most shapes. Defaults to 20 results ranked by distance.
+    parameter:
+        data: The RouteData object to get data from.
+    return:
+        None
+    """
+    if not data.routes_loaded():
+        print("Route data hasn't been loaded yet")
+        return
+    if not data.shapes_loaded():
+        print("Shape ID data hasn't been loaded yet")
+        return
+    count = input("Enter number of results: ").strip()
+    if not count:
+        count = "20"
+    if not count.isdigit():
+        print("\t** INVALID NUMBER **")
+        return
+    k = int(count)
+    by = input("Rank shapes by (d)istance or (c)oordinates: ").strip().lower()
+    if by not in ("", "d", "c"):
+        print("Invalid Option")
+        return
+
+    if by == "c":
+        print(f"Top {k} shapes by coordinates")
+        for rank, (shape_id, length) in enumerate(data.get_top_shapes(k, by="coordinates"), 1):
+            print(f"\t{rank}. {shape_id} with {length} coordinates")
+    else:
+        print(f"Top {k} longest shapes")
+        for rank, (shape_id, length) in enumerate(data.get_top_shapes(k), 1):
+            print(f"\t{rank}. {shape_id} at {length:.2f} km")
+    print(f"Top {k} routes by shape variants")
+    for rank, (route_id, shape_count) in enumerate(data.get_top_routes_by_shape_count(k), 1):
+        route_name = data.get_route_long_name(route_id)
+        print(f"\t{rank}. {route_id} [{route_name}] with {shape_count} shapes")
+
+
+def build_memory_report(data: RouteData) -> list[dict]:
+    """
+    purpose:
+        Measures the memory of each part of the loaded data in two ways. The deep size adds up
+        sys.getsizeof of everything reachable, counting objects shared with an earlier part only once.
+        The traced size is what tracemalloc sees allocated to build a copy of the part on its own.
+    parameter:
+        data: The RouteData object to measure
+    return:
+        One dictionary for each part with its name, entity count and unit, deep and traced bytes,
+        and traced bytes per entity, followed by a "total" dictionary
+    """
+    report = []
+    seen: set[int] = set()
+    for part, (structure, count, unit) in data.memory_parts().items():
+        traced = traced_size(structure)
+        report.append(
+            {
+                "part": part,
+                "count": count,
+                "unit": unit,
+                "deep_bytes": deep_size(structure, seen),
+                "traced_bytes": traced,
+                "bytes_per_entity": traced / count if count else 0.0,
+            }
+        )
+    report.append(
+        {
+            "part": "total",
+            "count": None,
+            "unit": None,
+            "deep_bytes": sum(row["deep_bytes"] for row in report),
+            "traced_bytes": sum(row["traced_bytes"] for row in report),
+            "bytes_per_entity": None,
+        }
+    )
+    return report
+
+
+def print_memory_report(data: RouteData) -> None:
+    """
+    purpose:
+        Prints how much memory each part of the loaded data uses and how much each of its entities takes
+    parameter:
+        data: The RouteData object to measure
+    return:
+        None
+    """
+    print(f"{'Part':<18}{'Count':>10}  {'Unit':<12}{'Deep size':>11}{'Traced':>11}{'Per entity':>12}")
+    for row in build_memory_report(data):
+        if row["part"] == "total":
+            count = unit = per_entity = ""
+        else:
+            count = row["count"]
+            unit = row["unit"]
+            per_entity = f"{row['bytes_per_entity']:.0f} B" if row["count"] else "-"
+        print(
+            f"{row['part']:<18}{count:>10}  {unit:<12}{format_size(row['deep_bytes']):>11}"
+            f"{format_size(row['traced_bytes']):>11}{per_entity:>12}"
+        )
+    peak = LoadStats.get_peak_rss()
+    if peak:
+        print(f"Peak process memory {format_size(peak)}")
+
+
 def save_routes(data: RouteData) -> None:
     """
     purpose:
@@ -1069,15 +2918,126 @@ def load_routes() -> RouteData | None:
         return None
 
 
-def main() -> None:
+def toggle_metrics() -> None:
     """
     purpose:
-        The program main loop.
+        Starts timing the route and shape queries, or stops timing them if they already are.
+        Timings recorded so far are kept until the program quits.
+    parameter:
+        None
+    return:
+        None
+    """
+    if metrics.registry.enabled:
+        metrics.registry.disable()
+        print("Stopped timing queries")
+    else:
+        metrics.registry.enable()
+        print("Timing queries")
+
+
+def save_metrics() -> None:
+    """
+    purpose:
+        Asks the user for a file path to save the query call counts and latency histograms to.
+        Paths ending in .json are saved as JSON and any other path as Prometheus text.
+    parameter:
+        None
+    return:
+        None
+    """
+    metrics_path = input("Enter a filename: ")
+    if not metrics_path:
+        metrics_path = "metrics.prom"
+
+    try:
+        metrics.registry.write(metrics_path)
+        print(f"Query timings written to {metrics_path}")
+    except FileNotFoundError:
+        print(f"IOError: Couldn't save to {metrics_path}")
+
+
+def choose_profiling(profiler: CommandProfiler) -> None:
+    """
+    purpose:
+        Asks the user whether to profile the next command, every command, or none.
+        Each profiled command is saved as a pstats file and its hottest functions are printed.
     parameter:
+        profiler: The CommandProfiler object used by the menu
+    return:
         None
+    """
+    choice = input("Profile the (n)ext command, (a)ll commands, or (o)ff: ").strip().lower()
+    if choice == "n":
+        profiler.mode = "next"
+        print(f"Profiling the next command into {profiler.directory}")
+    elif choice == "a":
+        profiler.mode = "all"
+        print(f"Profiling every command into {profiler.directory}")
+    elif choice == "o":
+        profiler.mode = None
+        print("Profiling off")
+    else:
+        print("Invalid Option")
+
+
+def run_menu_option(data: RouteData, user_input: str) -> RouteData:
+    """
+    purpose:
+        Runs one menu option.
+    parameter:
+        data: The RouteData object the options work on
+        user_input: The option entered by the user
+    return:
+        The RouteData object to use from now on. Only option 8 replaces it.
+    """
+    if user_input == "1":
+        load_route_data(data)
+    elif user_input == "2":
+        load_shape_data(data)
+    elif user_input == "3":
+        load_disruptions_data(data)
+    elif user_input == "4":
+        print_shape_ids(data)
+    elif user_input == "5":
+        print_coordinates(data)
+    elif user_input == "6":
+        find_longest_shape(data)
+    elif user_input == "7":
+        save_routes(data)
+    elif user_input == "8":
+        out = load_routes()
+        if out:
+            data = out
+    elif user_input == "9":
+        InteractiveMap.start(data)
+    elif user_input == "10":
+        find_longest_shape_by_distance(data)
+    elif user_input == "11":
+        print_rankings(data)
+    elif user_input == "12":
+        toggle_metrics()
+    elif user_input == "13":
+        save_metrics()
+    elif user_input == "15":
+        print_memory_report(data)
+    else:
+        print("Invalid Option")
+    return data
+
+
+def main(profiler: CommandProfiler | None = None) -> None:
+    """
+    purpose:
+        The program main loop.
+    parameter:
+        profiler: Profiles the menu options while profiling is on. Defaults to profiling off,
+            saving into the profiles directory once it is switched on.
     return:
         None
     """
+    if profiler is None:
+        profiler = CommandProfiler("profiles")
     data = RouteData()
     running = True
     while running:
@@ -1085,25 +3045,434 @@ def main() -> None:
         user_input = input("Enter Command: ").strip()
         if user_input == "0":
             running = False
-        elif user_input == "1":
-            load_route_data(data)
-        elif user_input == "2":
-            load_shape_data(data)
-        elif user_input == "3":
-            load_disruptions_data(data)
-        elif user_input == "4":
-            print_shape_ids(data)
-        elif user_input == "5":
-            print_coordinates(data)
-        elif user_input == "6":
-            find_longest_shape(data)
-        elif user_input == "7":
-            save_routes(data)
-        elif user_input == "8":
-            out = load_routes()
-            if out:
-                data = out
-        elif user_input == "9":
-            InteractiveMap.start(data)
+        elif user_input == "14":
+            choose_profiling(profiler)
         else:
-            print("Invalid Option")
+            data = profiler.run(f"option-{user_input}", run_menu_option, data, user_input)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """
+    purpose:
+        Builds the command line parser for running queries without the menu.
+    parameter:
+        None
+    return:
+        The ArgumentParser object
+    """
+    parser = argparse.ArgumentParser(
+        description="Edmonton Transit System queries. Starts the interactive menu when no command is given."
+    )
+    parser.add_argument("--trips", default="data/trips.txt", help="path to the trips data file")
+    parser.add_argument("--shapes", default="data/shapes.txt", help="path to the shapes data file")
+    parser.add_argument(
+        "--disruptions",
+        default="data/traffic_disruptions.txt",
+        help="path to the disruptions data file",
+    )
+    parser.add_argument(
+        "--snapshot", help="load routes, shapes and disruptions from a pickle instead of the data files"
+    )
+    parser.add_argument(
+        "--format", choices=["tsv", "json"], default="tsv", help="print TSV rows or JSON lines"
+    )
+    parser.add_argument(
+        "--load-stats", action="store_true", help="print a JSON line of measurements to stderr for each loaded file"
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        help="time the queries and write their latency histograms to PATH when done, as JSON if it ends in .json",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="profile the command, or every menu command, saving a pstats file for each into DIR",
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    def add_id_command(name: str, help: str, id_name: str) -> argparse.ArgumentParser:
+        command = commands.add_parser(name, help=help)
+        command.add_argument(
+            "ids", nargs="*", metavar=id_name, help=f"{id_name}s to look up, or - to read them from stdin"
+        )
+        command.add_argument("--file", help=f"read {id_name}s from a file, one per line")
+        return command
+
+    add_id_command("shapes", "print the shape IDs of routes", "route_id")
+    add_id_command("coords", "print the coordinates of shapes", "shape_id")
+    longest = add_id_command("longest", "print the longest shape of routes", "route_id")
+    longest.add_argument(
+        "--by", choices=["coordinates", "distance"], default="coordinates", help="how shapes are measured"
+    )
+
+    render = add_id_command("render", "draw routes and disruptions into image files", "route_id")
+    render.add_argument("--all", action="store_true", help="render every route")
+    render.add_argument("--out", default=".", help="the directory to write the images to")
+    render.add_argument("--image-format", choices=["png", "ppm", "svg"], default="png")
+    render.add_argument("--no-background", action="store_true", help="leave out the Edmonton map")
+    render.add_argument(
+        "--date", type=date.fromisoformat, default=None, help="YYYY-MM-DD date for disruptions, defaults to today"
+    )
+
+    snapshot = commands.add_parser("snapshot", help="save or inspect a pickle of the loaded data")
+    snapshot.add_argument("action", choices=["save", "load"])
+    snapshot.add_argument("path", nargs="?", default="data/etsdata.p")
+
+    map_command = commands.add_parser(
+        "map", help="open the interactive map and load the data files in the background"
+    )
+    map_command.add_argument(
+        "--trace", metavar="PATH", help="write the stage timings of each search to PATH as Chrome trace events"
+    )
+
+    memory = commands.add_parser("memory", help="report the memory used by each part of the loaded data")
+    memory.add_argument(
+        "--build-caches",
+        action="store_true",
+        help="run the ranking queries first so their caches are measured too",
+    )
+
+    disruptions = commands.add_parser("disruptions", help="query disruptions")
+    disruptions.add_argument("action", choices=["active"])
+    disruptions.add_argument(
+        "--date", type=date.fromisoformat, default=None, help="YYYY-MM-DD date to check, defaults to today"
+    )
+    return parser
+
+
+def read_ids(ids: list[str], path: str | None) -> list[str]:
+    """
+    purpose:
+        Collects the IDs given on the command line, in a file, and on stdin.
+        Stdin is read when "-" is given or when there are no other IDs.
+    parameter:
+        ids: The IDs given on the command line
+        path: The file path to read more IDs from, or None
+    return:
+        The list of IDs in the order they were given
+    """
+    collected = [i for i in ids if i != "-"]
+    if path:
+        with open(path) as f:
+            collected.extend(line.strip() for line in f if line.strip())
+    if "-" in ids or (not ids and not path):
+        collected.extend(line.strip() for line in sys.stdin if line.strip())
+    return collected
+
+
+def report_not_loaded(data: RouteData, trips=False, shapes=False) -> bool:
+    """
+    purpose:
+        Prints the same error as the menu for data a command needs that hasn't been loaded,
+        such as a snapshot saved without shapes.
+    parameter:
+        data: The RouteData object the command uses
+        trips, shapes: Whether the command needs that data file
+    return:
+        Returns True if any of the data is missing. Otherwise, returns False.
+    """
+    if trips and not data.routes_loaded():
+        print("Route data hasn't been loaded yet", file=sys.stderr)
+        return True
+    if shapes and not data.shapes_loaded():
+        print("Shape ID data hasn't been loaded yet", file=sys.stderr)
+        return True
+    return False
+
+
+def load_batch_data(args: argparse.Namespace, trips=False, shapes=False, disruptions=False) -> RouteData:
+    """
+    purpose:
+        Loads the data files needed by a command once for the whole batch.
+    parameter:
+        args: The parsed command line arguments
+        trips, shapes, disruptions: Whether the command needs that data file
+    return:
+        The loaded RouteData object
+    """
+    if args.snapshot:
+        with open(args.snapshot, "rb") as f:
+            return pickle.load(f)
+    data = RouteData()
+    if trips:
+        data.load_trips_data(args.trips)
+    if shapes:
+        data.load_shapes_data(args.shapes)
+    if disruptions:
+        data.load_disruptions_data(args.disruptions)
+    if args.load_stats:
+        for kind, stats in data.load_stats().items():
+            print(json.dumps({"file": kind, **stats.to_dict()}), file=sys.stderr)
+    return data
+
+
+def write_record(fmt: str, record: dict, rows: list[list]) -> None:
+    """
+    purpose:
+        Prints one result as a JSON line, or as one or more TSV rows.
+    parameter:
+        fmt: Either "tsv" or "json"
+        record: The result to print as a JSON line
+        rows: The result to print as TSV rows
+    return:
+        None
+    """
+    if fmt == "json":
+        print(json.dumps(record))
+        return
+    for row in rows:
+        print("\t".join(str(value) for value in row))
+
+
+def cli(argv: list[str] | None = None) -> int:
+    """
+    purpose:
+        Runs a command line query, or the interactive menu when no command is given.
+    parameter:
+        argv: The command line arguments. Defaults to sys.argv[1:]
+    return:
+        The exit status. Returns 1 if any ID was not found or a file couldn't be opened.
+    """
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if "ids" in args and not args.ids and not args.file and not getattr(args, "all", False) and sys.stdin.isatty():
+        # Reading IDs from a terminal would wait for input nobody knows to type
+        parser.error(f"{args.command}: give IDs, --file, or pipe IDs on stdin")
+    profiler = CommandProfiler(args.profile or "profiles", "all" if args.profile else None)
+    if args.metrics:
+        metrics.registry.enable()
+    try:
+        if not args.command:
+            main(profiler)
+            return 0
+        # Results are printed to stdout, so the profile summary goes to stderr
+        profiler.stream = sys.stderr
+        return profiler.run(args.command, run_command, args)
+    finally:
+        if args.metrics:
+            metrics.registry.disable()
+            try:
+                metrics.registry.write(args.metrics)
+            except IOError:
+                print(f"IOError: Couldn't save to {args.metrics}", file=sys.stderr)
+
+
+# The data files each command reads, as the trips, shapes and disruptions arguments of load_batch_data
+COMMAND_FILES = {
+    "shapes": (True, False, False),
+    "coords": (False, True, False),
+    "longest": (True, True, False),
+    "render": (True, True, True),
+    "snapshot": (True, True, True),
+    "memory": (True, True, True),
+    "disruptions": (False, False, True),
+}
+
+
+def read_command_input(args: argparse.Namespace) -> tuple[RouteData | None, list[str]]:
+    """
+    purpose:
+        Opens everything a command reads: its data files or snapshot, and its ID file and stdin.
+    parameter:
+        args: The parsed command line arguments
+    return:
+        The loaded RouteData object, or None for a map that loads in the background,
+        and the IDs to look up. Raises an IOError if a file couldn't be opened.
+    """
+    if args.command == "snapshot" and args.action == "load":
+        with open(args.path, "rb") as f:
+            return pickle.load(f), []
+    if args.command == "map":
+        return (load_batch_data(args) if args.snapshot else None), []
+    data = load_batch_data(args, *COMMAND_FILES[args.command])
+    ids = []
+    if "ids" in args and not getattr(args, "all", False):
+        ids = read_ids(args.ids, args.file)
+    return data, ids
+
+
+def report_io_error(ex: OSError, action: str) -> None:
+    """
+    purpose:
+        Prints why a file couldn't be used.
+    parameter:
+        ex: The raised error
+        action: What was done to the file, such as "open" or "save to"
+    return:
+        None
+    """
+    if ex.filename is None:
+        print(f"IOError: {ex.strerror or ex}", file=sys.stderr)
+    else:
+        print(f"IOError: Couldn't {action} {ex.filename}", file=sys.stderr)
+
+
+def silence_stdout() -> None:
+    """
+    purpose:
+        Points stdout at devnull once its reader has gone, such as head after enough lines,
+        so flushing it at exit doesn't raise another BrokenPipeError.
+    parameter:
+        None
+    return:
+        None
+    """
+    try:
+        fileno = sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError):
+        return
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, fileno)
+    os.close(devnull)
+
+
+def run_command(args: argparse.Namespace) -> int:
+    """
+    purpose:
+        Runs the query given on the command line.
+    parameter:
+        args: The parsed command line arguments
+    return:
+        The exit status. Returns 1 if any ID was not found or a file couldn't be opened.
+    """
+    try:
+        data, ids = read_command_input(args)
+    except IOError as ex:
+        report_io_error(ex, "open")
+        return 1
+
+    status = 0
+    try:
+        if args.command == "shapes":
+            if report_not_loaded(data, trips=True):
+                return 1
+            for route_id in ids:
+                shape_ids = data.get_shape_ids_from_route_id(route_id)
+                if not shape_ids:
+                    print(f"{route_id}: ** NOT FOUND **", file=sys.stderr)
+                    status = 1
+                    continue
+                shape_ids = sorted(shape_ids)
+                write_record(
+                    args.format,
+                    {"route_id": route_id, "shape_ids": shape_ids},
+                    [[route_id, shape_id] for shape_id in shape_ids],
+                )
+
+        elif args.command == "coords":
+            if report_not_loaded(data, shapes=True):
+                return 1
+            for shape_id in ids:
+                coords = data.get_coords_from_shape_id(shape_id)
+                if not coords:
+                    print(f"{shape_id}: ** NOT FOUND **", file=sys.stderr)
+                    status = 1
+                    continue
+                points = [coord.get_coords() for coord in coords]
+                write_record(
+                    args.format,
+                    {"shape_id": shape_id, "coordinates": points},
+                    [[shape_id, lat, lon] for lat, lon in points],
+                )
+
+        elif args.command == "longest":
+            if report_not_loaded(data, trips=True, shapes=True):
+                return 1
+            for route_id in ids:
+                if args.by == "distance":
+                    out = data.get_longest_shape_by_distance_from_route_id(route_id)
+                else:
+                    out = data.get_longest_shape_from_route_id(route_id)
+                if not out:
+                    print(f"{route_id}: ** NOT FOUND **", file=sys.stderr)
+                    status = 1
+                    continue
+                shape_id, length = out
+                write_record(
+                    args.format,
+                    {"route_id": route_id, "shape_id": shape_id, args.by: length},
+                    [[route_id, shape_id, length]],
+                )
+
+        elif args.command == "render":
+            if args.all:
+                route_ids = sorted(route.route_id for route in data.get_routes() or [])
+            else:
+                route_ids = ids
+            try:
+                paths = MapRenderer.render_routes(
+                    data, route_ids, args.out, args.image_format, not args.no_background, args.date
+                )
+            except IOError as ex:
+                report_io_error(ex, "save to")
+                return 1
+            for route_id in route_ids:
+                if route_id not in paths:
+                    print(f"{route_id}: ** NOT FOUND **", file=sys.stderr)
+                    status = 1
+                    continue
+                write_record(
+                    args.format, {"route_id": route_id, "path": paths[route_id]}, [[route_id, paths[route_id]]]
+                )
+
+        elif args.command == "snapshot" and args.action == "save":
+            try:
+                with open(args.path, "wb") as f:
+                    pickle.dump(data, f)
+            except IOError as ex:
+                report_io_error(ex, "save to")
+                return 1
+            write_record(args.format, {"saved": args.path}, [["saved", args.path]])
+
+        elif args.command == "snapshot" and args.action == "load":
+            routes = data.get_routes() or []
+            disruptions = data.get_disruptions() or set()
+            record = {
+                "path": args.path,
+                "routes": len(routes),
+                "shapes": data.get_shape_count(),
+                "disruptions": len(disruptions),
+            }
+            write_record(args.format, record, [[key, value] for key, value in record.items()])
+
+        elif args.command == "map":
+            if data:
+                InteractiveMap.start(data, trace_path=args.trace)
+            else:
+                jobs = [("trips", args.trips), ("shapes", args.shapes), ("disruptions", args.disruptions)]
+                InteractiveMap.start(RouteData(), jobs, args.trace)
+
+        elif args.command == "memory":
+            if args.build_caches:
+                data.get_top_shapes(1)
+            for row in build_memory_report(data):
+                # Fields the total row doesn't have are left empty, so every TSV row has the same columns
+                write_record(args.format, row, [["" if value is None else value for value in row.values()]])
+
+        elif args.command == "disruptions":
+            day = args.date or date.today()
+            disruptions = sorted(
+                data.get_disruptions() or set(),
+                key=lambda disruption: (disruption.finish_date, disruption.coords.get_coords()),
+            )
+            for disruption in disruptions:
+                if not disruption.is_in_effect(day):
+                    continue
+                lat, lon = disruption.coords.get_coords()
+                finish_date = disruption.finish_date.isoformat()
+                write_record(
+                    args.format,
+                    {"finish_date": finish_date, "latitude": lat, "longitude": lon},
+                    [[finish_date, lat, lon]],
+                )
+    except BrokenPipeError:
+        # The reader stopped reading, such as head, so there's nobody left to tell
+        silence_stdout()
+        return 1
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
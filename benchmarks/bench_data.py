@@ -0,0 +1,245 @@
+"""Measures how RouteData scales with the size of the data files
+
+Writes a synthetic feed for each scale, then times every loader, the route
+and shape queries, saving and loading a pickle snapshot, and rendering
+routes into image files without a window. Each measurement is repeated and
+the median is reported. The results are written as JSON. Run from the
+repository root:
+
+    python benchmarks/bench_data.py [--scale 1 10] [--repeat 3] [--out bench_data.json]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from CMPT_Milestone2_EP_HM import InteractiveMap, MapRenderer, RouteData
+from synthetic_feed import feed_size, write_feed
+
+# The number of routes rendered into image files at each scale
+RENDERED_ROUTES = 10
+
+
+def measure(func: Callable[[], object], repeat: int, calls: int = 1) -> dict:
+    """
+    purpose:
+        Times a function several times
+    parameters:
+        func: The function to time. It is called with no arguments.
+        repeat: The number of times to call it
+        calls: How many operations each call does, to report the time of one operation
+    returns:
+        A dictionary with the median, minimum and maximum seconds of one call,
+        the median seconds of one operation, and the number of runs
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    median = statistics.median(samples)
+    return {
+        "median_s": median,
+        "min_s": min(samples),
+        "max_s": max(samples),
+        "per_op_s": median / calls,
+        "ops": calls,
+        "runs": repeat,
+    }
+
+
+def load(paths: dict[str, str]) -> RouteData:
+    """
+    purpose:
+        Loads every data file of a feed
+    parameters:
+        paths: The paths written by write_feed
+    returns:
+        The loaded RouteData object
+    """
+    data = RouteData()
+    data.load_trips_data(paths["trips"])
+    data.load_shapes_data(paths["shapes"])
+    data.load_disruptions_data(paths["disruptions"])
+    return data
+
+
+def time_loaders(paths: dict[str, str], repeat: int) -> dict[str, dict]:
+    """
+    purpose:
+        Times loading each data file into a new RouteData object
+    parameters:
+        paths: The paths written by write_feed
+        repeat: The number of times to load each file
+    returns:
+        A dictionary mapping each measurement name with its timings
+    """
+    timings = {}
+    for kind in ("trips", "shapes", "disruptions"):
+        loader = getattr(RouteData, f"load_{kind}_data")
+        timings[f"load_{kind}"] = measure(lambda: loader(RouteData(), paths[kind]), repeat)
+    return timings
+
+
+def time_queries(data: RouteData, repeat: int) -> dict[str, dict]:
+    """
+    purpose:
+        Times the route and shape queries over every route and shape
+    parameters:
+        data: A RouteData object with every file loaded
+        repeat: The number of times to run each query over everything
+    returns:
+        A dictionary mapping each measurement name with its timings
+    """
+    routes = data.get_routes()
+    route_ids = [route.route_id for route in routes]
+    shape_ids = [shape_id for route in routes for shape_id in route.shape_ids]
+    # Searches for the names of real routes, so each one scans up to its match
+    searches = [(route.locations[0], route.locations[-1]) for route in routes[:: max(len(routes) // 50, 1)]]
+
+    def run_all(query: Callable, ids: list) -> Callable[[], None]:
+        return lambda: [query(i) for i in ids]
+
+    return {
+        "shape_ids_from_route_id": measure(
+            run_all(data.get_shape_ids_from_route_id, route_ids), repeat, len(route_ids)
+        ),
+        "coords_from_shape_id": measure(run_all(data.get_coords_from_shape_id, shape_ids), repeat, len(shape_ids)),
+        "longest_shape_from_route_id": measure(
+            run_all(data.get_longest_shape_from_route_id, route_ids), repeat, len(route_ids)
+        ),
+        "longest_shape_by_distance": measure(
+            run_all(data.get_longest_shape_by_distance_from_route_id, route_ids), repeat, len(route_ids)
+        ),
+        "top_shapes": measure(lambda: data.get_top_shapes(10), repeat),
+        "search": measure(
+            lambda: [InteractiveMap.search(routes, from_s, to_s) for from_s, to_s in searches],
+            repeat,
+            len(searches),
+        ),
+    }
+
+
+def time_snapshot(data: RouteData, directory: str, repeat: int) -> tuple[dict[str, dict], int]:
+    """
+    purpose:
+        Times saving and loading a pickle snapshot of the loaded data
+    parameters:
+        data: A RouteData object with every file loaded
+        directory: The directory to write the snapshot in
+        repeat: The number of times to save and load it
+    returns:
+        A dictionary mapping each measurement name with its timings, and the size of the snapshot in bytes
+    """
+    path = os.path.join(directory, "snapshot.p")
+
+    def save():
+        with open(path, "wb") as f:
+            pickle.dump(data, f)
+
+    def load_snapshot():
+        with open(path, "rb") as f:
+            pickle.load(f)
+
+    timings = {"snapshot_save": measure(save, repeat)}
+    timings["snapshot_load"] = measure(load_snapshot, repeat)
+    return timings, os.path.getsize(path)
+
+
+def time_render(data: RouteData, directory: str, repeat: int) -> dict[str, dict]:
+    """
+    purpose:
+        Times rendering routes into image files without a window.
+        The background map is left out so only the drawing is timed.
+    parameters:
+        data: A RouteData object with every file loaded
+        directory: The directory to write the images in
+        repeat: The number of times to render the routes
+    returns:
+        A dictionary mapping each measurement name with its timings
+    """
+    route_ids = [route.route_id for route in data.get_routes()[:RENDERED_ROUTES]]
+    out_dir = os.path.join(directory, "render")
+    os.makedirs(out_dir, exist_ok=True)
+    return {
+        f"render_{image_format}": measure(
+            lambda: MapRenderer.render_routes(data, route_ids, out_dir, image_format, background=False),
+            repeat,
+            len(route_ids),
+        )
+        for image_format in ("ppm", "svg")
+    }
+
+
+def run_scale(scale: float, repeat: int, seed: int) -> dict:
+    """
+    purpose:
+        Writes a synthetic feed and runs every benchmark on it
+    parameters:
+        scale: The size of the feed, where 1 is the default size
+        repeat: The number of times each measurement is repeated
+        seed: Chooses the random feed
+    returns:
+        A dictionary with the scale, the feed size, the file sizes in bytes, and the timings
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_feed(directory, scale, seed)
+        # The trips loader reads data/routes.txt from the working directory
+        os.chdir(directory)
+        try:
+            timings = time_loaders(paths, repeat)
+            data = load(paths)
+            timings.update(time_queries(data, repeat))
+            snapshot_timings, snapshot_bytes = time_snapshot(data, directory, repeat)
+            timings.update(snapshot_timings)
+            timings.update(time_render(data, directory, repeat))
+        finally:
+            os.chdir(cwd)
+        file_bytes = {kind: os.path.getsize(path) for kind, path in paths.items()}
+    file_bytes["snapshot"] = snapshot_bytes
+    return {"scale": scale, "size": feed_size(scale), "bytes": file_bytes, "timings": timings}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, nargs="+", default=[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_data.json", help="the JSON file to write the results to")
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scale:
+        result = run_scale(scale, args.repeat, args.seed)
+        results.append(result)
+        print(f"scale {scale:g}: {result['size']['shape_rows']} shape rows, {result['size']['routes']} routes")
+        for name, timing in result["timings"].items():
+            per_op = f", {timing['per_op_s'] * 1e6:.1f} us per op" if timing["ops"] > 1 else ""
+            print(f"  {name}: median {timing['median_s'] * 1000:.2f} ms{per_op}")
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
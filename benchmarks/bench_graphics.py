@@ -0,0 +1,205 @@
+"""Measures how fast graphics4 draws many objects into a window
+
+Draws the same circles with a flush after every object, inside one
+GraphWin.batch() block, with frame scheduling, as one MarkerLayer, and
+inside batch() with canvas item pooling, and times creating an item against
+reusing a pooled one. Also compares reading and writing
+edmonton.png pixel by pixel against the bulk region calls. Needs a display.
+Run from the repository root:
+
+    python benchmarks/bench_graphics.py [--objects 500] [--frames 20]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import graphics4 as g
+
+
+def draw_circles(win, count: int, offset: int) -> list:
+    """
+    purpose:
+        Draws a grid of small circles
+    parameters:
+        win: The GraphWin to draw to
+        count: The number of circles to draw
+        offset: Shifts the grid so each frame looks different
+    returns:
+        The drawn circles
+    """
+    circles = []
+    for i in range(count):
+        circle = g.Circle(g.Point(10 + (i * 7 + offset) % 780, 10 + (i * 13) % 780), 3)
+        circle.setFill("red")
+        circle.draw(win)
+        circles.append(circle)
+    return circles
+
+
+def run(mode: str, count: int, frames: int) -> tuple[float, float]:
+    """
+    purpose:
+        Draws and undraws count circles per frame in one flushing mode
+    parameters:
+        mode: "autoflush", "batch", "frames", "markers" or "pooled"
+        count: The number of circles drawn each frame
+        frames: The number of frames to draw
+    returns:
+        The number of objects drawn per second and the slowest frame in seconds
+    """
+    win = g.GraphWin(f"bench {mode}", 800, 800)
+    if mode == "frames":
+        win.setFrameRate(60)
+    if mode == "pooled":
+        win.setPooling(True)
+    slowest = 0.0
+    start = time.perf_counter()
+    for frame in range(frames):
+        frame_start = time.perf_counter()
+        if mode == "markers":
+            xs = [10 + (i * 7 + frame) % 780 for i in range(count)]
+            ys = [10 + (i * 13) % 780 for i in range(count)]
+            layer = g.MarkerLayer(xs, ys, 3)
+            layer.setFill("red")
+            layer.draw(win)
+            layer.undraw()
+        elif mode in ("batch", "pooled"):
+            with win.batch():
+                circles = draw_circles(win, count, frame)
+                for circle in circles:
+                    circle.undraw()
+        else:
+            circles = draw_circles(win, count, frame)
+            for circle in circles:
+                circle.undraw()
+        slowest = max(slowest, time.perf_counter() - frame_start)
+    # Let any scheduled frame finish before stopping the clock
+    win.update()
+    elapsed = time.perf_counter() - start
+    if mode == "pooled":
+        print(f"pooled: {win.poolCreated} canvas items created, {win.poolReused} reused")
+    win.close()
+    return count * frames / elapsed, slowest
+
+
+def run_reuse(count: int, frames: int) -> None:
+    """
+    purpose:
+        Times creating canvas items against reusing pooled ones, per item
+    parameters:
+        count: The number of circles drawn each frame
+        frames: The number of frames to draw
+    returns:
+        None
+    """
+    win = g.GraphWin("bench reuse", 800, 800)
+    times = {}
+    for pooling in (False, True):
+        win.setPooling(pooling)
+        # Fill the pool once so every timed draw reuses an item
+        for circle in draw_circles(win, count, 0):
+            circle.undraw()
+        elapsed = 0.0
+        for frame in range(frames):
+            with win.batch():
+                start = time.perf_counter()
+                circles = draw_circles(win, count, frame)
+                elapsed += time.perf_counter() - start
+                for circle in circles:
+                    circle.undraw()
+        times[pooling] = elapsed / (count * frames)
+    win.close()
+    print(
+        f"reuse: create {times[False] * 1e6:.1f} us per item, reuse {times[True] * 1e6:.1f} us per item "
+        f"({times[True] / times[False]:.2f}x)"
+    )
+
+
+def run_image(path: str, size: int) -> None:
+    """
+    purpose:
+        Times reading and writing a size by size block of an image per pixel and as one region
+    parameters:
+        path: The image file to load
+        size: The width and height of the block
+    returns:
+        None
+    """
+    image = g.Image(g.Point(0, 0), path)
+
+    start = time.perf_counter()
+    pixels = [image.getPixel(x, y) for y in range(size) for x in range(size)]
+    per_pixel_read = time.perf_counter() - start
+    start = time.perf_counter()
+    for i, (r, gr, b) in enumerate(pixels):
+        image.setPixel(i % size, i // size, g.color_rgb(r, gr, b))
+    per_pixel_write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    region = image.getRegion(0, 0, size, size)
+    region_read = time.perf_counter() - start
+    start = time.perf_counter()
+    image.putRegion(0, 0, size, size, region)
+    region_write = time.perf_counter() - start
+
+    print(
+        f"image {size}x{size}: getPixel {per_pixel_read * 1000:.1f} ms, getRegion {region_read * 1000:.1f} ms, "
+        f"setPixel {per_pixel_write * 1000:.1f} ms, putRegion {region_write * 1000:.1f} ms"
+    )
+
+
+def run_pyramid(path: str) -> None:
+    """
+    purpose:
+        Times loading an image file the first and second time through ImagePyramid, and building its levels
+    parameters:
+        path: The image file to load
+    returns:
+        None
+    """
+    start = time.perf_counter()
+    pyramid = g.ImagePyramid.load(path)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    g.ImagePyramid.load(path)
+    second = time.perf_counter() - start
+    start = time.perf_counter()
+    for scale in (0.25, 0.5, 2):
+        pyramid.level(scale)
+    levels = time.perf_counter() - start
+    print(
+        f"ImagePyramid: first load {first * 1000:.1f} ms, cached load {second * 1000:.3f} ms, "
+        f"levels 1/4, 1/2, 2 built in {levels * 1000:.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=500)
+    parser.add_argument("--frames", type=int, default=20)
+    args = parser.parse_args()
+
+    try:
+        g.update()
+    except g.tk.TclError as ex:
+        print(f"Skipped: no display ({ex})")
+        return
+
+    for mode in ("autoflush", "batch", "frames", "markers", "pooled"):
+        rate, slowest = run(mode, args.objects, args.frames)
+        print(
+            f"{mode}: {rate:,.0f} objects/s, slowest frame {slowest * 1000:.1f} ms "
+            f"({args.objects} objects per frame)"
+        )
+    run_reuse(args.objects, args.frames)
+    map_path = str(Path(__file__).resolve().parent.parent / "edmonton.png")
+    run_pyramid(map_path)
+    run_image(map_path, 200)
+
+
+if __name__ == "__main__":
+    main()
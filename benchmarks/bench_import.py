@@ -0,0 +1,67 @@
+"""Measures how long it takes to start the program
+
+Each sample imports a module in a fresh interpreter, so nothing is shared
+between runs. Run from the repository root:
+
+    python benchmarks/bench_import.py [--runs 20]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Prints the time the import took and whether it pulled in Tk
+SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, "tkinter" in sys.modules, getattr(sys.modules.get("graphics4"), "_root", None) is not None)
+"""
+
+
+def time_import(module: str, runs: int) -> tuple[list[float], bool, bool]:
+    """
+    purpose:
+        Imports a module in a new interpreter several times
+    parameters:
+        module: The name of the module to import
+        runs: The number of interpreters to start
+    returns:
+        The import times in seconds, whether tkinter was imported, and whether a Tk root was created
+    """
+    samples = []
+    loaded_tk = created_root = False
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(module=module)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed, loaded_tk, created_root = out.stdout.split()
+        samples.append(float(elapsed))
+    return samples, loaded_tk == "True", created_root == "True"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    for module in ("CMPT_Milestone2_EP_HM", "graphics4"):
+        samples, loaded_tk, created_root = time_import(module, args.runs)
+        print(
+            f"{module}: median {statistics.median(samples) * 1000:.2f} ms, "
+            f"min {min(samples) * 1000:.2f} ms over {args.runs} runs "
+            f"(tkinter imported: {loaded_tk}, Tk root created: {created_root})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""Compares loader and query timings against a stored baseline
+
+Every metric runs a fixed number of operations per run and keeps the median
+of several runs, after one warm up run, so one slow run doesn't fail the
+gate. Memory per coordinate is measured with tracemalloc. A metric regresses
+when it is more than the baseline's threshold above the baseline; all the
+metrics are "lower is better".
+
+Timings depend on the machine and on whatever else it is running, so every
+timed run is paired with a run of a fixed reference workload that doesn't
+use the program. Timing metrics, ending in _ref, are the time of one
+operation divided by the time of the reference in the same pair, which
+stays about the same on a faster or busier machine. Metrics ending in _s
+are the time of one load in seconds, which only compare on the machine that
+wrote the baseline. Run from the repository root:
+
+    python benchmarks/perf_gate.py            # compare with the baseline
+    python benchmarks/perf_gate.py --update   # write a new baseline
+
+pytest gates the relative and memory metrics with fewer runs, allowing a
+larger slowdown of the timings. Setting ETS_PERF=1 runs the whole check,
+including the _s metrics.
+"""
+
+import argparse
+import gc
+import json
+import os
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from CMPT_Milestone2_EP_HM import InteractiveMap, RouteData, SrtParser
+from synthetic_feed import write_feed
+
+BASELINE_PATH = Path(__file__).resolve().parent / "perf_baseline.json"
+
+# The feed scale, runs per metric and allowed slowdown written into new baselines
+SCALE = 0.2
+RUNS = 5
+THRESHOLD = 0.25
+# Queries take microseconds, so each run repeats them over every ID this many times
+QUERY_PASSES = 50
+# The runs and allowed slowdown of timing metrics in the quicker gate pytest runs by default.
+# Fewer runs are noisier, so it only catches large regressions, such as a loop that became quadratic.
+QUICK_RUNS = 3
+QUICK_THRESHOLD = 1.0
+# The number of rows split and sorted by the reference workload
+REFERENCE_ROWS = 10000
+
+
+def reference_workload() -> None:
+    """
+    purpose:
+        Does a fixed amount of string, number and sorting work like the loaders,
+        without any of the program's code, to measure the speed of the machine
+    parameters:
+        None
+    returns:
+        None
+    """
+    rows = [f"{i},{i * 7919 % 1000},{i * 0.5}" for i in range(REFERENCE_ROWS)]
+    fields = [row.split(",") for row in rows]
+    fields.sort(key=lambda row: (int(row[1]), float(row[2])))
+
+
+def relative_time(func: Callable[[], object], runs: int, ops: int = 1) -> float:
+    """
+    purpose:
+        Times a function against the reference workload after one warm up call of each.
+        Each timed call directly follows a timed reference, so both see the same machine load.
+        The garbage collector is paused while timing, like timeit.
+    parameters:
+        func: The function to time. Each call does the same fixed amount of work.
+        runs: The number of timed calls
+        ops: The number of operations in each call
+    returns:
+        The median time of one operation divided by the time of the reference workload
+    """
+    reference_workload()
+    func()
+    ratios = []
+    gc.disable()
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            reference_workload()
+            middle = time.perf_counter()
+            func()
+            ratios.append((time.perf_counter() - middle) / (middle - start))
+    finally:
+        gc.enable()
+    return statistics.median(ratios) / ops
+
+
+def absolute_time(func: Callable[[], object], runs: int) -> float:
+    """
+    purpose:
+        Times a function after one warm up call, pausing the garbage collector like relative_time
+    parameters:
+        func: The function to time
+        runs: The number of timed calls
+    returns:
+        The median time of one call in seconds
+    """
+    func()
+    times = []
+    gc.disable()
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return statistics.median(times)
+
+
+def bytes_per_coordinate(shapes_path: str) -> float:
+    """
+    purpose:
+        Measures the memory kept by loading a shapes file, divided by its number of coordinates
+    parameters:
+        shapes_path: The path of the shapes file
+    returns:
+        The bytes of memory for each coordinate
+    """
+    data = RouteData()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        data.load_shapes_data(shapes_path)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (after - before) / data.load_stats()["shapes"].rows
+
+
+def collect(scale: float = SCALE, runs: int = RUNS, seed: int = 0, absolute: bool = True) -> dict[str, float]:
+    """
+    purpose:
+        Measures the gated metrics on a synthetic feed
+    parameters:
+        scale: The size of the feed
+        runs: The number of timed runs of each metric
+        seed: Chooses the random feed
+        absolute: Whether to also measure the load times in seconds
+    returns:
+        A dictionary mapping each metric name with its value
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_feed(directory, scale, seed)
+        # The trips loader reads data/routes.txt from the working directory
+        os.chdir(directory)
+        try:
+            with open(paths["disruptions"]) as f:
+                lines = f.readlines()[1:]
+            metrics = {
+                "srt_parse_line_ref": relative_time(
+                    lambda: [SrtParser.parse_line(line) for line in lines], runs, len(lines)
+                )
+            }
+            for kind in ("trips", "shapes", "disruptions"):
+                loader = getattr(RouteData, f"load_{kind}_data")
+                metrics[f"load_{kind}_ref"] = relative_time(lambda: loader(RouteData(), paths[kind]), runs)
+                if absolute:
+                    metrics[f"load_{kind}_s"] = absolute_time(lambda: loader(RouteData(), paths[kind]), runs)
+
+            data = RouteData()
+            data.load_trips_data(paths["trips"])
+            data.load_shapes_data(paths["shapes"])
+            data.load_disruptions_data(paths["disruptions"])
+            routes = data.get_routes()
+            route_ids = [route.route_id for route in routes]
+            shape_ids = [shape_id for route in routes for shape_id in route.shape_ids]
+            searches = [(route.locations[0], route.locations[-1]) for route in routes]
+            route_ids *= QUERY_PASSES
+            shape_ids *= QUERY_PASSES
+            searches *= QUERY_PASSES
+            metrics["longest_shape_ref"] = relative_time(
+                lambda: [data.get_longest_shape_from_route_id(i) for i in route_ids], runs, len(route_ids)
+            )
+            metrics["coords_from_shape_id_ref"] = relative_time(
+                lambda: [data.get_coords_from_shape_id(i) for i in shape_ids], runs, len(shape_ids)
+            )
+            metrics["search_ref"] = relative_time(
+                lambda: [InteractiveMap.search(routes, from_s, to_s) for from_s, to_s in searches],
+                runs,
+                len(searches),
+            )
+
+            snapshot = os.path.join(directory, "snapshot.p")
+
+            def save():
+                with open(snapshot, "wb") as f:
+                    pickle.dump(data, f)
+
+            def load():
+                with open(snapshot, "rb") as f:
+                    pickle.load(f)
+
+            metrics["snapshot_save_ref"] = relative_time(save, runs)
+            metrics["snapshot_load_ref"] = relative_time(load, runs)
+            metrics["shape_bytes_per_coordinate"] = bytes_per_coordinate(paths["shapes"])
+        finally:
+            os.chdir(cwd)
+    return metrics
+
+
+def compare(current: dict[str, float], baseline: dict, timing_threshold: float | None = None) -> list[str]:
+    """
+    purpose:
+        Finds the metrics that regressed past the baseline's threshold
+    parameters:
+        current: The measured metrics
+        baseline: The baseline dictionary with "threshold" and "metrics"
+        timing_threshold: The allowed slowdown of the _ref and _s metrics, instead of the baseline's
+    returns:
+        A line describing each regression. Metrics missing from either side are skipped.
+    """
+    regressions = []
+    for name, expected in baseline["metrics"].items():
+        if name not in current:
+            continue
+        threshold = baseline["threshold"]
+        if timing_threshold is not None and name.endswith(("_ref", "_s")):
+            threshold = timing_threshold
+        if current[name] > expected * (1 + threshold):
+            change = (current[name] / expected - 1) * 100
+            regressions.append(
+                f"{name}: {current[name]:.4g} is {change:.0f}% above the baseline {expected:.4g}"
+                f" (allowed {threshold * 100:.0f}%)"
+            )
+    return regressions
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> dict:
+    """
+    purpose:
+        Reads a baseline file
+    parameters:
+        path: The path of the baseline
+    returns:
+        The baseline dictionary with "scale", "runs", "threshold" and "metrics"
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_baseline(metrics: dict[str, float], path: Path = BASELINE_PATH) -> None:
+    """
+    purpose:
+        Writes a new baseline file
+    parameters:
+        metrics: The measured metrics
+        path: The path of the baseline
+    returns:
+        None
+    """
+    baseline = {"scale": SCALE, "runs": RUNS, "threshold": THRESHOLD, "metrics": metrics}
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="write the measurements as the new baseline")
+    args = parser.parse_args()
+
+    if args.update:
+        metrics = collect()
+        write_baseline(metrics)
+        print(f"Baseline written to {BASELINE_PATH}")
+        return
+
+    baseline = load_baseline()
+    metrics = collect(baseline["scale"], baseline["runs"])
+    for name, value in metrics.items():
+        expected = baseline["metrics"].get(name)
+        change = f" ({(value / expected - 1) * 100:+.0f}%)" if expected else ""
+        print(f"{name}: {value:.4g}{change}")
+    regressions = compare(metrics, baseline)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
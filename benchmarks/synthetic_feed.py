@@ -0,0 +1,159 @@
+"""Writes synthetic ETS data files of any size for benchmarking
+
+The files have the same columns as the real trips.txt, routes.txt,
+shapes.txt and traffic_disruptions.txt, so the program loads them without
+changes. The same scale and seed always write the same bytes.
+
+Scale 1 has 100 routes with 4 shapes of 300 points each (120,000 shape
+rows), 20 trips per shape and 300 disruptions. The number of routes and
+disruptions grows with the scale, while each route keeps the same shapes.
+Write a feed from the repository root with:
+
+    python benchmarks/synthetic_feed.py DIR [--scale 10] [--seed 0]
+"""
+
+import argparse
+import os
+import random
+from datetime import date, timedelta
+
+# The size of the feed at scale 1
+ROUTES = 100
+SHAPES_PER_ROUTE = 4
+POINTS_PER_SHAPE = 300
+TRIPS_PER_SHAPE = 20
+DISRUPTIONS = 300
+
+# The area shapes and disruptions are placed in, around Edmonton
+LATITUDES = (53.40, 53.65)
+LONGITUDES = (-113.70, -113.30)
+
+# Route names are joined from these places, so searches have something to match
+PLACES = [f"Place {i}" for i in range(1, 61)]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def feed_size(scale: float) -> dict[str, int]:
+    """
+    purpose:
+        Computes how many of each entity a feed of a given scale has
+    parameters:
+        scale: The size of the feed, where 1 is the default size
+    returns:
+        A dictionary with the number of routes, shapes, shape rows, trip rows and disruptions
+    """
+    routes = max(round(ROUTES * scale), 1)
+    shapes = routes * SHAPES_PER_ROUTE
+    return {
+        "routes": routes,
+        "shapes": shapes,
+        "shape_rows": shapes * POINTS_PER_SHAPE,
+        "trip_rows": shapes * TRIPS_PER_SHAPE,
+        "disruptions": max(round(DISRUPTIONS * scale), 1),
+    }
+
+
+def format_date(day: date) -> str:
+    """
+    purpose:
+        Formats a date like the disruptions file, without depending on the locale
+    parameters:
+        day: The date to format
+    returns:
+        A string of form "Sep 06, 2024"
+    """
+    return f"{MONTHS[day.month - 1]} {day.day:02d}, {day.year}"
+
+
+def write_feed(directory: str, scale: float = 1, seed: int = 0) -> dict[str, str]:
+    """
+    purpose:
+        Writes the four data files into the data directory inside a directory.
+        The trips loader reads data/routes.txt from the working directory,
+        so the program should be run from the given directory.
+    parameters:
+        directory: The directory to write the data directory into
+        scale: The size of the feed, where 1 is the default size
+        seed: Chooses the random names, shapes and dates
+    returns:
+        A dictionary mapping "trips", "routes", "shapes" and "disruptions" with the path of their file
+    """
+    rng = random.Random(seed)
+    size = feed_size(scale)
+    data_dir = os.path.join(directory, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    paths = {
+        kind: os.path.join(data_dir, name)
+        for kind, name in [
+            ("trips", "trips.txt"),
+            ("routes", "routes.txt"),
+            ("shapes", "shapes.txt"),
+            ("disruptions", "traffic_disruptions.txt"),
+        ]
+    }
+
+    route_ids = [f"{i:03d}" for i in range(1, size["routes"] + 1)]
+    with open(paths["routes"], "w") as f:
+        f.write(
+            "route_id,agency_id,route_short_name,route_long_name,route_desc,"
+            "route_type,route_url,route_color,route_text_color\n"
+        )
+        for route_id in route_ids:
+            name = " - ".join(rng.sample(PLACES, rng.randint(1, 3)))
+            f.write(f'{route_id},1,{route_id},"{name}",,3,,005087,FFFFFF\n')
+
+    with open(paths["shapes"], "w") as shapes, open(paths["trips"], "w") as trips:
+        shapes.write("shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n")
+        trips.write("route_id,service_id,trip_id,trip_headsign,direction_id,block_id,shape_id\n")
+        trip_id = 0
+        for route_id in route_ids:
+            for k in range(1, SHAPES_PER_ROUTE + 1):
+                shape_id = f"{route_id}-{k}"
+                # A random walk of short steps, like a bus route through streets
+                lat = rng.uniform(*LATITUDES)
+                lon = rng.uniform(*LONGITUDES)
+                for sequence in range(1, POINTS_PER_SHAPE + 1):
+                    shapes.write(f"{shape_id},{lat:.6f},{lon:.6f},{sequence}\n")
+                    lat = min(max(lat + rng.uniform(-0.001, 0.001), LATITUDES[0]), LATITUDES[1])
+                    lon = min(max(lon + rng.uniform(-0.0015, 0.0015), LONGITUDES[0]), LONGITUDES[1])
+                for _ in range(TRIPS_PER_SHAPE):
+                    trip_id += 1
+                    direction = k % 2
+                    trips.write(f"{route_id},1,{trip_id},Place,{direction},{trip_id // 10},{shape_id}\n")
+
+    first_day = date(2024, 1, 1)
+    with open(paths["disruptions"], "w") as f:
+        f.write(
+            "Disruption ID,Date Issued,Start Date,Finish Date,Status,Closure,On Street,From Street,"
+            "To Street,Impact,Duration,Details,Description,Activity Type,Traffic District,"
+            "Infrastructure,point\n"
+        )
+        for i in range(1, size["disruptions"] + 1):
+            start = first_day + timedelta(days=rng.randrange(3 * 365))
+            finish = start + timedelta(days=rng.randrange(1, 400))
+            issued = start - timedelta(days=rng.randrange(30))
+            lat = rng.uniform(*LATITUDES)
+            lon = rng.uniform(*LONGITUDES)
+            # Quoted fields with commas in them, like the real file, exercise SrtParser
+            f.write(
+                f'{i},"{format_date(issued)}","{format_date(start)}","{format_date(finish)}",'
+                f"Current,Lane closure,{i} Avenue NW,{i} Street NW,{i + 1} Street NW,Travel Delays,"
+                f'{(finish - start).days} Days,"Lane closed, expect delays.",Construction,Construction,'
+                f"Central,Road,POINT ({lon} {lat})\n"
+            )
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--scale", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for kind, path in write_feed(args.directory, args.scale, args.seed).items():
+        print(f"{kind}: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""Geographic helpers for measuring shapes along the earth's surface
+
+Distances are great-circle (haversine) distances in kilometres. Shapes are
+given as sequences of (latitude, longitude) pairs, the same order used by
+shapes.txt and Coordinates.get_coords().
+"""
+
+import math
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Iterable, Mapping, Sequence
+
+# Mean earth radius in kilometres (IUGG)
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    purpose:
+        Computes the great-circle distance between two points
+    parameters:
+        lat1, lon1: The latitude and longitude of the first point in degrees
+        lat2, lon2: The latitude and longitude of the second point in degrees
+    returns:
+        The distance between both points in kilometres
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _segment_lengths(lats: array, lons: array) -> array:
+    """
+    purpose:
+        Computes the length of every segment between consecutive points of a flat coordinate stream
+    parameters:
+        lats: The latitudes of the stream in radians
+        lons: The longitudes of the stream in radians
+    returns:
+        An array of len(lats) - 1 distances in kilometres
+    """
+    if len(lats) < 2:
+        return array("d")
+    cos_lats = array("d", map(math.cos, lats))
+    sin = math.sin
+    asin = math.asin
+    sqrt = math.sqrt
+    diameter = 2 * EARTH_RADIUS_KM
+    # Every iterator is shifted by one so each step pairs point i with point i + 1
+    return array(
+        "d",
+        (
+            diameter * asin(sqrt(sin((phi2 - phi1) / 2) ** 2 + c1 * c2 * sin((lam2 - lam1) / 2) ** 2))
+            for phi1, phi2, lam1, lam2, c1, c2 in zip(
+                lats, lats[1:], lons, lons[1:], cos_lats, cos_lats[1:]
+            )
+        ),
+    )
+
+
+def cumulative_distances(coords: Iterable[tuple[float, float]]) -> array:
+    """
+    purpose:
+        Computes the distance travelled along a shape at each of its points
+    parameters:
+        coords: The (latitude, longitude) points of the shape in degrees
+    returns:
+        An array where index i is the distance in kilometres from the first point to point i.
+        The first value is always 0.0 and the last value is the length of the shape.
+    """
+    return build_distance_index({"": coords})[""]
+
+
+def build_distance_index(shapes: Mapping[str, Iterable[tuple[float, float]]]) -> dict[str, array]:
+    """
+    purpose:
+        Computes the cumulative distance arrays of every shape in one pass.
+        All shapes are flattened into a single coordinate stream so the segment lengths
+        are computed together, then the stream is cut back up at each shape's offset.
+    parameters:
+        shapes: Maps each shape ID to its (latitude, longitude) points in degrees
+    returns:
+        A dictionary mapping each shape ID to its cumulative distance array
+    """
+    ids: list[str] = []
+    offsets: list[int] = [0]
+    lats = array("d")
+    lons = array("d")
+    for shape_id, coords in shapes.items():
+        for lat, lon in coords:
+            lats.append(lat)
+            lons.append(lon)
+        ids.append(shape_id)
+        offsets.append(len(lats))
+
+    lats = array("d", map(math.radians, lats))
+    lons = array("d", map(math.radians, lons))
+    segments = _segment_lengths(lats, lons)
+
+    index: dict[str, array] = {}
+    for i, shape_id in enumerate(ids):
+        start, end = offsets[i], offsets[i + 1]
+        if start == end:
+            index[shape_id] = array("d")
+            continue
+        # The segment leaving the last point of a shape joins it to the next shape, so it is skipped
+        index[shape_id] = array("d", accumulate(segments[start : end - 1], initial=0.0))
+    return index
+
+
+def segment_at_distance(distances: Sequence[float], distance: float) -> tuple[int, float]:
+    """
+    purpose:
+        Finds the segment of a shape that a given distance along it falls on using a binary search
+    parameters:
+        distances: The cumulative distance array of the shape. It must not be empty.
+        distance: The distance in kilometres from the start of the shape.
+            Values outside of the shape's length are clamped to its ends.
+    returns:
+        The index i of the point starting the segment, and how far along the segment to point i + 1
+        the distance lies from 0 to 1. Distances on a point give that point's index and 0.
+    """
+    if distance <= 0:
+        return 0, 0.0
+    if distance >= distances[-1]:
+        return len(distances) - 1, 0.0
+    i = bisect_left(distances, distance)
+    start, end = distances[i - 1], distances[i]
+    return i - 1, (distance - start) / (end - start)
+
+
+def position_at_distance(
+    coords: Sequence[tuple[float, float]], distances: Sequence[float], distance: float
+) -> tuple[float, float] | None:
+    """
+    purpose:
+        Finds the point that lies a given distance along a shape using a binary search
+    parameters:
+        coords: The (latitude, longitude) points of the shape
+        distances: The cumulative distance array of the shape
+        distance: The distance in kilometres from the start of the shape.
+            Values outside of the shape's length are clamped to its ends.
+    returns:
+        The interpolated (latitude, longitude) point. Returns None if the shape has no points.
+    """
+    if not coords:
+        return None
+    i, t = segment_at_distance(distances, distance)
+    if t == 0:
+        return coords[i]
+    lat1, lon1 = coords[i]
+    lat2, lon2 = coords[i + 1]
+    # Segments are short enough that interpolating the degrees linearly is accurate
+    return lat1 + (lat2 - lat1) * t, lon1 + (lon2 - lon1) * t
+
+
+def simplify(points: Sequence[tuple[float, float]], tolerance: float) -> list[int]:
+    """
+    purpose:
+        Simplifies a line with the Douglas-Peucker algorithm, keeping only the points that
+        change its path by more than the tolerance
+    parameters:
+        points: The (x, y) points of the line
+        tolerance: The largest distance a removed point may be from the simplified line
+    returns:
+        The indices of the kept points in order. The first and last points are always kept.
+    """
+    if len(points) < 3:
+        return list(range(len(points)))
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    # An explicit stack instead of recursion, since shapes can have thousands of points
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = points[first]
+        x2, y2 = points[last]
+        dx = x2 - x1
+        dy = y2 - y1
+        length = math.hypot(dx, dy)
+        farthest = -1.0
+        index = first
+        for i in range(first + 1, last):
+            x, y = points[i]
+            if length == 0:
+                distance = math.hypot(x - x1, y - y1)
+            else:
+                # Perpendicular distance from the point to the line through first and last
+                distance = abs(dy * x - dx * y + x2 * y1 - y2 * x1) / length
+            if distance > farthest:
+                farthest = distance
+                index = i
+        if farthest > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [i for i, kept in enumerate(keep) if kept]
+
+
+class SpatialGrid:
+    """A uniform grid index of bounding boxes for finding the items inside a rectangle"""
+
+    def __init__(self, cell_size: float):
+        """
+        purpose:
+            Constructs a SpatialGrid object
+        parameters:
+            cell_size: The width and height of each grid cell
+        returns:
+            None
+        """
+        self.cell_size = cell_size
+        # Maps the (column, row) of a cell with the items overlapping it
+        self.cells: dict[tuple[int, int], list] = {}
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __cell_range(self, x1: float, y1: float, x2: float, y2: float):
+        """
+        purpose:
+            Finds the cells overlapped by a rectangle
+        parameters:
+            x1, y1, x2, y2: Any two opposite corners of the rectangle
+        returns:
+            The column range and row range of the overlapped cells
+        """
+        size = self.cell_size
+        columns = range(int(min(x1, x2) // size), int(max(x1, x2) // size) + 1)
+        rows = range(int(min(y1, y2) // size), int(max(y1, y2) // size) + 1)
+        return columns, rows
+
+    def insert(self, item, x1: float, y1: float, x2: float, y2: float) -> None:
+        """
+        purpose:
+            Adds an item with a bounding box. A point is a box with both corners the same.
+        parameters:
+            item: The item to return from queries
+            x1, y1, x2, y2: Any two opposite corners of the item's bounding box
+        returns:
+            None
+        """
+        columns, rows = self.__cell_range(x1, y1, x2, y2)
+        for column in columns:
+            for row in rows:
+                self.cells.setdefault((column, row), []).append(item)
+        self.size += 1
+
+    def query(self, x1: float, y1: float, x2: float, y2: float) -> set:
+        """
+        purpose:
+            Finds the items whose cells overlap a rectangle.
+            Items near the edge of the rectangle may be returned even if they are just outside of it.
+        parameters:
+            x1, y1, x2, y2: Any two opposite corners of the rectangle
+        returns:
+            The set of found items
+        """
+        found = set()
+        columns, rows = self.__cell_range(x1, y1, x2, y2)
+        if len(columns) * len(rows) > len(self.cells):
+            # The rectangle covers more cells than are filled, so check the filled ones instead
+            for (column, row), items in self.cells.items():
+                if column in columns and row in rows:
+                    found.update(items)
+            return found
+        for column in columns:
+            for row in rows:
+                items = self.cells.get((column, row))
+                if items:
+                    found.update(items)
+        return found
+
+
+class GridClusters:
+    """Points merged into one cluster for each cell of a uniform grid.
+    Adding or removing a point only updates the cluster of its cell."""
+
+    def __init__(self, cell_size: float):
+        """
+        purpose:
+            Constructs a GridClusters object
+        parameters:
+            cell_size: The width and height of each grid cell
+        returns:
+            None
+        """
+        self.cell_size = cell_size
+        # Maps the (column, row) of a cell with the [sum of x, sum of y, count] of its points
+        self.cells: dict[tuple[int, int], list[float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def add(self, x: float, y: float) -> None:
+        """
+        purpose:
+            Adds a point to the cluster of its cell
+        parameters:
+            x, y: The position of the point
+        returns:
+            None
+        """
+        cell = (int(x // self.cell_size), int(y // self.cell_size))
+        cluster = self.cells.get(cell)
+        if cluster is None:
+            cluster = self.cells[cell] = [0.0, 0.0, 0]
+        cluster[0] += x
+        cluster[1] += y
+        cluster[2] += 1
+
+    def remove(self, x: float, y: float) -> None:
+        """
+        purpose:
+            Removes a point that was added with the same position
+        parameters:
+            x, y: The position of the point
+        returns:
+            None
+        """
+        cell = (int(x // self.cell_size), int(y // self.cell_size))
+        cluster = self.cells[cell]
+        cluster[2] -= 1
+        if cluster[2] == 0:
+            del self.cells[cell]
+            return
+        cluster[0] -= x
+        cluster[1] -= y
+
+    def query(self, x1: float, y1: float, x2: float, y2: float) -> list[tuple[float, float, int]]:
+        """
+        purpose:
+            Finds the clusters of the cells overlapping a rectangle
+        parameters:
+            x1, y1, x2, y2: Any two opposite corners of the rectangle
+        returns:
+            A list of (x, y, count) tuples ordered by cell, where x and y are the mean position
+            of the cluster's points and count is how many points it holds
+        """
+        size = self.cell_size
+        columns = range(int(min(x1, x2) // size), int(max(x1, x2) // size) + 1)
+        rows = range(int(min(y1, y2) // size), int(max(y1, y2) // size) + 1)
+        if len(columns) * len(rows) > len(self.cells):
+            # The rectangle covers more cells than are filled, so check the filled ones instead
+            cells = sorted(cell for cell in self.cells if cell[0] in columns and cell[1] in rows)
+        else:
+            cells = [(column, row) for column in columns for row in rows if (column, row) in self.cells]
+        found = []
+        for cell in cells:
+            sum_x, sum_y, count = self.cells[cell]
+            found.append((sum_x / count, sum_y / count, count))
+        return found
@@ -39,10 +39,12 @@ setCoords method and pointer-based input through getMouse.
 The library provides the following graphical objects:
     Point
     Line
+    Polyline
     Circle
     Oval
     Rectangle
     Polygon
+    MarkerLayer (many circles sharing one canvas tag)
     Text
     Entry (for text-based input)
     Image
@@ -61,6 +63,36 @@ Programming: An Introduction to Computer Science" by John Zelle,
 published by Franklin, Beedle & Associates.  Also see
 http://mcsp.wartburg.edu/zelle/python for a quick reference"""
 
+# Version 4.3
+#     * The Tk root is created by the first window, entry or image instead of
+#         at import time, so importing the module works without a display.
+#     * Added Polyline, which draws many connected segments as one Tk item.
+#     * Added GraphWin.batch() and GraphWin.setFrameRate() to coalesce
+#         autoflush updates instead of updating after every change.
+#     * Added MarkerLayer, which draws many circles in one pass and styles,
+#         hides or moves them all together through a shared canvas tag.
+#     * Added GraphWin.bindKey and GraphWin.mainloop for event driven
+#         programs that don't poll with getMouse. Keys can be ignored while
+#         typing into an Entry.
+#     * Added LayerManager to show, hide, recolor and delete named groups of
+#         drawn objects with one Tk call each, keeping controls above them.
+#     * Added GraphWin.setPooling. Undrawn canvas items are hidden and kept,
+#         then reused by later draws by resetting their options to the
+#         defaults of their type, read once per type, and updating their
+#         coords and options.
+#     * Added Polyline.setPoints and MarkerLayer.setPositions to update
+#         drawn items in place.
+#     * Added Image.getRegion, putRegion, getRow, putRow, getPPM and putPPM
+#         to move many pixels in one Tk call instead of one per pixel.
+#     * Added ImagePyramid, which decodes an image file once per process and
+#         keeps zoomed and subsampled copies of it. Image also accepts a
+#         tk.PhotoImage so cached images can be drawn without decoding.
+#     * Added GraphWin.setWheelHandler and GraphWin.setDragHandler, and
+#         Image.setImage to swap the picture of a drawn image. Drags can be
+#         limited to presses outside of controls.
+#     * Added Image.fromData for images held in memory, such as translucent
+#         PNG overlays, optionally scaled up by a whole number.
+#     * Added Slider, a horizontal scale for choosing a whole number.
 # Version 4.2 5/26/2011
 #     * Modified Image to allow multiple undraws like other GraphicsObjects
 # Version 4.1 12/29/2009
@@ -146,7 +178,8 @@ http://mcsp.wartburg.edu/zelle/python for a quick reference"""
 #     Added ability to set text atttributes.
 #     Added Entry boxes.
 
-import time, os, sys
+import base64, time, os, sys
+from contextlib import contextmanager
 
 try:  # import as appropriate for 2.x vs. 3.x
    import tkinter as tk
@@ -166,11 +199,18 @@ UNSUPPORTED_METHOD = "Object doesn't support operation"
 BAD_OPTION = "Illegal option value"
 DEAD_THREAD = "Graphics thread quit unexpectedly"
 
-_root = tk.Tk()
-_root.withdraw()
+# The shared Tk root is created on first use by _getRoot()
+_root = None
+
+def _getRoot():
+    global _root
+    if _root is None:
+        _root = tk.Tk()
+        _root.withdraw()
+    return _root
 
 def update():
-    _root.update()
+    _getRoot().update()
 
 ############################################################################
 # Graphics classes start here
@@ -181,7 +221,7 @@ class GraphWin(tk.Canvas):
 
     def __init__(self, title="Graphics Window",
                  width=200, height=200, autoflush=True):
-        master = tk.Toplevel(_root)
+        master = tk.Toplevel(_getRoot())
         master.protocol("WM_DELETE_WINDOW", self.close)
         tk.Canvas.__init__(self, master, width=width, height=height)
         self.master.title(title)
@@ -195,11 +235,25 @@ class GraphWin(tk.Canvas):
         self.height = height
         self.width = width
         self.autoflush = autoflush
+        # Nesting depth of batch() blocks and whether they hold unflushed changes
+        self._batchDepth = 0
+        self._dirty = False
+        # Milliseconds between scheduled frames, or None to flush immediately
+        self._frameDelay = None
+        self._framePending = False
+        # Free canvas item ids by item type, or None when pooling is off
+        self._pool = None
+        self._kinds = {}
+        # The default options of each item type, read from the first reused item
+        self._defaults = {}
+        self.poolCreated = 0
+        self.poolReused = 0
         self._mouseCallback = None
+        self._inMainloop = False
         self.trans = None
         self.closed = False
         master.lift()
-        if autoflush: _root.update()
+        if autoflush: _getRoot().update()
 
     def __checkOpen(self):
         if self.closed:
@@ -223,6 +277,8 @@ class GraphWin(tk.Canvas):
         self.closed = True
         self.master.destroy()
         self.__autoflush()
+        if self._inMainloop:
+            _getRoot().quit()
 
 
     def isClosed(self):
@@ -234,8 +290,119 @@ class GraphWin(tk.Canvas):
 
 
     def __autoflush(self):
-        if self.autoflush:
-            _root.update()
+        self._requestFlush()
+
+    def _requestFlush(self):
+        # Called after every change to an item on this window
+        if not self.autoflush:
+            return
+        if self.closed:
+            _getRoot().update()
+        elif self._batchDepth:
+            self._dirty = True
+        elif self._frameDelay is not None:
+            self._scheduleFrame()
+        else:
+            _getRoot().update()
+
+    def _scheduleFrame(self):
+        # At most one frame is pending, however many changes ask for one
+        if self._framePending or self.closed:
+            return
+        self._framePending = True
+        self.after(self._frameDelay, self._flushFrame)
+
+    def _flushFrame(self):
+        self._framePending = False
+        if not self.closed:
+            self.update_idletasks()
+
+    @contextmanager
+    def batch(self):
+        """Suspend autoflush inside a with block. All changes made in
+        the block are flushed together when the outermost block exits"""
+        self._batchDepth += 1
+        try:
+            yield self
+        finally:
+            self._batchDepth -= 1
+            if self._batchDepth == 0 and self._dirty:
+                self._dirty = False
+                self._requestFlush()
+
+    def setPooling(self, enabled):
+        """When enabled, undrawn items are hidden and kept instead of
+        deleted, and new items of the same type reuse them"""
+        if enabled and self._pool is None:
+            self._pool = {}
+        elif not enabled and self._pool is not None:
+            for items in self._pool.values():
+                for item in items:
+                    self.delete(item)
+            self._pool = None
+            self._kinds = {}
+
+    def _create(self, itemType, args, kw):
+        # Every create_line, create_oval, ... goes through here
+        if self._pool is None:
+            return tk.Canvas._create(self, itemType, args, kw)
+        free = self._pool.get(itemType)
+        if not free:
+            item = tk.Canvas._create(self, itemType, args, kw)
+            self._kinds[item] = itemType
+            self.poolCreated += 1
+            return item
+
+        item = free.pop()
+        args = tk._flatten(args)
+        options = {}
+        if args and isinstance(args[-1], dict):
+            options.update(args[-1])
+            args = args[:-1]
+        options.update(kw)
+        # The item keeps the options it was last drawn with, so every option
+        # is set back to the default of its type in the same call
+        defaults = self._defaults.get(itemType)
+        if defaults is None:
+            defaults = {}
+            for name, spec in self.itemconfigure(item).items():
+                if len(spec) == 5:
+                    defaults[name] = spec[3]
+            self._defaults[itemType] = defaults
+        reset = dict(defaults)
+        # A new item would have no other tags and be shown on top
+        reset["state"] = "normal"
+        reset["tags"] = ""
+        reset.update(options)
+        options = reset
+        self.coords(item, *args)
+        self.itemconfigure(item, options)
+        self.tag_raise(item)
+        self.poolReused += 1
+        return item
+
+    def _releaseItems(self, tagOrId):
+        """Delete the items, or keep them hidden for reuse when pooling"""
+        if self._pool is None:
+            self.delete(tagOrId)
+            return
+        items = self.find_withtag(tagOrId)
+        self.itemconfigure(tagOrId, state="hidden", tags="")
+        for item in items:
+            kind = self._kinds.get(item)
+            if kind is None:
+                # Created before pooling was turned on
+                self.delete(item)
+            else:
+                self._pool.setdefault(kind, []).append(item)
+
+    def setFrameRate(self, fps):
+        """Coalesce autoflush updates into at most one redraw every
+        1/fps seconds. None flushes after every change again"""
+        if fps is None:
+            self._frameDelay = None
+        else:
+            self._frameDelay = max(1, int(1000 / fps))
 
 
     def plot(self, x, y, color="black"):
@@ -311,12 +478,148 @@ class GraphWin(tk.Canvas):
     def setMouseHandler(self, func):
         self._mouseCallback = func
 
+    def setWheelHandler(self, func):
+        """Call func(point, steps) when the mouse wheel turns over the
+        window. steps is 1 for each notch away from the user, -1 towards"""
+        def onWheel(e):
+            if e.num == 4: steps = 1
+            elif e.num == 5: steps = -1
+            else: steps = 1 if e.delta > 0 else -1
+            func(Point(e.x, e.y), steps)
+        # Windows and macOS send MouseWheel events, X11 sends buttons 4 and 5
+        self.bind("<MouseWheel>", onWheel)
+        self.bind("<Button-4>", onWheel)
+        self.bind("<Button-5>", onWheel)
+
+    def setDragHandler(self, func, startsDrag=None):
+        """Call func(dx, dy) with the distance the mouse moved each time
+        it moves while the left button is held down. When given,
+        startsDrag(x, y) tells whether a press at x, y starts a drag"""
+        self._dragFrom = None
+        def onPress(e):
+            if startsDrag is None or startsDrag(e.x, e.y):
+                self._dragFrom = (e.x, e.y)
+            else:
+                self._dragFrom = None
+        def onMotion(e):
+            if self._dragFrom is None: return
+            x0, y0 = self._dragFrom
+            self._dragFrom = (e.x, e.y)
+            func(e.x - x0, e.y - y0)
+        # add="+" keeps the click binding used by getMouse and setMouseHandler
+        self.bind("<Button-1>", onPress, add="+")
+        self.bind("<B1-Motion>", onMotion)
+
+    def bindKey(self, key, func, whileTyping=True):
+        """Call func() whenever key is pressed while the window has
+        focus. key is a Tk key name such as "Return" or "Escape". When
+        whileTyping is False, presses typed into an Entry are ignored."""
+        def onKey(e):
+            # Entries carry the window in their bindtags, so they see the binding too
+            if not whileTyping and isinstance(e.widget, tk.Entry): return
+            func()
+        self.master.bind("<%s>" % key, onKey)
+
+    def mainloop(self, n=0):
+        """Handle events until the window is closed. The program sleeps
+        between events instead of polling like getMouse."""
+        self.__checkOpen()
+        self._inMainloop = True
+        try:
+            _getRoot().mainloop(n)
+        finally:
+            self._inMainloop = False
+
     def _onClick(self, e):
         self.mouseX = e.x
         self.mouseY = e.y
         if self._mouseCallback:
             self._mouseCallback(Point(e.x, e.y))
 
+class LayerManager:
+
+    """Named layers of drawn objects in a GraphWin. Every item of a layer
+    carries the canvas tag "layer:<name>", so showing, hiding, recoloring
+    or deleting a whole layer is one Tk call. Hidden layers keep their
+    canvas items and can be shown again without redrawing them. Items
+    with the tag above, such as controls, are kept above every layer."""
+
+    def __init__(self, win, above=None):
+        self.win = win
+        self.above = above
+        self.layers = {}   # name -> list of GraphicsObjects
+        self.hidden = set()
+
+    def _tag(self, name):
+        return "layer:%s" % name
+
+    def add(self, name, obj):
+        """Add a drawn GraphicsObject to the layer name, creating the
+        layer if needed"""
+        if not obj.canvas:
+            raise GraphicsError("Only drawn objects can be added to a layer")
+        self.win.addtag_withtag(self._tag(name), obj.id)
+        self.layers.setdefault(name, []).append(obj)
+        if name in self.hidden:
+            self.win.itemconfigure(self._tag(name), state="hidden")
+        if self.above:
+            self.win.tag_raise(self.above)
+        self.win._requestFlush()
+
+    def has(self, name):
+        return name in self.layers
+
+    def names(self):
+        return list(self.layers)
+
+    def isVisible(self, name):
+        return name in self.layers and name not in self.hidden
+
+    def show(self, name):
+        """Show a hidden layer above every other layer"""
+        if name not in self.layers: return
+        self.hidden.discard(name)
+        self.win.itemconfigure(self._tag(name), state="normal")
+        self.win.tag_raise(self._tag(name))
+        if self.above:
+            self.win.tag_raise(self.above)
+        self.win._requestFlush()
+
+    def hide(self, name):
+        if name not in self.layers: return
+        self.hidden.add(name)
+        self.win.itemconfigure(self._tag(name), state="hidden")
+        self.win._requestFlush()
+
+    def toggle(self, name):
+        if self.isVisible(name):
+            self.hide(name)
+        else:
+            self.show(name)
+
+    def recolor(self, name, color):
+        """Set the fill color of every item in the layer"""
+        if name not in self.layers: return
+        self.win.itemconfigure(self._tag(name), fill=color)
+        for obj in self.layers[name]:
+            if "fill" in obj.config:
+                obj.config["fill"] = color
+        self.win._requestFlush()
+
+    def delete(self, name):
+        """Delete every item in the layer from the canvas"""
+        if name not in self.layers: return
+        self.win._releaseItems(self._tag(name))
+        for obj in self.layers.pop(name):
+            obj.canvas = None
+            obj.id = None
+            if isinstance(obj, Image):
+                # Let the photo image be collected, as Image.undraw does
+                Image.imageCache.pop(obj.imageId, None)
+        self.hidden.discard(name)
+        self.win._requestFlush()
+
+
 class Transform:
 
     """Internal class for 2-D coordinate transformations"""
@@ -400,8 +703,7 @@ class GraphicsObject:
         if graphwin.isClosed(): raise GraphicsError("Can't draw to closed window")
         self.canvas = graphwin
         self.id = self._draw(graphwin, self.config)
-        if graphwin.autoflush:
-            _root.update()
+        graphwin._requestFlush()
 
 
     def undraw(self):
@@ -411,9 +713,8 @@ class GraphicsObject:
 
         if not self.canvas: return
         if not self.canvas.isClosed():
-            self.canvas.delete(self.id)
-            if self.canvas.autoflush:
-                _root.update()
+            self.canvas._releaseItems(self.id)
+            self.canvas._requestFlush()
         self.canvas = None
         self.id = None
 
@@ -434,8 +735,7 @@ class GraphicsObject:
                 x = dx
                 y = dy
             self.canvas.move(self.id, x, y)
-            if canvas.autoflush:
-                _root.update()
+            canvas._requestFlush()
 
     def _reconfig(self, option, setting):
         # Internal method for changing configuration of the object
@@ -447,8 +747,7 @@ class GraphicsObject:
         options[option] = setting
         if self.canvas and not self.canvas.isClosed():
             self.canvas.itemconfig(self.id, options)
-            if self.canvas.autoflush:
-                _root.update()
+            self.canvas._requestFlush()
 
 
     def _draw(self, canvas, options):
@@ -584,6 +883,76 @@ class Line(_BBox):
         self._reconfig("arrow", option)
 
 
+class Polyline(GraphicsObject):
+
+    """Connected line segments drawn as a single canvas item. Accepts
+    either Points or one flat sequence of coordinates [x1,y1,x2,y2,...]"""
+
+    def __init__(self, *points):
+        # if points passed as a list, extract it
+        if len(points) == 1 and not isinstance(points[0], Point):
+            points = points[0]
+        if points and isinstance(points[0], Point):
+            coords = []
+            for p in points:
+                coords.append(p.x)
+                coords.append(p.y)
+        else:
+            coords = list(points)
+        if len(coords) < 4 or len(coords) % 2:
+            raise GraphicsError("Polyline needs at least two points")
+        self.coords = coords
+        GraphicsObject.__init__(self, ["arrow","fill","width"])
+        self.setFill(DEFAULT_CONFIG['outline'])
+        self.setOutline = self.setFill
+
+    def clone(self):
+        other = Polyline(self.coords)
+        other.config = self.config.copy()
+        return other
+
+    def getPoints(self):
+        coords = self.coords
+        return [Point(coords[i], coords[i+1]) for i in range(0, len(coords), 2)]
+
+    def _move(self, dx, dy):
+        coords = self.coords
+        for i in range(0, len(coords), 2):
+            coords[i] = coords[i] + dx
+            coords[i+1] = coords[i+1] + dy
+
+    def _draw(self, canvas, options):
+        coords = self.coords
+        if canvas.trans:
+            screen = []
+            for i in range(0, len(coords), 2):
+                screen.extend(canvas.toScreen(coords[i], coords[i+1]))
+            coords = screen
+        # One create_line call for every segment
+        return canvas.create_line(coords, options)
+
+    def setPoints(self, *points):
+        """Replace the points of the line. A drawn line keeps its canvas
+        item and only has its coords updated"""
+        other = Polyline(*points)
+        self.coords = other.coords
+        canvas = self.canvas
+        if canvas and not canvas.isClosed():
+            coords = self.coords
+            if canvas.trans:
+                screen = []
+                for i in range(0, len(coords), 2):
+                    screen.extend(canvas.toScreen(coords[i], coords[i+1]))
+                coords = screen
+            canvas.coords(self.id, coords)
+            canvas._requestFlush()
+
+    def setArrow(self, option):
+        if not option in ["first","last","both","none"]:
+            raise GraphicsError(BAD_OPTION)
+        self._reconfig("arrow", option)
+
+
 class Polygon(GraphicsObject):
 
     def __init__(self, *points):
@@ -614,6 +983,90 @@ class Polygon(GraphicsObject):
         args.append(options)
         return GraphWin.create_polygon(*args)
 
+class MarkerLayer(GraphicsObject):
+
+    """Circular markers of the same radius that are drawn, styled, moved
+    and undrawn together. Every marker carries the layer's canvas tag, so
+    each of those operations is a single Tk call however many markers
+    there are."""
+
+    tagCount = 0
+
+    def __init__(self, xs, ys, radius=3, tag=None):
+        GraphicsObject.__init__(self, ["outline", "width", "fill"])
+        if len(xs) != len(ys):
+            raise GraphicsError("MarkerLayer needs as many x as y coordinates")
+        self.xs = list(xs)
+        self.ys = list(ys)
+        self.radius = radius
+        if tag is None:
+            tag = "markers%d" % MarkerLayer.tagCount
+            MarkerLayer.tagCount = MarkerLayer.tagCount + 1
+        self.tag = tag
+        self.hidden = False
+
+    def __len__(self):
+        return len(self.xs)
+
+    def _draw(self, canvas, options):
+        r = self.radius
+        create = canvas.create_oval
+        toScreen = canvas.toScreen
+        state = "hidden" if self.hidden else "normal"
+        for x, y in zip(self.xs, self.ys):
+            x, y = toScreen(x, y)
+            create(x-r, y-r, x+r, y+r, options, tags=self.tag, state=state)
+        # Item commands given the tag apply to every marker
+        return self.tag
+
+    def _move(self, dx, dy):
+        self.xs = [x + dx for x in self.xs]
+        self.ys = [y + dy for y in self.ys]
+
+    def clone(self):
+        other = MarkerLayer(self.xs, self.ys, self.radius)
+        other.config = self.config.copy()
+        return other
+
+    def getTag(self):
+        return self.tag
+
+    def setPositions(self, xs, ys):
+        """Move the markers to new coordinates. When the number of markers
+        is unchanged the drawn canvas items are moved in place"""
+        if len(xs) != len(ys):
+            raise GraphicsError("MarkerLayer needs as many x as y coordinates")
+        canvas = self.canvas
+        if not canvas or canvas.isClosed():
+            self.xs, self.ys = list(xs), list(ys)
+            return
+        if len(xs) != len(self.xs):
+            self.undraw()
+            self.xs, self.ys = list(xs), list(ys)
+            self.draw(canvas)
+            return
+        self.xs, self.ys = list(xs), list(ys)
+        r = self.radius
+        for item, x, y in zip(canvas.find_withtag(self.tag), self.xs, self.ys):
+            x, y = canvas.toScreen(x, y)
+            canvas.coords(item, x-r, y-r, x+r, y+r)
+        canvas._requestFlush()
+
+    def hide(self):
+        """Hide every marker without deleting them"""
+        self._setState(True)
+
+    def show(self):
+        """Show every marker again after hide"""
+        self._setState(False)
+
+    def _setState(self, hidden):
+        self.hidden = hidden
+        if self.canvas and not self.canvas.isClosed():
+            self.canvas.itemconfigure(self.tag, state="hidden" if hidden else "normal")
+            self.canvas._requestFlush()
+
+
 class Text(GraphicsObject):
 
     def __init__(self, p, text):
@@ -677,7 +1130,7 @@ class Entry(GraphicsObject):
         self.anchor = p.clone()
         #print self.anchor
         self.width = width
-        self.text = tk.StringVar(_root)
+        self.text = tk.StringVar(_getRoot())
         self.text.set("")
         self.fill = "gray"
         self.color = "black"
@@ -757,6 +1210,63 @@ class Entry(GraphicsObject):
             self.entry.config(fg=color)
 
 
+class Slider(GraphicsObject):
+
+    """A horizontal scale for choosing a whole number from low to high.
+    The function given to setHandler is called with each new value"""
+
+    def __init__(self, p, length, low, high, value=None):
+        GraphicsObject.__init__(self, [])
+        self.anchor = p.clone()
+        self.length = length
+        self.low = low
+        self.high = high
+        self.value = tk.IntVar(_getRoot())
+        self.value.set(low if value is None else value)
+        self.handler = None
+        self.scale = None
+
+    def _draw(self, canvas, options):
+        p = self.anchor
+        x,y = canvas.toScreen(p.x,p.y)
+        frm = tk.Frame(canvas.master)
+        self.scale = tk.Scale(frm,
+                              from_=self.low,
+                              to=self.high,
+                              orient=tk.HORIZONTAL,
+                              length=self.length,
+                              showvalue=0,
+                              variable=self.value,
+                              command=self._onChange)
+        self.scale.pack()
+        return canvas.create_window(x,y,window=frm)
+
+    def _onChange(self, value):
+        # Tk passes the value as a string
+        if self.handler:
+            self.handler(int(float(value)))
+
+    def setHandler(self, func):
+        self.handler = func
+
+    def getValue(self):
+        return self.value.get()
+
+    def setValue(self, value):
+        self.value.set(value)
+
+    def _move(self, dx, dy):
+        self.anchor.move(dx,dy)
+
+    def getAnchor(self):
+        return self.anchor.clone()
+
+    def clone(self):
+        other = Slider(self.anchor, self.length, self.low, self.high, self.getValue())
+        other.config = self.config.copy()
+        return other
+
+
 class Image(GraphicsObject):
 
     idCount = 0
@@ -767,11 +1277,13 @@ class Image(GraphicsObject):
         self.anchor = p.clone()
         self.imageId = Image.idCount
         Image.idCount = Image.idCount + 1
-        if len(pixmap) == 1: # file name provided
-            self.img = tk.PhotoImage(file=pixmap[0], master=_root)
+        if len(pixmap) == 1 and isinstance(pixmap[0], tk.PhotoImage):
+            self.img = pixmap[0] # already decoded, e.g. from an ImagePyramid
+        elif len(pixmap) == 1: # file name provided
+            self.img = tk.PhotoImage(file=pixmap[0], master=_getRoot())
         else: # width and height provided
             width, height = pixmap
-            self.img = tk.PhotoImage(master=_root, width=width, height=height)
+            self.img = tk.PhotoImage(master=_getRoot(), width=width, height=height)
 
     def _draw(self, canvas, options):
         p = self.anchor
@@ -792,6 +1304,24 @@ class Image(GraphicsObject):
     def getAnchor(self):
         return self.anchor.clone()
 
+    @staticmethod
+    def fromData(p, data, scale=1):
+        """Return an Image anchored at p of the PNG, GIF or PPM file bytes
+        in data. Each pixel becomes a scale by scale square, so a small
+        image can cover the window"""
+        photo = tk.PhotoImage(master=_getRoot(), data=base64.b64encode(data).decode("ascii"))
+        if scale != 1:
+            photo = photo.zoom(scale)
+        return Image(p, photo)
+
+    def setImage(self, photo):
+        """Show the tk.PhotoImage photo instead, keeping the canvas item"""
+        self.img = photo
+        if self.canvas and not self.canvas.isClosed():
+            self.imageCache[self.imageId] = photo
+            self.canvas.itemconfigure(self.id, image=photo)
+            self.canvas._requestFlush()
+
     def clone(self):
         other = Image(Point(0,0), 0, 0)
         other.img = self.img.copy()
@@ -826,6 +1356,57 @@ class Image(GraphicsObject):
         self.img.put("{" + color +"}", (x, y))
 
 
+    def getRegion(self, x, y, width, height):
+        """Returns the pixels of the width by height region whose top left
+        corner is (x,y) as bytes, 3 bytes (r,g,b) per pixel, row by row.
+        The whole region is read with one Tk call."""
+        img = self.img
+        data = img.tk.call(img.name, "data", "-from", x, y, x + width, y + height)
+        hexdigits = []
+        for row in img.tk.splitlist(data):
+            for color in img.tk.splitlist(row):
+                hexdigits.append(color[1:])
+        return bytes.fromhex("".join(hexdigits))
+
+    def putRegion(self, x, y, width, height, pixels):
+        """Sets the width by height region whose top left corner is (x,y)
+        from bytes of 3 bytes (r,g,b) per pixel, row by row. The whole
+        region is written with one Tk call."""
+        if len(pixels) != width * height * 3:
+            raise GraphicsError("Expected %d bytes of pixels" % (width * height * 3))
+        self.putPPM(x, y, b"P6\n%d %d\n255\n" % (width, height) + bytes(pixels))
+
+    def getRow(self, y):
+        """Returns row y as bytes of (r,g,b) values"""
+        return self.getRegion(0, y, self.getWidth(), 1)
+
+    def putRow(self, y, pixels):
+        """Sets row y from bytes of (r,g,b) values"""
+        self.putRegion(0, y, self.getWidth(), 1, pixels)
+
+    def getPPM(self, x=0, y=0, width=None, height=None):
+        """Returns a region, or the whole image, as binary PPM data"""
+        if width is None: width = self.getWidth() - x
+        if height is None: height = self.getHeight() - y
+        return b"P6\n%d %d\n255\n" % (width, height) + self.getRegion(x, y, width, height)
+
+    def putPPM(self, x, y, data):
+        """Draws binary PPM data into the image with its top left corner
+        at (x,y)"""
+        img = self.img
+        try:
+            img.tk.call(img.name, "put", data, "-format", "ppm", "-to", x, y)
+        except tk.TclError:
+            # Tk builds without binary PPM data support take rows of colors
+            width, height, pixels = _parsePPM(data)
+            rows = []
+            hexed = pixels.hex()
+            for row in range(height):
+                start = row * width * 6
+                rows.append("{" + " ".join(
+                    "#" + hexed[i:i+6] for i in range(start, start + width * 6, 6)) + "}")
+            img.put(" ".join(rows), to=(x, y))
+
     def save(self, filename):
         """Saves the pixmap image to filename.
         The format for the save image is determined from the filname extension.
@@ -837,6 +1418,76 @@ class Image(GraphicsObject):
         self.img.write( filename, format=ext)
 
 
+class ImagePyramid:
+
+    """An image file decoded once, with copies scaled by whole-number
+    factors. level(2) is twice the size, level(0.5) half the size. Each
+    level is built from the original the first time it is asked for, and
+    pyramids are kept for the life of the process, so opening the same
+    file again needs no decoding."""
+
+    cache = {}
+
+    def __init__(self, path):
+        self.path = path
+        self.levels = {1: tk.PhotoImage(file=path, master=_getRoot())}
+
+    @classmethod
+    def load(cls, path, scales=()):
+        """Return the cached pyramid for path, decoding it on first use.
+        The levels in scales are built straight away."""
+        key = os.path.abspath(path)
+        pyramid = cls.cache.get(key)
+        if pyramid is None:
+            pyramid = cls.cache[key] = cls(path)
+        for scale in scales:
+            pyramid.level(scale)
+        return pyramid
+
+    def level(self, scale):
+        """Return the tk.PhotoImage scaled by scale, which is a whole
+        number or 1/n for a whole number n"""
+        if scale in self.levels:
+            return self.levels[scale]
+        original = self.levels[1]
+        if scale >= 1:
+            factor = int(scale)
+            if factor != scale: raise GraphicsError(BAD_OPTION)
+            image = original.zoom(factor)
+        else:
+            factor = int(round(1 / scale))
+            if abs(1 / factor - scale) > 1e-9: raise GraphicsError(BAD_OPTION)
+            image = original.subsample(factor)
+        self.levels[scale] = image
+        return image
+
+    def getWidth(self):
+        return self.levels[1].width()
+
+    def getHeight(self):
+        return self.levels[1].height()
+
+
+def _parsePPM(data):
+    # Returns the width, height and pixel bytes of binary PPM data
+    fields = []
+    i = 0
+    while len(fields) < 4:
+        while i < len(data) and data[i:i+1].isspace(): i = i + 1
+        start = i
+        while i < len(data) and not data[i:i+1].isspace(): i = i + 1
+        if i == start or i == len(data):
+            raise GraphicsError("PPM data ends inside its header")
+        fields.append(data[start:i])
+    if fields[0] != b"P6" or fields[3] != b"255":
+        raise GraphicsError("Only 8-bit binary PPM data is supported")
+    width, height = int(fields[1]), int(fields[2])
+    # A single whitespace byte separates the header from the pixels
+    pixels = data[i+1:i+1+width*height*3]
+    if len(pixels) < width*height*3:
+        raise GraphicsError("PPM data ends before its last pixel")
+    return width, height, pixels
+
 def color_rgb(r,g,b):
     """r,g,b are intensities of red, green, and blue in range(256)
     Returns color specifier string for the resulting color"""
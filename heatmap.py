@@ -0,0 +1,186 @@
+"""Density heatmaps of map points, rendered as translucent RGBA images
+
+Points are counted into a coarse grid of cells, smoothed with two box blur
+passes (close to a gaussian kernel) and coloured from transparent blue
+through yellow to red. The image is one pixel per cell, so it is scaled up
+by the cell size when it is drawn.
+
+NumPy is used when it is installed. Without it the same steps run in pure
+Python, which is fast enough for the size of the map window.
+"""
+
+from itertools import accumulate
+from typing import Sequence
+
+from renderer import encode_png
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+# Colour stops of the heatmap from the lowest to the highest density
+HEAT_STOPS = [(0.0, (0, 0, 255)), (0.5, (255, 255, 0)), (1.0, (255, 0, 0))]
+# The opacity of the lowest and highest densities. Empty cells are fully transparent.
+MIN_ALPHA, MAX_ALPHA = 70, 200
+
+
+def _build_table() -> list[bytes]:
+    """
+    purpose:
+        Builds the RGBA colour of each of the 256 density levels
+    parameters:
+        None
+    returns:
+        A list of 256 four byte strings. Level 0 is transparent.
+    """
+    table = [bytes(4)]
+    for level in range(1, 256):
+        t = level / 255
+        for (start, low), (end, high) in zip(HEAT_STOPS, HEAT_STOPS[1:]):
+            if t <= end:
+                f = (t - start) / (end - start)
+                break
+        rgb = [round(a + (b - a) * f) for a, b in zip(low, high)]
+        alpha = round(MIN_ALPHA + (MAX_ALPHA - MIN_ALPHA) * t)
+        table.append(bytes(rgb + [alpha]))
+    return table
+
+
+_TABLE = _build_table()
+
+
+def _blur_rows(rows: list[Sequence[float]], radius: int) -> list[list[float]]:
+    """
+    purpose:
+        Averages every cell with the radius cells on each side of it in its row.
+        Running sums make each row linear in its length whatever the radius.
+    parameters:
+        rows: The rows of cells, all the same length
+        radius: The number of cells on each side to average with
+    returns:
+        The blurred rows. Cells past the edges count as 0.
+    """
+    length = len(rows[0])
+    width = 2 * radius + 1
+    # The running sum indices of each window are the same for every row
+    windows = [(min(c + radius + 1, length), max(c - radius, 0)) for c in range(length)]
+    blurred = []
+    for row in rows:
+        sums = list(accumulate(row, initial=0.0))
+        blurred.append([(sums[high] - sums[low]) / width for high, low in windows])
+    return blurred
+
+
+def _np_blur(grid, radius: int, axis: int):
+    """
+    purpose:
+        The NumPy version of _blur_rows along either axis
+    parameters:
+        grid: The 2-D array of cells
+        radius: The number of cells on each side to average with
+        axis: The axis to blur along
+    returns:
+        The blurred array
+    """
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (radius + 1, radius)
+    sums = np.cumsum(np.pad(grid, pad), axis=axis)
+    count = grid.shape[axis]
+    width = 2 * radius + 1
+    high = np.take(sums, np.arange(width, width + count), axis=axis)
+    low = np.take(sums, np.arange(count), axis=axis)
+    return (high - low) / width
+
+
+def render_heatmap(
+    xs: Sequence[float], ys: Sequence[float], width: int, height: int, cell: int = 4, radius: int = 3
+) -> tuple[int, int, bytes]:
+    """
+    purpose:
+        Renders the density of points as RGBA pixels, one for each cell
+    parameters:
+        xs, ys: The positions of the points in pixels. Points outside of the image are skipped.
+        width, height: The size of the area covered in pixels
+        cell: The width and height of each cell in pixels
+        radius: The smoothing radius in cells
+    returns:
+        The number of columns and rows of cells, and their RGBA pixels
+    """
+    columns = -(-width // cell)
+    rows = -(-height // cell)
+
+    if np is not None:
+        x = np.asarray(xs, dtype=float) // cell
+        y = np.asarray(ys, dtype=float) // cell
+        inside = (x >= 0) & (x < columns) & (y >= 0) & (y < rows)
+        grid = np.zeros((rows, columns))
+        np.add.at(grid, (y[inside].astype(int), x[inside].astype(int)), 1)
+        for _ in range(2):
+            grid = _np_blur(_np_blur(grid, radius, 1), radius, 0)
+        peak = grid.max()
+        if peak > 0:
+            levels = (grid * (255 / peak)).astype(np.uint8)
+        else:
+            levels = np.zeros((rows, columns), dtype=np.uint8)
+        table = np.frombuffer(b"".join(_TABLE), dtype=np.uint8).reshape(256, 4)
+        return columns, rows, table[levels].tobytes()
+
+    grid = [[0.0] * columns for _ in range(rows)]
+    for x, y in zip(xs, ys):
+        column = int(x // cell)
+        row = int(y // cell)
+        if 0 <= column < columns and 0 <= row < rows:
+            grid[row][column] += 1
+    for _ in range(2):
+        # Blur the rows, then blur the columns as the rows of the transposed grid
+        grid = _blur_rows(grid, radius)
+        grid = list(zip(*_blur_rows(list(zip(*grid)), radius)))
+    peak = max(map(max, grid))
+    if peak > 0:
+        scale = 255 / peak
+        table = _TABLE
+        pixels = b"".join([table[int(value * scale)] for row in grid for value in row])
+    else:
+        pixels = bytes(4 * columns * rows)
+    return columns, rows, pixels
+
+
+def heatmap_png(
+    xs: Sequence[float], ys: Sequence[float], width: int, height: int, cell: int = 4, radius: int = 3
+) -> bytes:
+    """
+    purpose:
+        Renders the density of points as an RGBA PNG image with one pixel for each cell
+    parameters:
+        The same as render_heatmap
+    returns:
+        The bytes of the PNG file
+    """
+    columns, rows, pixels = render_heatmap(xs, ys, width, height, cell, radius)
+    # Level 1 compresses almost as well as the default at this size and is much faster
+    return encode_png(columns, rows, pixels, channels=4, level=1)
+
+
+def sample_line(points: Sequence[tuple[float, float]], spacing: float) -> list[tuple[float, float]]:
+    """
+    purpose:
+        Places points evenly along a line, so a long segment adds as much density as
+        many short segments covering the same distance
+    parameters:
+        points: The (x, y) points of the line
+        spacing: The distance between placed points
+    returns:
+        The placed (x, y) points, starting with the first point of the line
+    """
+    samples = list(points[:1])
+    # The distance along the current segment where the next point is placed
+    offset = spacing
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        length = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
+        while offset <= length:
+            t = offset / length
+            samples.append((x1 + (x2 - x1) * t, y1 + (y2 - y1) * t))
+            offset += spacing
+        offset -= length
+    return samples
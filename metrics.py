@@ -0,0 +1,322 @@
+"""Call counts and latency histograms for chosen functions
+
+Functions are registered with instrument() but are only wrapped while
+metrics are enabled. Disabled metrics put the original functions back, so
+they cost nothing at all.
+
+Latencies are kept in HdrHistogram-style log-linear buckets: every power of
+two is split into the same number of sub-buckets, so each value is kept to
+within a few percent however large it is, in a bounded amount of memory.
+The collected metrics can be written as Prometheus text or JSON.
+"""
+
+import functools
+import inspect
+import json
+import math
+import threading
+from time import perf_counter_ns
+from typing import Callable, Iterable
+
+
+class Histogram:
+    """A log-linear histogram of whole number values, such as nanosecond latencies"""
+
+    def __init__(self, precision: int = 5):
+        """
+        purpose:
+            Constructs an empty Histogram object
+        parameters:
+            precision: Every power of two is split into 2 ** precision buckets.
+                5 keeps values to within about 3 percent.
+        returns:
+            None
+        """
+        self.precision = precision
+        # Maps each bucket index with the number of values in it
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: int | None = None
+        self.max = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def bucket(self, value: int) -> int:
+        """
+        purpose:
+            Finds the bucket a value belongs in
+        parameters:
+            value: A value of at least 0
+        returns:
+            The index of the bucket. Values below 2 ** (precision + 1) have a bucket each.
+        """
+        sub_buckets = 1 << self.precision
+        if value < sub_buckets:
+            return value
+        # Keep the leading precision + 1 bits of the value
+        shift = value.bit_length() - self.precision - 1
+        return ((shift + 1) << self.precision) + (value >> shift) - sub_buckets
+
+    def bucket_range(self, index: int) -> tuple[int, int]:
+        """
+        purpose:
+            Finds the values held by a bucket
+        parameters:
+            index: The index of the bucket
+        returns:
+            The lowest and highest values of the bucket
+        """
+        sub_buckets = 1 << self.precision
+        if index < sub_buckets:
+            return index, index
+        shift = index // sub_buckets - 1
+        mantissa = index % sub_buckets + sub_buckets
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        """
+        purpose:
+            Adds a value to the histogram
+        parameters:
+            value: A value of at least 0
+        returns:
+            None
+        """
+        index = self.bucket(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> int:
+        """
+        purpose:
+            Finds the value that the given percent of recorded values are at or below
+        parameters:
+            percent: The percentile from 0 to 100
+        returns:
+            The highest value of the bucket holding the percentile, at most the largest value recorded.
+            Returns 0 if the histogram is empty.
+        """
+        if not self.count:
+            return 0
+        rank = max(math.ceil(percent / 100 * self.count), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.bucket_range(index)[1], self.max)
+        return self.max
+
+    def cumulative_buckets(self) -> list[tuple[int, int]]:
+        """
+        purpose:
+            Lists the filled buckets with the number of values at or below each of them
+        parameters:
+            None
+        returns:
+            A list of (highest value of the bucket, cumulative count) tuples in increasing order
+        """
+        buckets = []
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            buckets.append((self.bucket_range(index)[1], seen))
+        return buckets
+
+
+class Registry:
+    """Holds the instrumented functions and the latency histogram of each of them"""
+
+    def __init__(self):
+        """
+        purpose:
+            Constructs a disabled Registry object
+        parameters:
+            None
+        returns:
+            None
+        """
+        self.enabled = False
+        # Maps each operation name with the histogram of its latencies in nanoseconds
+        self.histograms: dict[str, Histogram] = {}
+        # The (owner, attribute, operation name) of each function to wrap while enabled
+        self.targets: list[tuple[type, str, str]] = []
+        # The original class attributes replaced by wrappers
+        self.__originals: list[tuple[type, str, object]] = []
+        self.__lock = threading.Lock()
+
+    def instrument(self, owner: type, names: Iterable[str], prefix: str) -> None:
+        """
+        purpose:
+            Registers methods to be timed while metrics are enabled
+        parameters:
+            owner: The class holding the methods
+            names: The names of the methods. Static methods are supported.
+            prefix: Put in front of each method name to name its operation
+        returns:
+            None
+        """
+        for name in names:
+            self.targets.append((owner, name, f"{prefix}.{name}"))
+            if self.enabled:
+                self.__wrap(owner, name, f"{prefix}.{name}")
+
+    def enable(self) -> None:
+        """
+        purpose:
+            Starts timing every registered method
+        parameters:
+            None
+        returns:
+            None
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        for owner, name, operation in self.targets:
+            self.__wrap(owner, name, operation)
+
+    def disable(self) -> None:
+        """
+        purpose:
+            Stops timing, putting back every original method. Recorded metrics are kept.
+        parameters:
+            None
+        returns:
+            None
+        """
+        self.enabled = False
+        for owner, name, original in reversed(self.__originals):
+            setattr(owner, name, original)
+        self.__originals = []
+
+    def reset(self) -> None:
+        """
+        purpose:
+            Clears every recorded metric
+        parameters:
+            None
+        returns:
+            None
+        """
+        with self.__lock:
+            self.histograms = {}
+
+    def record(self, operation: str, nanoseconds: int) -> None:
+        """
+        purpose:
+            Records one call of an operation
+        parameters:
+            operation: The name of the operation
+            nanoseconds: How long the call took
+        returns:
+            None
+        """
+        with self.__lock:
+            histogram = self.histograms.get(operation)
+            if histogram is None:
+                histogram = self.histograms[operation] = Histogram()
+            histogram.record(nanoseconds)
+
+    def to_prometheus(self) -> str:
+        """
+        purpose:
+            Formats the metrics in the Prometheus text exposition format
+        parameters:
+            None
+        returns:
+            The text, ending with a newline
+        """
+        name = "ets_operation_latency_seconds"
+        lines = [
+            "# HELP ets_operation_calls_total Number of calls of each instrumented operation.",
+            "# TYPE ets_operation_calls_total counter",
+        ]
+        for operation, histogram in sorted(self.histograms.items()):
+            lines.append(f'ets_operation_calls_total{{operation="{operation}"}} {histogram.count}')
+        lines.append(f"# HELP {name} Latency of each instrumented operation.")
+        lines.append(f"# TYPE {name} histogram")
+        for operation, histogram in sorted(self.histograms.items()):
+            label = f'operation="{operation}"'
+            for upper, seen in histogram.cumulative_buckets():
+                lines.append(f'{name}_bucket{{{label},le="{upper / 1e9:.9g}"}} {seen}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f"{name}_sum{{{label}}} {histogram.total / 1e9:.9g}")
+            lines.append(f"{name}_count{{{label}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        """
+        purpose:
+            Converts the metrics into a dictionary for JSON, with latencies in seconds
+        parameters:
+            None
+        returns:
+            A dictionary mapping each operation name with its call count, latency summary and buckets
+        """
+        operations = {}
+        for operation, histogram in sorted(self.histograms.items()):
+            operations[operation] = {
+                "calls": histogram.count,
+                "sum_seconds": histogram.total / 1e9,
+                "min_seconds": (histogram.min or 0) / 1e9,
+                "max_seconds": histogram.max / 1e9,
+                "percentiles_seconds": {
+                    str(percent): histogram.percentile(percent) / 1e9 for percent in (50, 90, 99, 99.9)
+                },
+                "buckets": [[upper / 1e9, seen] for upper, seen in histogram.cumulative_buckets()],
+            }
+        return {"operations": operations}
+
+    def write(self, path: str) -> None:
+        """
+        purpose:
+            Writes the metrics to a file, as JSON if the path ends with .json and Prometheus text otherwise
+        parameters:
+            path: The path of the file
+        returns:
+            None
+        """
+        if path.endswith(".json"):
+            text = json.dumps(self.to_dict(), indent=2) + "\n"
+        else:
+            text = self.to_prometheus()
+        with open(path, "w") as f:
+            f.write(text)
+
+    def __wrap(self, owner: type, name: str, operation: str) -> None:
+        """
+        purpose:
+            Replaces a method with a wrapper recording how long each call takes
+        parameters:
+            owner: The class holding the method
+            name: The name of the method
+            operation: The name to record the calls under
+        returns:
+            None
+        """
+        original = inspect.getattr_static(owner, name)
+        is_static = isinstance(original, staticmethod)
+        func: Callable = original.__func__ if is_static else original
+        record = self.record
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(operation, perf_counter_ns() - start)
+
+        setattr(owner, name, staticmethod(timed) if is_static else timed)
+        self.__originals.append((owner, name, original))
+
+
+# The registry used by the program
+registry = Registry()
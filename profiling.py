@@ -0,0 +1,112 @@
+"""cProfile capture of menu and command line operations
+
+A CommandProfiler runs operations under cProfile when profiling is switched
+on, for the next operation only or for every operation. Each profiled
+operation is saved as a pstats file, which can be opened later with
+pstats or a viewer such as snakeviz, and a short list of its hottest
+functions is printed straight away.
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+from typing import Callable, TextIO, TypeVar
+
+T = TypeVar("T")
+
+
+def hot_functions(stats: pstats.Stats, top: int) -> list[str]:
+    """
+    purpose:
+        Lists the functions that took the most time themselves, not counting the functions they called
+    parameters:
+        stats: The profile to summarise
+        top: How many functions to list
+    returns:
+        One line for each function with its own time, total time, call count and location
+    """
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+    lines = []
+    for (path, line, name), (_, calls, own_time, total_time, _) in rows[:top]:
+        if path == "~":
+            # Built in functions have no file
+            location = name
+        else:
+            location = f"{name} ({os.path.basename(path)}:{line})"
+        lines.append(f"{own_time * 1000:9.1f} ms {total_time * 1000:9.1f} ms {calls:9d}  {location}")
+    return lines
+
+
+class CommandProfiler:
+    """Runs operations under cProfile while profiling is switched on"""
+
+    # The number of functions in each printed summary
+    top = 15
+
+    def __init__(self, directory: str, mode: str | None = None, stream: TextIO | None = None):
+        """
+        purpose:
+            Constructs a CommandProfiler object
+        parameters:
+            directory: The directory to save the pstats files in. It is created when needed.
+            mode: None to run operations normally, "next" to profile only the next operation,
+                or "all" to profile every operation
+            stream: Where the summaries are printed. Defaults to sys.stdout.
+        returns:
+            None
+        """
+        self.directory = directory
+        self.mode = mode
+        self.stream = stream
+        # The number of profiles saved, used to keep the file names in order
+        self.count = 0
+
+    def __repr__(self) -> str:
+        return f"CommandProfiler({self.directory!r}, {self.mode!r})"
+
+    def run(self, name: str, func: Callable[..., T], *args) -> T:
+        """
+        purpose:
+            Calls a function, profiling it if profiling is on.
+            The profile is saved and summarised even if the function raises an exception.
+        parameters:
+            name: The name of the operation, used in the file name
+            func: The function to call
+            args: The arguments to call the function with
+        returns:
+            What the function returns
+        """
+        if self.mode is None:
+            return func(*args)
+        if self.mode == "next":
+            self.mode = None
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            self.save(name, profile)
+
+    def save(self, name: str, profile: cProfile.Profile) -> str:
+        """
+        purpose:
+            Saves a profile as a pstats file and prints its hottest functions
+        parameters:
+            name: The name of the operation
+            profile: The finished profile
+        returns:
+            The path of the saved file
+        """
+        self.count += 1
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self.count:03d}-{name}.pstats")
+        stats = pstats.Stats(profile)
+        stats.dump_stats(path)
+
+        stream = self.stream or sys.stdout
+        print(f"Profile of {name} saved to {path} ({stats.total_tt * 1000:.1f} ms)", file=stream)
+        print(f"{'own':>12} {'total':>12} {'calls':>9}  function", file=stream)
+        for line in hot_functions(stats, self.top):
+            print(line, file=stream)
+        return path
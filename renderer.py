@@ -0,0 +1,452 @@
+"""Headless drawing surfaces for rendering maps without a display
+
+RasterCanvas draws into an RGB byte buffer and saves PNG or PPM files.
+SvgCanvas collects SVG elements and saves an SVG file. Both provide
+getWidth and getHeight like graphics4.GraphWin, so the same coordinate
+projection can be used for the window and for files.
+
+Only the standard library is used. PNG files are encoded and decoded with
+zlib, and only the 8-bit RGB and RGBA formats are read.
+"""
+
+import os
+import struct
+import zlib
+from typing import Iterable, Sequence
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# The colour names used by the map, as RGB values
+COLORS = {
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+    "gray": (190, 190, 190),
+    "lightgray": (211, 211, 211),
+    "red": (255, 0, 0),
+    "blue": (0, 0, 255),
+}
+
+# Decoded PNG files are kept so a batch only decodes its background once
+_png_cache: dict[str, tuple[int, int, bytes]] = {}
+
+
+def to_rgb(color: str | tuple[int, int, int]) -> tuple[int, int, int]:
+    """
+    purpose:
+        Converts a colour name or "#rrggbb" string into an RGB tuple
+    parameters:
+        color: The colour name, hex string, or RGB tuple
+    returns:
+        A tuple of the red, green and blue intensities in range(256)
+    """
+    if isinstance(color, tuple):
+        return color
+    if color.startswith("#"):
+        value = int(color[1:], 16)
+        return value >> 16, (value >> 8) & 0xFF, value & 0xFF
+    return COLORS[color]
+
+
+def read_png(path: str) -> tuple[int, int, bytes]:
+    """
+    purpose:
+        Decodes an 8-bit, non-interlaced RGB or RGBA PNG file.
+        Transparent pixels are blended onto the gray window background.
+    parameters:
+        path: The file path of the PNG file
+    returns:
+        The width, height and RGB pixel bytes of the image.
+        Raises a ValueError if the file is not a supported PNG file.
+    """
+    if path in _png_cache:
+        return _png_cache[path]
+
+    with open(path, "rb") as f:
+        content = f.read()
+    if content[:8] != PNG_SIGNATURE:
+        raise ValueError(f"{path} is not a PNG file")
+
+    chunks = []
+    header = None
+    i = 8
+    while i < len(content):
+        (length,) = struct.unpack(">I", content[i : i + 4])
+        kind = content[i + 4 : i + 8]
+        body = content[i + 8 : i + 8 + length]
+        if kind == b"IHDR":
+            header = body
+        elif kind == b"IDAT":
+            chunks.append(body)
+        i += 12 + length
+    if header is None or len(header) != 13:
+        raise ValueError(f"{path} has no PNG header")
+    width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", header)
+
+    if depth != 8 or color_type not in (2, 6) or interlace:
+        raise ValueError(f"{path} is not an 8-bit non-interlaced RGB or RGBA PNG file")
+
+    channels = 4 if color_type == 6 else 3
+    stride = width * channels
+    raw = zlib.decompress(b"".join(chunks))
+    pixels = bytearray(stride * height)
+    previous = bytearray(stride)
+
+    for y in range(height):
+        start = y * (stride + 1)
+        kind = raw[start]
+        row = bytearray(raw[start + 1 : start + 1 + stride])
+        # Undo the filter of each row. See section 9 of the PNG specification.
+        if kind == 1:
+            for x in range(channels, stride):
+                row[x] = (row[x] + row[x - channels]) & 0xFF
+        elif kind == 2:
+            row = bytearray((a + b) & 0xFF for a, b in zip(row, previous))
+        elif kind == 3:
+            for x in range(stride):
+                left = row[x - channels] if x >= channels else 0
+                row[x] = (row[x] + ((left + previous[x]) >> 1)) & 0xFF
+        elif kind == 4:
+            for x in range(stride):
+                if x >= channels:
+                    a = row[x - channels]
+                    c = previous[x - channels]
+                else:
+                    a = c = 0
+                b = previous[x]
+                p = a + b - c
+                pa = abs(p - a)
+                pb = abs(p - b)
+                pc = abs(p - c)
+                if pa <= pb and pa <= pc:
+                    predictor = a
+                elif pb <= pc:
+                    predictor = b
+                else:
+                    predictor = c
+                row[x] = (row[x] + predictor) & 0xFF
+        pixels[y * stride : (y + 1) * stride] = row
+        previous = row
+
+    if channels == 4:
+        back = COLORS["gray"]
+        rgb = bytearray(width * height * 3)
+        for i in range(width * height):
+            r, g, b, alpha = pixels[i * 4 : i * 4 + 4]
+            if alpha == 255:
+                rgb[i * 3 : i * 3 + 3] = pixels[i * 4 : i * 4 + 3]
+            else:
+                rgb[i * 3] = (r * alpha + back[0] * (255 - alpha)) // 255
+                rgb[i * 3 + 1] = (g * alpha + back[1] * (255 - alpha)) // 255
+                rgb[i * 3 + 2] = (b * alpha + back[2] * (255 - alpha)) // 255
+        pixels = rgb
+
+    _png_cache[path] = width, height, bytes(pixels)
+    return _png_cache[path]
+
+
+def read_png_size(path: str) -> tuple[int, int]:
+    """
+    purpose:
+        Reads the size of a PNG file from its header without decoding it
+    parameters:
+        path: The file path of the PNG file
+    returns:
+        The width and height of the image.
+        Raises a ValueError if the file doesn't start with a PNG header.
+    """
+    if path in _png_cache:
+        return _png_cache[path][:2]
+    with open(path, "rb") as f:
+        # The IHDR chunk must come first: its length, type, width and height follow the signature
+        content = f.read(24)
+    if content[:8] != PNG_SIGNATURE or content[12:16] != b"IHDR":
+        raise ValueError(f"{path} has no PNG header")
+    return struct.unpack(">II", content[16:24])
+
+
+def encode_png(width: int, height: int, pixels: bytes, channels: int = 3, level: int = 6) -> bytes:
+    """
+    purpose:
+        Encodes RGB or RGBA pixel bytes as a PNG file
+    parameters:
+        width, height: The size of the image in pixels
+        pixels: The pixel bytes, row by row
+        channels: 3 for RGB pixels, 4 for RGBA pixels
+        level: The zlib compression level, from 0 (fastest) to 9 (smallest)
+    returns:
+        The bytes of the PNG file
+    """
+
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    stride = width * channels
+    # Every row is stored unfiltered, which only needs a 0 byte in front of it
+    raw = b"".join(b"\x00" + pixels[y * stride : (y + 1) * stride] for y in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 6 if channels == 4 else 2, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw, level))
+        + chunk(b"IEND", b"")
+    )
+
+
+class RasterCanvas:
+    """An RGB pixel buffer that lines and circles can be drawn onto"""
+
+    def __init__(self, width: int, height: int, background: str | None = None, color="gray"):
+        """
+        purpose:
+            Constructs a RasterCanvas object
+        parameters:
+            width, height: The size of the canvas in pixels
+            background: The file path of a PNG image to fill the canvas with, centred like the map window.
+                The canvas is filled with color when None.
+            color: The colour of the canvas around the background
+        returns:
+            None
+        """
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(to_rgb(color)) * (width * height))
+        if background:
+            self.__paste(*read_png(background))
+
+    def __paste(self, width: int, height: int, pixels: bytes) -> None:
+        """
+        purpose:
+            Copies an image into the centre of the canvas, cropping it to fit
+        parameters:
+            width, height: The size of the image in pixels
+            pixels: The RGB bytes of the image
+        returns:
+            None
+        """
+        if (width, height) == (self.width, self.height):
+            self.pixels[:] = pixels
+            return
+        left = (self.width - width) // 2
+        top = (self.height - height) // 2
+        x1, x2 = max(left, 0), min(left + width, self.width)
+        if x1 >= x2:
+            return
+        for y in range(max(top, 0), min(top + height, self.height)):
+            source = ((y - top) * width + (x1 - left)) * 3
+            target = (y * self.width + x1) * 3
+            self.pixels[target : target + (x2 - x1) * 3] = pixels[source : source + (x2 - x1) * 3]
+
+    def copy(self) -> "RasterCanvas":
+        """Returns a new canvas with the same pixels"""
+        other = RasterCanvas(self.width, self.height)
+        other.pixels[:] = self.pixels
+        return other
+
+    def getWidth(self) -> int:
+        """Returns the width of the canvas"""
+        return self.width
+
+    def getHeight(self) -> int:
+        """Returns the height of the canvas"""
+        return self.height
+
+    def fill_rect(self, x1: int, y1: int, x2: int, y2: int, color) -> None:
+        """
+        purpose:
+            Fills the pixels from (x1, y1) up to but not including (x2, y2)
+        parameters:
+            x1, y1, x2, y2: The corners of the rectangle
+            color: The fill colour
+        returns:
+            None
+        """
+        x1, x2 = max(x1, 0), min(x2, self.width)
+        if x1 >= x2:
+            return
+        span = bytes(to_rgb(color)) * (x2 - x1)
+        for y in range(max(y1, 0), min(y2, self.height)):
+            offset = (y * self.width + x1) * 3
+            self.pixels[offset : offset + len(span)] = span
+
+    def draw_polyline(self, points: Sequence[tuple[int, int]], color="black", width: int = 1) -> None:
+        """
+        purpose:
+            Draws straight lines between consecutive points with Bresenham's algorithm.
+            Thick lines are drawn by stamping a width by width square at every pixel.
+        parameters:
+            points: The (x, y) pixel points to connect
+            color: The line colour
+            width: The line thickness in pixels
+        returns:
+            None
+        """
+        if not points:
+            return
+        span = bytes(to_rgb(color)) * width
+        half = width // 2
+        canvas_width, canvas_height = self.width, self.height
+        pixels = self.pixels
+        stamped: set[tuple[int, int]] = set()
+
+        def stamp(x: int, y: int) -> None:
+            if (x, y) in stamped:
+                return
+            stamped.add((x, y))
+            left = x - half
+            if left < 0 or left + width > canvas_width:
+                self.fill_rect(left, y - half, left + width, y - half + width, color)
+                return
+            for row in range(max(y - half, 0), min(y - half + width, canvas_height)):
+                offset = (row * canvas_width + left) * 3
+                pixels[offset : offset + len(span)] = span
+
+        x0, y0 = points[0]
+        stamp(x0, y0)
+        for x1, y1 in points[1:]:
+            dx = abs(x1 - x0)
+            dy = -abs(y1 - y0)
+            sx = 1 if x0 < x1 else -1
+            sy = 1 if y0 < y1 else -1
+            error = dx + dy
+            x, y = x0, y0
+            while (x, y) != (x1, y1):
+                e2 = 2 * error
+                if e2 >= dy:
+                    error += dy
+                    x += sx
+                if e2 <= dx:
+                    error += dx
+                    y += sy
+                stamp(x, y)
+            x0, y0 = x1, y1
+
+    def draw_circle(self, x: int, y: int, radius: int, color="black", outline=None) -> None:
+        """
+        purpose:
+            Draws a filled circle
+        parameters:
+            x, y: The centre of the circle
+            radius: The radius of the circle in pixels
+            color: The fill colour
+            outline: The colour of a one pixel border, or None for no border
+        returns:
+            None
+        """
+        if outline:
+            self.draw_circle(x, y, radius, outline)
+            radius -= 1
+        for dy in range(-radius, radius + 1):
+            # Half of the circle's width on this row
+            dx = int((radius * radius - dy * dy) ** 0.5)
+            self.fill_rect(x - dx, y + dy, x + dx + 1, y + dy + 1, color)
+
+    def save(self, path: str, level: int = 6) -> None:
+        """
+        purpose:
+            Saves the canvas as a PNG file, or as a binary PPM file when path ends with .ppm
+        parameters:
+            path: The file path to save to
+            level: The zlib compression level used for PNG files
+        returns:
+            None
+        """
+        with open(path, "wb") as f:
+            if path.lower().endswith(".ppm"):
+                f.write(b"P6\n%d %d\n255\n" % (self.width, self.height))
+                f.write(self.pixels)
+            else:
+                f.write(encode_png(self.width, self.height, bytes(self.pixels), level=level))
+
+
+class SvgCanvas:
+    """Collects lines and circles as SVG elements"""
+
+    def __init__(self, width: int, height: int, background: str | None = None, color="gray"):
+        """
+        purpose:
+            Constructs a SvgCanvas object
+        parameters:
+            width, height: The size of the drawing in pixels
+            background: The file path of a PNG image behind the drawing, centred without scaling
+                like RasterCanvas and the map window
+            color: The colour of the drawing around the background
+        returns:
+            None
+        """
+        self.width = width
+        self.height = height
+        self.background = background
+        self.color = color
+        self.elements: list[str] = []
+
+    def copy(self) -> "SvgCanvas":
+        """Returns a new drawing with the same elements"""
+        other = SvgCanvas(self.width, self.height, self.background, self.color)
+        other.elements = list(self.elements)
+        return other
+
+    def getWidth(self) -> int:
+        """Returns the width of the drawing"""
+        return self.width
+
+    def getHeight(self) -> int:
+        """Returns the height of the drawing"""
+        return self.height
+
+    def draw_polyline(self, points: Iterable[tuple[int, int]], color="black", width: int = 1) -> None:
+        """
+        purpose:
+            Adds a line through every point
+        parameters:
+            points: The (x, y) pixel points to connect
+            color: The line colour
+            width: The line thickness in pixels
+        returns:
+            None
+        """
+        coords = " ".join(f"{x},{y}" for x, y in points)
+        self.elements.append(
+            f'<polyline points="{coords}" fill="none" stroke="{color}" stroke-width="{width}" '
+            'stroke-linejoin="round" stroke-linecap="round"/>'
+        )
+
+    def draw_circle(self, x: int, y: int, radius: int, color="black", outline=None) -> None:
+        """
+        purpose:
+            Adds a filled circle
+        parameters:
+            x, y: The centre of the circle
+            radius: The radius of the circle in pixels
+            color: The fill colour
+            outline: The colour of a one pixel border, or None for no border
+        returns:
+            None
+        """
+        stroke = f' stroke="{outline}"' if outline else ""
+        self.elements.append(f'<circle cx="{x}" cy="{y}" r="{radius}" fill="{color}"{stroke}/>')
+
+    def save(self, path: str) -> None:
+        """
+        purpose:
+            Saves the drawing as an SVG file. The background image is linked, not embedded.
+        parameters:
+            path: The file path to save to
+        returns:
+            None
+        """
+        lines = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" height="{self.height}" '
+            f'viewBox="0 0 {self.width} {self.height}">',
+            f'<rect width="100%" height="100%" fill="{self.color}"/>',
+        ]
+        if self.background:
+            width, height = read_png_size(self.background)
+            href = os.path.relpath(self.background, os.path.dirname(os.path.abspath(path)))
+            lines.append(
+                f'<image href="{href}" x="{(self.width - width) // 2}" y="{(self.height - height) // 2}" '
+                f'width="{width}" height="{height}"/>'
+            )
+        lines.extend(self.elements)
+        lines.append("</svg>")
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
@@ -0,0 +1,92 @@
+# type: ignore
+from geometry import *
+import pytest
+
+
+def test_haversine():
+    # Edmonton to Calgary is about 281 km
+    assert haversine(53.5461, -113.4938, 51.0447, -114.0719) == pytest.approx(281, abs=1)
+    assert haversine(53.5, -113.5, 53.5, -113.5) == 0
+
+
+def test_cumulative_distances():
+    coords = [(53.50, -113.50), (53.55, -113.50), (53.60, -113.50)]
+    distances = cumulative_distances(coords)
+    assert len(distances) == 3
+    assert distances[0] == 0
+    assert distances[1] == pytest.approx(distances[2] / 2)
+    assert distances[2] == pytest.approx(haversine(53.50, -113.50, 53.60, -113.50))
+
+
+def test_build_distance_index_keeps_shapes_separate():
+    shapes = {
+        "a": [(53.50, -113.50), (53.60, -113.50)],
+        "b": [(10.0, 10.0)],
+        "c": [],
+        "d": [(53.60, -113.50), (53.50, -113.50)],
+    }
+    index = build_distance_index(shapes)
+    assert list(index["b"]) == [0.0]
+    assert list(index["c"]) == []
+    # The jump between the end of one shape and the start of the next isn't counted
+    assert index["a"][-1] == pytest.approx(index["d"][-1])
+    assert index["a"][-1] == pytest.approx(11.12, abs=0.01)
+
+
+def test_position_at_distance():
+    coords = [(53.50, -113.50), (53.60, -113.50), (53.60, -113.40)]
+    distances = cumulative_distances(coords)
+    assert position_at_distance(coords, distances, -1) == coords[0]
+    assert position_at_distance(coords, distances, distances[-1] + 1) == coords[-1]
+    assert position_at_distance(coords, distances, distances[1]) == pytest.approx(coords[1])
+    assert position_at_distance(coords, distances, distances[1] / 2) == pytest.approx((53.55, -113.50))
+    assert position_at_distance([], [], 1) is None
+
+
+def test_segment_at_distance():
+    distances = [0.0, 2.0, 5.0]
+    assert segment_at_distance(distances, -1) == (0, 0.0)
+    assert segment_at_distance(distances, 6) == (2, 0.0)
+    assert segment_at_distance(distances, 1) == (0, 0.5)
+    assert segment_at_distance(distances, 3.5) == (1, 0.5)
+
+
+def test_simplify():
+    line = [(0, 0), (1, 0.1), (2, -0.1), (3, 5), (4, 6), (5, 7)]
+    assert simplify(line, 0.5) == [0, 2, 3, 5]
+    assert simplify(line, 100) == [0, 5]
+    # (4, 6) lies on the line from (3, 5) to (5, 7) so even no tolerance drops it
+    assert simplify(line, 0) == [0, 1, 2, 3, 5]
+    assert simplify([(0, 0), (1, 1)], 1) == [0, 1]
+    # A loop that starts and ends at the same point keeps its far side
+    assert simplify([(0, 0), (5, 0), (5, 5), (0, 0)], 1) == [0, 1, 2, 3]
+
+
+def test_spatial_grid():
+    grid = SpatialGrid(10)
+    grid.insert("point", 5, 5, 5, 5)
+    grid.insert("segment", 0, 0, 35, 0)
+    grid.insert("far", 500, 500, 510, 510)
+    assert len(grid) == 3
+    assert grid.query(0, 0, 9, 9) == {"point", "segment"}
+    assert grid.query(31, -1, 39, 1) == {"segment"}
+    assert grid.query(200, 200, 100, 100) == set()
+    assert grid.query(-1000, -1000, 1000, 1000) == {"point", "segment", "far"}
+
+
+def test_grid_clusters():
+    clusters = GridClusters(10)
+    clusters.add(1, 1)
+    clusters.add(3, 5)
+    clusters.add(15, 5)
+    clusters.add(500, 500)
+    assert len(clusters) == 3
+    assert clusters.query(0, 0, 19, 9) == [(2, 3, 2), (15, 5, 1)]
+    assert clusters.query(-1000, -1000, 1000, 1000)[-1] == (500, 500, 1)
+
+    # Removing a point only changes the cluster of its cell
+    clusters.remove(1, 1)
+    assert clusters.query(0, 0, 9, 9) == [(3, 5, 1)]
+    clusters.remove(3, 5)
+    assert len(clusters) == 2
+    assert clusters.query(0, 0, 9, 9) == []
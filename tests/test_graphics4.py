@@ -0,0 +1,613 @@
+from graphics4 import *
+from graphics4 import _parsePPM
+import graphics4
+import pytest
+import tkinter
+
+
+def test_parse_ppm():
+    data = b"P6\n2 1\n255\n" + bytes([255, 0, 0, 0, 0, 255])
+    assert _parsePPM(data) == (2, 1, bytes([255, 0, 0, 0, 0, 255]))
+
+
+def test_parse_ppm_truncated_header():
+    for data in (b"", b"P6", b"P6 2 1", b"P6 2 1 255"):
+        with pytest.raises(GraphicsError):
+            _parsePPM(data)
+
+
+def test_parse_ppm_not_p6():
+    with pytest.raises(GraphicsError):
+        _parsePPM(b"P3\n1 1\n255\n0 0 0\n")
+    with pytest.raises(GraphicsError):
+        _parsePPM(b"P6\n1 1\n65535\n" + bytes(6))
+
+
+def test_parse_ppm_short_pixels():
+    with pytest.raises(GraphicsError):
+        _parsePPM(b"P6\n2 2\n255\n" + bytes(9))
+
+
+class FakeCanvas:
+    """Stands in for the Tk canvas under GraphWin._create, storing the options of each item like Tk"""
+
+    defaults = {"line": {"fill": "black", "width": "1.0", "dash": "", "arrow": "none", "state": "", "tags": ""}}
+
+    def __init__(self):
+        self._pool = {}
+        self._kinds = {}
+        self._defaults = {}
+        self.poolCreated = 0
+        self.poolReused = 0
+        self.options = {}
+        self.item_coords = {}
+        self.queries = 0
+
+    def coords(self, item, *args):
+        self.item_coords[item] = args
+
+    def itemconfigure(self, item, cnf=None, **kw):
+        if cnf is None and not kw:
+            self.queries += 1
+            defaults = self.defaults[self._kinds[item]]
+            return {
+                name: (name, "", "", default, self.options[item].get(name, default))
+                for name, default in defaults.items()
+            }
+        self.options[item].update(cnf or {}, **kw)
+
+    def tag_raise(self, item):
+        pass
+
+
+@pytest.fixture
+def pooled_canvas(monkeypatch):
+    """A FakeCanvas whose items are created by GraphWin._create with pooling on"""
+    import tkinter
+
+    def create(self, item_type, args, kw):
+        item = len(self.options) + 1
+        self.options[item] = dict(kw)
+        self.coords(item, *args)
+        return item
+
+    monkeypatch.setattr(tkinter.Canvas, "_create", create)
+    return FakeCanvas()
+
+
+def test_pooled_item_is_reset_to_defaults(pooled_canvas):
+    canvas = pooled_canvas
+    item = GraphWin._create(canvas, "line", (0, 0, 10, 10), {"fill": "red", "width": 4, "dash": (4, 2), "arrow": "last"})
+    canvas._pool["line"] = [item]
+
+    reused = GraphWin._create(canvas, "line", (1, 1, 5, 5), {"fill": "blue"})
+    assert reused == item
+    assert canvas.poolCreated == 1
+    assert canvas.poolReused == 1
+    assert canvas.item_coords[item] == (1, 1, 5, 5)
+    assert canvas.options[item] == {
+        "fill": "blue",
+        "width": "1.0",
+        "dash": "",
+        "arrow": "none",
+        "state": "normal",
+        "tags": "",
+    }
+
+
+def test_pooled_defaults_are_read_once(pooled_canvas):
+    canvas = pooled_canvas
+    item = GraphWin._create(canvas, "line", (0, 0, 10, 10), {})
+    for width in (2, 3, 4):
+        canvas._pool["line"] = [item]
+        GraphWin._create(canvas, "line", (0, 0, 10, 10), {"width": width})
+
+    assert canvas.poolReused == 3
+    assert canvas.queries == 1
+    assert canvas.options[item]["width"] == 4
+
+
+class FakeWindow:
+    """Stands in for a GraphWin and the Tk root, keeping canvas items like Tk without a display"""
+
+    # The GraphWin methods under test only call the canvas methods below
+    _requestFlush = GraphWin._requestFlush
+    _scheduleFrame = GraphWin._scheduleFrame
+    _flushFrame = GraphWin._flushFrame
+    _releaseItems = GraphWin._releaseItems
+    batch = GraphWin.batch
+    setFrameRate = GraphWin.setFrameRate
+    setCoords = GraphWin.setCoords
+    toScreen = GraphWin.toScreen
+    setWheelHandler = GraphWin.setWheelHandler
+    setDragHandler = GraphWin.setDragHandler
+
+    def __init__(self, width=200, height=200):
+        self.width = width
+        self.height = height
+        self.autoflush = True
+        self.closed = False
+        self.trans = None
+        self._batchDepth = 0
+        self._dirty = False
+        self._frameDelay = None
+        self._framePending = False
+        self._pool = None
+        self._kinds = {}
+        # Maps each item id with its type, flat coords, options and tags
+        self.items = {}
+        self.last_id = 0
+        self.raised = []
+        self.scheduled = []
+        self.bindings = {}
+        self.updates = 0
+        self.idle_updates = 0
+
+    def isClosed(self):
+        return self.closed
+
+    def _add(self, kind, args, kw):
+        args = tkinter._flatten(args)
+        options = {}
+        if args and isinstance(args[-1], dict):
+            options.update(args[-1])
+            args = args[:-1]
+        options.update(kw)
+        tags = options.pop("tags", "")
+        self.last_id += 1
+        self.items[self.last_id] = {"type": kind, "coords": list(args), "options": options, "tags": set(tags.split())}
+        return self.last_id
+
+    def create_line(self, *args, **kw):
+        return self._add("line", args, kw)
+
+    def create_oval(self, *args, **kw):
+        return self._add("oval", args, kw)
+
+    def create_image(self, *args, **kw):
+        return self._add("image", args, kw)
+
+    def find_withtag(self, tagOrId):
+        if isinstance(tagOrId, int):
+            return (tagOrId,) if tagOrId in self.items else ()
+        return tuple(item for item, spec in self.items.items() if tagOrId in spec["tags"])
+
+    def coords(self, tagOrId, *args):
+        for item in self.find_withtag(tagOrId):
+            self.items[item]["coords"] = list(tkinter._flatten(args))
+
+    def itemconfigure(self, tagOrId, cnf=None, **kw):
+        options = dict(cnf or {}, **kw)
+        tags = options.pop("tags", None)
+        for item in self.find_withtag(tagOrId):
+            self.items[item]["options"].update(options)
+            if tags is not None:
+                self.items[item]["tags"] = set(tags.split())
+
+    itemconfig = itemconfigure
+
+    def addtag_withtag(self, newtag, tagOrId):
+        for item in self.find_withtag(tagOrId):
+            self.items[item]["tags"].add(newtag)
+
+    def tag_raise(self, tagOrId):
+        self.raised.append(tagOrId)
+
+    def delete(self, tagOrId):
+        for item in self.find_withtag(tagOrId):
+            del self.items[item]
+
+    def move(self, tagOrId, dx, dy):
+        for item in self.find_withtag(tagOrId):
+            coords = self.items[item]["coords"]
+            self.items[item]["coords"] = [c + (dy if i % 2 else dx) for i, c in enumerate(coords)]
+
+    def after(self, ms, func):
+        self.scheduled.append(func)
+
+    def bind(self, sequence, func, add=None):
+        if add:
+            self.bindings.setdefault(sequence, []).append(func)
+        else:
+            self.bindings[sequence] = [func]
+
+    def update(self):
+        self.updates += 1
+
+    def update_idletasks(self):
+        self.idle_updates += 1
+
+    def state(self, tagOrId):
+        """The states of the items, which are shown unless set otherwise"""
+        return [self.items[item]["options"].get("state", "normal") for item in self.find_withtag(tagOrId)]
+
+
+class FakePhotoImage:
+    """Stands in for tk.PhotoImage. Files are 40 by 30 pixels, and each decoded file is recorded."""
+
+    decoded = []
+
+    def __init__(self, file=None, master=None, width=0, height=0, data=None):
+        if file is not None:
+            FakePhotoImage.decoded.append(file)
+            width, height = 40, 30
+        self._width = width
+        self._height = height
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def zoom(self, factor):
+        return FakePhotoImage(width=self._width * factor, height=self._height * factor)
+
+    def subsample(self, factor):
+        return FakePhotoImage(width=-(-self._width // factor), height=-(-self._height // factor))
+
+
+@pytest.fixture
+def win(monkeypatch):
+    """A FakeWindow that is also the Tk root flushed by autoflush, with FakePhotoImage images"""
+    window = FakeWindow()
+    monkeypatch.setattr(graphics4, "_getRoot", lambda: window)
+    monkeypatch.setattr(graphics4.tk, "PhotoImage", FakePhotoImage)
+    FakePhotoImage.decoded = []
+    return window
+
+
+def test_polyline_points():
+    assert Polyline(Point(0, 0), Point(1, 2)).coords == [0, 0, 1, 2]
+    assert Polyline([Point(0, 0), Point(1, 2)]).coords == [0, 0, 1, 2]
+    assert Polyline([0, 0, 1, 2, 3, 4]).coords == [0, 0, 1, 2, 3, 4]
+    assert [(p.getX(), p.getY()) for p in Polyline([0, 0, 1, 2]).getPoints()] == [(0, 0), (1, 2)]
+    for coords in ([], [0, 0], [0, 0, 1]):
+        with pytest.raises(GraphicsError):
+            Polyline(coords)
+
+
+def test_polyline_draws_one_item(win):
+    coords = [i % 200 for i in range(2000)]
+    line = Polyline(coords)
+    line.setWidth(4)
+    line.draw(win)
+
+    assert list(win.items) == [line.id]
+    assert win.items[line.id]["type"] == "line"
+    assert win.items[line.id]["coords"] == coords
+    assert win.items[line.id]["options"]["width"] == 4
+    assert win.updates == 1
+
+
+def test_polyline_set_points_keeps_item(win):
+    line = Polyline([0, 0, 10, 10])
+    line.draw(win)
+    item = line.id
+    line.setPoints([1, 1, 2, 2, 3, 3])
+
+    assert line.id == item
+    assert list(win.items) == [item]
+    assert win.items[item]["coords"] == [1, 1, 2, 2, 3, 3]
+
+    line.move(1, 2)
+    assert line.coords == [2, 3, 3, 4, 4, 5]
+    assert win.items[item]["coords"] == [2, 3, 3, 4, 4, 5]
+    line.undraw()
+    assert win.items == {}
+    # An undrawn line only keeps its points
+    line.setPoints([0, 0, 5, 5])
+    assert line.coords == [0, 0, 5, 5]
+    assert win.items == {}
+
+
+def test_polyline_world_coordinates(win):
+    win.setCoords(0, 0, 10, 10)
+    line = Polyline([0, 0, 10, 10])
+    line.draw(win)
+    assert win.items[line.id]["coords"] == [*win.toScreen(0, 0), *win.toScreen(10, 10)]
+    assert win.items[line.id]["coords"] == [0, 199, 199, 0]
+
+
+def test_batch_flushes_once(win):
+    with win.batch():
+        for i in range(50):
+            Polyline([i, 0, i, 10]).draw(win)
+        with win.batch():
+            Polyline([0, 0, 1, 1]).draw(win)
+        assert win.updates == 0
+
+    assert len(win.items) == 51
+    assert win.updates == 1
+
+
+def test_batch_without_changes_does_not_flush(win):
+    with win.batch():
+        pass
+    assert win.updates == 0
+
+
+def test_frame_rate_coalesces_flushes(win):
+    win.setFrameRate(50)
+    assert win._frameDelay == 20
+    for i in range(10):
+        Polyline([i, 0, i, 10]).draw(win)
+
+    # Ten changes schedule one frame, which is drawn when Tk runs it
+    assert len(win.scheduled) == 1
+    assert win.updates == 0
+    win.scheduled.pop()()
+    assert win.idle_updates == 1
+    Polyline([0, 0, 1, 1]).draw(win)
+    assert len(win.scheduled) == 1
+
+    win.setFrameRate(None)
+    Polyline([0, 0, 1, 1]).draw(win)
+    assert win.updates == 1
+
+
+def test_no_flush_without_autoflush(win):
+    win.autoflush = False
+    Polyline([0, 0, 1, 1]).draw(win)
+    assert win.updates == 0
+    assert win.scheduled == []
+
+
+def test_marker_layer_tag_is_its_id(win):
+    markers = MarkerLayer([10, 20, 30], [5, 5, 5], 2, tag="disruptions")
+    markers.draw(win)
+
+    assert markers.id == markers.getTag() == "disruptions"
+    assert len(markers) == 3
+    assert len(win.find_withtag("disruptions")) == 3
+    assert [win.items[item]["coords"] for item in win.find_withtag("disruptions")] == [
+        [8, 3, 12, 7],
+        [18, 3, 22, 7],
+        [28, 3, 32, 7],
+    ]
+    # Every marker is drawn in one pass with one flush
+    assert win.updates == 1
+
+    markers.setFill("red")
+    assert {win.items[item]["options"]["fill"] for item in win.items} == {"red"}
+    markers.undraw()
+    assert win.items == {}
+
+
+def test_marker_layer_default_tags_differ():
+    first, second = MarkerLayer([0], [0]), MarkerLayer([0], [0])
+    assert first.getTag() != second.getTag()
+    assert first.clone().getTag() not in (first.getTag(), second.getTag())
+    with pytest.raises(GraphicsError):
+        MarkerLayer([0, 1], [0])
+
+
+def test_marker_layer_hide_and_show(win):
+    markers = MarkerLayer([10, 20], [10, 20])
+    markers.hide()
+    markers.draw(win)
+    assert win.state(markers.id) == ["hidden", "hidden"]
+
+    markers.show()
+    assert win.state(markers.id) == ["normal", "normal"]
+    markers.hide()
+    assert win.state(markers.id) == ["hidden", "hidden"]
+
+
+def test_marker_layer_set_positions(win):
+    markers = MarkerLayer([10, 20], [10, 20], 1)
+    markers.draw(win)
+    items = win.find_withtag(markers.id)
+
+    # The same number of markers moves the drawn items
+    markers.setPositions([50, 60], [70, 80])
+    assert win.find_withtag(markers.id) == items
+    assert [win.items[item]["coords"] for item in items] == [[49, 69, 51, 71], [59, 79, 61, 81]]
+
+    # Another number of markers draws them again
+    markers.setPositions([1, 2, 3], [1, 2, 3])
+    assert len(win.find_withtag(markers.id)) == 3
+    assert not set(items) & set(win.items)
+
+    markers.move(1, 1)
+    assert markers.xs == [2, 3, 4]
+    assert win.items[win.find_withtag(markers.id)[0]]["coords"] == [1, 1, 3, 3]
+    with pytest.raises(GraphicsError):
+        markers.setPositions([1], [])
+
+
+def test_layer_manager_tags_layers(win):
+    layers = LayerManager(win, above="ui")
+    line = Polyline([0, 0, 1, 1])
+    with pytest.raises(GraphicsError):
+        layers.add("routes", line)
+    line.draw(win)
+    markers = MarkerLayer([5, 6], [5, 6])
+    markers.draw(win)
+    layers.add("routes", line)
+    layers.add("disruptions", markers)
+
+    assert layers.names() == ["routes", "disruptions"]
+    assert layers.has("routes") and not layers.has("heatmap")
+    assert win.find_withtag("layer:routes") == (line.id,)
+    assert len(win.find_withtag("layer:disruptions")) == 2
+    # Controls stay above each added layer
+    assert win.raised == ["ui", "ui"]
+
+
+def test_layer_manager_hide_and_show(win):
+    layers = LayerManager(win, above="ui")
+    markers = MarkerLayer([5, 6], [5, 6])
+    markers.draw(win)
+    layers.add("disruptions", markers)
+
+    layers.hide("disruptions")
+    assert not layers.isVisible("disruptions")
+    assert win.state("layer:disruptions") == ["hidden", "hidden"]
+    # Objects added to a hidden layer are hidden too
+    line = Polyline([0, 0, 1, 1])
+    line.draw(win)
+    layers.add("disruptions", line)
+    assert win.state(line.id) == ["hidden"]
+
+    win.raised.clear()
+    layers.toggle("disruptions")
+    assert layers.isVisible("disruptions")
+    assert win.state("layer:disruptions") == ["normal"] * 3
+    assert win.raised == ["layer:disruptions", "ui"]
+    layers.toggle("disruptions")
+    assert not layers.isVisible("disruptions")
+    # Missing layers are ignored
+    layers.show("missing")
+    layers.hide("missing")
+    assert not layers.isVisible("missing")
+
+
+def test_layer_manager_recolor(win):
+    layers = LayerManager(win)
+    line = Polyline([0, 0, 1, 1])
+    line.draw(win)
+    layers.add("routes", line)
+    layers.recolor("routes", "green")
+
+    assert win.items[line.id]["options"]["fill"] == "green"
+    assert line.config["fill"] == "green"
+    assert win.raised == []
+
+
+def test_layer_manager_delete(win):
+    layers = LayerManager(win)
+    image = Image(Point(0, 0), FakePhotoImage(width=4, height=4))
+    image.draw(win)
+    line = Polyline([0, 0, 1, 1])
+    line.draw(win)
+    layers.add("overlay", image)
+    layers.add("overlay", line)
+    layers.hide("overlay")
+    assert image.imageId in Image.imageCache
+
+    layers.delete("overlay")
+    assert win.items == {}
+    assert not layers.has("overlay")
+    assert layers.hidden == set()
+    assert image.canvas is None and line.canvas is None
+    # The photo image can be collected once its layer is deleted
+    assert image.imageId not in Image.imageCache
+    # A deleted object can be drawn again
+    line.draw(win)
+    assert len(win.items) == 1
+
+
+@pytest.fixture
+def pyramids(win, monkeypatch):
+    """An empty ImagePyramid cache"""
+    monkeypatch.setattr(ImagePyramid, "cache", {})
+    return ImagePyramid.cache
+
+
+def test_image_pyramid_decodes_once(pyramids, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    pyramid = ImagePyramid.load("map.png")
+    assert ImagePyramid.load(str(tmp_path / "map.png")) is pyramid
+    assert FakePhotoImage.decoded == ["map.png"]
+    assert (pyramid.getWidth(), pyramid.getHeight()) == (40, 30)
+
+    ImagePyramid.load("other.png")
+    assert FakePhotoImage.decoded == ["map.png", "other.png"]
+    assert len(pyramids) == 2
+
+
+def test_image_pyramid_levels(pyramids):
+    pyramid = ImagePyramid.load("map.png", scales=(0.5,))
+    assert set(pyramid.levels) == {1, 0.5}
+    half = pyramid.level(0.5)
+    assert (half.width(), half.height()) == (20, 15)
+
+    # Levels are built the first time they are asked for, then kept
+    assert 2 not in pyramid.levels
+    double = pyramid.level(2)
+    assert (double.width(), double.height()) == (80, 60)
+    assert pyramid.level(2) is double
+    assert pyramid.level(1 / 3).width() == 14
+    assert FakePhotoImage.decoded == ["map.png"]
+
+    for scale in (1.5, 0.4):
+        with pytest.raises(GraphicsError):
+            pyramid.level(scale)
+
+
+def test_image_from_pyramid_level(pyramids, win):
+    level = ImagePyramid.load("map.png").level(2)
+    image = Image(Point(0, 0), level)
+    image.draw(win)
+
+    assert image.img is level
+    assert image.getWidth() == 80
+    assert win.items[image.id]["options"]["image"] is level
+    assert FakePhotoImage.decoded == ["map.png"]
+
+    half = ImagePyramid.load("map.png").level(0.5)
+    image.setImage(half)
+    assert win.items[image.id]["options"]["image"] is half
+    assert Image.imageCache[image.imageId] is half
+    image.undraw()
+
+
+class FakeEvent:
+    """Stands in for a Tk mouse event"""
+
+    def __init__(self, x, y, num=None, delta=0):
+        self.x = x
+        self.y = y
+        self.num = num
+        self.delta = delta
+
+
+def fire(win, sequence, event):
+    for func in win.bindings[sequence]:
+        func(event)
+
+
+def test_wheel_handler(win):
+    turns = []
+    win.setWheelHandler(lambda p, steps: turns.append((p.getX(), p.getY(), steps)))
+
+    # X11 sends buttons 4 and 5, Windows and macOS send deltas
+    fire(win, "<Button-4>", FakeEvent(10, 20, num=4))
+    fire(win, "<Button-5>", FakeEvent(10, 20, num=5))
+    fire(win, "<MouseWheel>", FakeEvent(30, 40, delta=120))
+    fire(win, "<MouseWheel>", FakeEvent(30, 40, delta=-240))
+    assert turns == [(10, 20, 1), (10, 20, -1), (30, 40, 1), (30, 40, -1)]
+
+
+def test_drag_handler(win):
+    moves = []
+    clicks = []
+    win.bind("<Button-1>", clicks.append)
+    win.setDragHandler(lambda dx, dy: moves.append((dx, dy)))
+
+    # Motion before a press isn't a drag
+    fire(win, "<B1-Motion>", FakeEvent(5, 5))
+    fire(win, "<Button-1>", FakeEvent(10, 10))
+    fire(win, "<B1-Motion>", FakeEvent(15, 8))
+    fire(win, "<B1-Motion>", FakeEvent(20, 8))
+    assert moves == [(5, -2), (5, 0)]
+    # The click binding used by getMouse still sees the press
+    assert len(clicks) == 1
+
+
+def test_drag_handler_starts_drag(win):
+    moves = []
+    # Presses on the controls in the left 100 pixels don't drag the map
+    win.setDragHandler(lambda dx, dy: moves.append((dx, dy)), lambda x, y: x >= 100)
+
+    fire(win, "<Button-1>", FakeEvent(50, 10))
+    fire(win, "<B1-Motion>", FakeEvent(150, 10))
+    assert moves == []
+    fire(win, "<Button-1>", FakeEvent(150, 10))
+    fire(win, "<B1-Motion>", FakeEvent(140, 30))
+    assert moves == [(-10, 20)]
+    # A later press on the controls ends the drag
+    fire(win, "<Button-1>", FakeEvent(50, 10))
+    fire(win, "<B1-Motion>", FakeEvent(60, 10))
+    assert moves == [(-10, 20)]
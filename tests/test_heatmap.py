@@ -0,0 +1,33 @@
+# type: ignore
+from heatmap import *
+from renderer import PNG_SIGNATURE
+
+
+def test_render_heatmap_size_and_transparency():
+    columns, rows, pixels = render_heatmap([], [], 10, 9, cell=4, radius=1)
+    assert (columns, rows) == (3, 3)
+    assert pixels == bytes(4 * 9)
+
+
+def test_render_heatmap_smooths_points():
+    # Two points in the middle cell and one point outside of the image
+    columns, rows, pixels = render_heatmap([13, 14, 500], [13, 14, 500], 28, 28, cell=4, radius=1)
+    assert (columns, rows) == (7, 7)
+    alpha = [pixels[i + 3] for i in range(0, len(pixels), 4)]
+    # The peak is opaque red and the density falls away from it evenly on each side
+    assert pixels[4 * 24 : 4 * 25] == bytes((255, 0, 0, MAX_ALPHA))
+    assert alpha[24] > alpha[17] > alpha[10] > 0
+    assert alpha[17] == alpha[23] == alpha[25] == alpha[31]
+    # Two blur passes of radius 1 spread a point two cells away, so the corners are untouched
+    assert alpha[0] == alpha[48] == 0
+
+
+def test_heatmap_png():
+    png = heatmap_png([10], [10], 20, 20, cell=4)
+    assert png.startswith(PNG_SIGNATURE)
+
+
+def test_sample_line():
+    assert sample_line([(0, 0), (10, 0), (10, 5)], 4) == [(0, 0), (4, 0), (8, 0), (10, 2)]
+    assert sample_line([(0, 0), (0, 0)], 4) == [(0, 0)]
+    assert sample_line([], 4) == []
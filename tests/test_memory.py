@@ -0,0 +1,40 @@
+import sys
+
+from memory import deep_size, format_size, traced_size
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def test_deep_size_counts_shared_objects_once():
+    shared = [1.5] * 100
+    outer = [shared, shared]
+
+    assert deep_size(outer) == sys.getsizeof(outer) + sys.getsizeof(shared) + sys.getsizeof(1.5)
+    seen = set()
+    first = deep_size(shared, seen)
+    assert deep_size(outer, seen) == sys.getsizeof(outer)
+    assert first > 0
+
+
+def test_deep_size_follows_attributes():
+    points = [Point(float(i), str(i) * 50) for i in range(10)]
+    size = deep_size(points)
+
+    assert size > sys.getsizeof(points) + sum(sys.getsizeof(str(i) * 50) for i in range(10))
+
+
+def test_traced_size():
+    values = [str(i) * 20 for i in range(1000)]
+
+    assert traced_size(values) >= sum(sys.getsizeof(value) for value in values)
+    assert traced_size(5) == 0
+
+
+def test_format_size():
+    assert format_size(999) == "999 B"
+    assert format_size(12_345) == "12.3 KB"
+    assert format_size(25_100_000) == "25.1 MB"
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from metrics import Histogram, Registry
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def add(self, n):
+        self.calls += n
+        return self.calls
+
+    @staticmethod
+    def double(n):
+        return 2 * n
+
+
+def test_histogram_small_values_are_exact():
+    histogram = Histogram(precision=3)
+    for value in range(16):
+        assert histogram.bucket_range(histogram.bucket(value)) == (value, value)
+
+
+def test_histogram_bucket_error():
+    histogram = Histogram(precision=5)
+    for value in [33, 100, 1_000, 123_456, 10**9 + 7]:
+        low, high = histogram.bucket_range(histogram.bucket(value))
+        assert low <= value <= high
+        assert (high - low) / value < 1 / 32
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.record(value)
+
+    assert len(histogram) == 1000
+    assert histogram.min == 1
+    assert histogram.max == 1000
+    assert histogram.percentile(50) == pytest.approx(500, rel=1 / 32)
+    assert histogram.percentile(99) == pytest.approx(990, rel=1 / 32)
+    assert histogram.percentile(100) == 1000
+    assert histogram.cumulative_buckets()[-1][1] == 1000
+    assert Histogram().percentile(50) == 0
+
+
+def test_registry_wraps_only_while_enabled():
+    registry = Registry()
+    original = Counter.add
+    registry.instrument(Counter, ["add", "double"], "Counter")
+    assert Counter.add is original
+
+    registry.enable()
+    counter = Counter()
+    counter.add(2)
+    counter.add(3)
+    assert Counter.double(4) == 8
+    registry.disable()
+    counter.add(1)
+
+    assert Counter.add is original
+    assert Counter.double(1) == 2
+    assert registry.histograms["Counter.add"].count == 2
+    assert registry.histograms["Counter.double"].count == 1
+    assert counter.calls == 6
+
+
+def test_registry_records_raised_calls():
+    registry = Registry()
+    registry.instrument(Counter, ["add"], "Counter")
+    registry.enable()
+    try:
+        with pytest.raises(TypeError):
+            Counter().add("1")
+    finally:
+        registry.disable()
+
+    assert registry.histograms["Counter.add"].count == 1
+
+
+def test_registry_exports(tmp_path):
+    registry = Registry()
+    for value in [1_000, 2_000, 2_000, 50_000]:
+        registry.record("lookup", value)
+
+    text = registry.to_prometheus()
+    assert 'ets_operation_calls_total{operation="lookup"} 4' in text
+    assert 'ets_operation_latency_seconds_bucket{operation="lookup",le="+Inf"} 4' in text
+    assert 'ets_operation_latency_seconds_count{operation="lookup"} 4' in text
+    assert 'ets_operation_latency_seconds_sum{operation="lookup"} 5.5e-05' in text
+
+    registry.write(str(tmp_path / "metrics.json"))
+    lookup = json.loads((tmp_path / "metrics.json").read_text())["operations"]["lookup"]
+    assert lookup["calls"] == 4
+    assert lookup["max_seconds"] == 5e-05
+    assert [seen for _, seen in lookup["buckets"]] == [1, 3, 4]
@@ -3,10 +3,15 @@ from io import StringIO
 from pathlib import Path
 from CMPT_Milestone2_EP_HM import *
 import builtins
+import json
 import pytest
 import sys
 import logging
+import os
+import pstats
+import metrics
 import shutil
+import subprocess
 
 
 LOGGER = logging.getLogger(__name__)
@@ -114,6 +119,210 @@ def complete_route_data(route_data: RouteData):
     return route_data
 
 
+@pytest.fixture
+def synthetic_data_path(monkeypatch, tmp_path):
+    """Changes the testing working directory to a temporary directory with small handwritten data files"""
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    (data_path / "routes.txt").write_text(
+        "route_id,agency_id,route_short_name,route_long_name\n"
+        '901,1,901,"Downtown - University"\n'
+        '902,1,902,"Downtown"\n'
+    )
+    (data_path / "trips.txt").write_text(
+        "route_id,service_id,trip_id,trip_headsign,direction_id,block_id,shape_id\n"
+        "901,1,1,Downtown,0,1,901-1-Dense\n"
+        "901,1,2,University,1,1,901-2-Long\n"
+        "902,1,3,Downtown,0,1,902-1-Loop\n"
+    )
+    # 901-1-Dense has the most coordinates but 901-2-Long covers the greater distance
+    (data_path / "shapes.txt").write_text(
+        "shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n"
+        "901-1-Dense,53.50,-113.50,1\n"
+        "901-1-Dense,53.501,-113.50,2\n"
+        "901-1-Dense,53.502,-113.50,3\n"
+        "901-1-Dense,53.503,-113.50,4\n"
+        "901-2-Long,53.50,-113.50,1\n"
+        "901-2-Long,53.60,-113.50,2\n"
+        "902-1-Loop,53.55,-113.45,1\n"
+        "902-1-Loop,53.55,-113.40,2\n"
+        "902-1-Loop,53.55,-113.45,3\n"
+    )
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def synthetic_route_data(route_data: RouteData, synthetic_data_path):
+    """Return a RouteData instance with the small handwritten trips and shapes data loaded"""
+    with Mute():
+        route_data.load_trips_data("data/trips.txt")
+        route_data.load_shapes_data("data/shapes.txt")
+    return route_data
+
+
+class FakeWidget:
+    """Stands in for the graphics4 Entry and Text objects of the map window"""
+
+    def __init__(self):
+        self.text = self
+        self.value = ""
+
+    def get(self):
+        return self.value
+
+    def setText(self, text):
+        self.value = text
+
+
+class FakeWin:
+    """Stands in for a GraphWin, running scheduled callbacks straight away. Drawn lines and
+    ovals are kept in self.items by their canvas ID, with the tags given to them"""
+
+    trans = None
+
+    def __init__(self):
+        self.keys = {}
+        self.mouse_handler = None
+        self.wheel_handler = None
+        self.drag_handler = None
+        self.starts_drag = None
+        self.items = {}
+        self.last_id = 0
+        self.scheduled = []
+        self.flushes = 0
+        self.raised = []
+
+    def setMouseHandler(self, func):
+        self.mouse_handler = func
+
+    def setWheelHandler(self, func):
+        self.wheel_handler = func
+
+    def setDragHandler(self, func, startsDrag=None):
+        self.drag_handler = func
+        self.starts_drag = startsDrag
+
+    def isClosed(self):
+        return False
+
+    def toScreen(self, x, y):
+        return x, y
+
+    def create_line(self, coords, options):
+        return self.create("line", list(coords), set())
+
+    def create_oval(self, x1, y1, x2, y2, options, tags, state):
+        return self.create("oval", [x1, y1, x2, y2], {tags})
+
+    def create_text(self, x, y, options):
+        return self.create("text", [x, y], set())
+
+    def create_image(self, x, y, image):
+        return self.create("image", [x, y], set())
+
+    def create(self, kind, coords, tags):
+        # Like Tk, the IDs of deleted items aren't given out again
+        self.last_id += 1
+        self.items[self.last_id] = (kind, coords, tags)
+        return self.last_id
+
+    def withtag(self, tag):
+        return [item for item, (kind, coords, tags) in self.items.items() if item == tag or tag in tags]
+
+    def _releaseItems(self, tag):
+        for item in self.withtag(tag):
+            del self.items[item]
+
+    def bindKey(self, key, func, whileTyping=True):
+        # The real binding, so key events can be sent to self.keys with the widget they were typed into
+        from graphics4 import GraphWin
+
+        GraphWin.bindKey(self, key, func, whileTyping)
+
+    def bind(self, sequence, func):
+        self.keys[sequence.strip("<>")] = func
+
+    @property
+    def master(self):
+        # Key bindings go on the toplevel, which is the window itself here
+        return self
+
+    def mainloop(self):
+        pass
+
+    def after_idle(self, func, *args):
+        func(*args)
+
+    def after(self, ms, func, *args):
+        self.scheduled.append((func, args))
+
+    def run_scheduled(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for func, args in scheduled:
+            func(*args)
+
+    def itemconfig(self, item, options):
+        pass
+
+    def addtag_withtag(self, tag, item):
+        for found in self.withtag(item):
+            self.items[found][2].add(tag)
+
+    def itemconfigure(self, tag, **options):
+        pass
+
+    def tag_raise(self, tag):
+        self.raised.append(tag)
+
+    def _requestFlush(self):
+        pass
+
+    def flush(self):
+        self.flushes += 1
+
+    def getWidth(self):
+        return 800
+
+    def getHeight(self):
+        return 920
+
+
+@pytest.fixture
+def map_session(monkeypatch, synthetic_route_data):
+    """Return a MapSession over the handwritten data with a fake window. Drawn routes are recorded in session.drawn"""
+    from graphics4 import Point, Rectangle
+
+    def create_map_window():
+        search_box = Rectangle(Point(50, 105), Point(189, 125))
+        clear_box = Rectangle(Point(50, 130), Point(189, 150))
+        return FakeWin(), FakeWidget(), FakeWidget(), search_box, clear_box, FakeWidget(), None
+
+    def get_route_coords(data, route):
+        drawn.append(route.route_id)
+        return route_coords(data, route)
+
+    drawn = []
+    route_coords = InteractiveMap.get_route_coords
+    monkeypatch.setattr(InteractiveMap, "create_map_window", create_map_window)
+    monkeypatch.setattr(InteractiveMap, "get_route_coords", get_route_coords)
+    session = MapSession(synthetic_route_data)
+    session.drawn = drawn
+    return session
+
+
+def count_rows(path):
+    """Return the number of rows in a data file, not counting its header"""
+    with open(path) as f:
+        return sum(1 for line in f) - 1
+
+
+@pytest.fixture
+def fixed_load_stats(monkeypatch):
+    """Replaces the timings printed after each load with just the row count, so the output is the same every run"""
+    monkeypatch.setattr(LoadStats, "summary", lambda self: [f"Read {self.rows} rows"])
+
+
 @pytest.fixture
 def empty_data_path(monkeypatch):
     """Changes the testing working directory to a empty temporary directory"""
@@ -148,11 +357,37 @@ TEST_MENU_OUTPUT = [
     "(8) Load routes and shapes from a pickle",
     "",
     "(9) Interactive map",
+    "",
+    "(10) Find longest shape for route by distance",
+    "(11) Rank longest shapes and routes with most shapes",
+    "",
+    "(12) Start or stop timing queries",
+    "(13) Save query timings",
+    "(14) Profile commands",
+    "(15) Report memory use",
     "(0) Quit",
     "",
 ]
 
 
+def test_import_does_not_load_gui():
+    # Importing the program shouldn't import Tk, and importing graphics4 shouldn't need a display
+    code = (
+        "import sys, CMPT_Milestone2_EP_HM;"
+        "print('tkinter' in sys.modules, 'graphics4' in sys.modules);"
+        "import graphics4;"
+        "print(graphics4._root)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert out.stdout.split() == ["False", "False", "None"]
+
+
 def test_srt_parser(valid_data_path):
     import csv
     with open("data/traffic_disruptions.txt") as f:
@@ -170,9 +405,12 @@ def test_print_menu():
     assert output == TEST_MENU_OUTPUT, "print_menu() prints out the wrong menu!"
 
 
-def test_load_route_data_valid_path(monkeypatch, route_data, valid_data_path):
+def test_load_route_data_valid_path(monkeypatch, route_data, valid_data_path, fixed_load_stats):
     monkeypatch.setattr("builtins.input", lambda prompt="": "data/trips.txt")
-    expected = ["Enter a filename: Data from data/trips.txt loaded"]
+    expected = [
+        "Enter a filename: Data from data/trips.txt loaded",
+        f"Read {count_rows('data/trips.txt')} rows",
+    ]
 
     with CapturingInputOutput() as output:
         load_route_data(route_data)
@@ -189,9 +427,12 @@ def test_load_route_data_invalid_path(monkeypatch, route_data, valid_data_path):
     assert output == expected
 
 
-def test_load_route_data_default_path(monkeypatch, route_data, valid_data_path):
+def test_load_route_data_default_path(monkeypatch, route_data, valid_data_path, fixed_load_stats):
     monkeypatch.setattr("builtins.input", lambda prompt="": "")
-    expected = ["Enter a filename: Data from data/trips.txt loaded"]
+    expected = [
+        "Enter a filename: Data from data/trips.txt loaded",
+        f"Read {count_rows('data/trips.txt')} rows",
+    ]
 
     with CapturingInputOutput() as output:
         load_route_data(route_data)
@@ -199,9 +440,12 @@ def test_load_route_data_default_path(monkeypatch, route_data, valid_data_path):
     assert output == expected
 
 
-def test_load_shape_data_valid_path(monkeypatch, route_data, valid_data_path):
+def test_load_shape_data_valid_path(monkeypatch, route_data, valid_data_path, fixed_load_stats):
     monkeypatch.setattr("builtins.input", lambda prompt="": "data/shapes.txt")
-    expected = ["Enter a filename: Data from data/shapes.txt loaded"]
+    expected = [
+        "Enter a filename: Data from data/shapes.txt loaded",
+        f"Read {count_rows('data/shapes.txt')} rows",
+    ]
 
     with CapturingInputOutput() as output:
         load_shape_data(route_data)
@@ -219,9 +463,12 @@ def test_load_shape_data_invalid_path(monkeypatch, route_data, valid_data_path):
     assert output == expected
 
 
-def test_load_shape_data_default_path(monkeypatch, route_data, valid_data_path):
+def test_load_shape_data_default_path(monkeypatch, route_data, valid_data_path, fixed_load_stats):
     monkeypatch.setattr("builtins.input", lambda prompt="": "")
-    expected = ["Enter a filename: Data from data/shapes.txt loaded"]
+    expected = [
+        "Enter a filename: Data from data/shapes.txt loaded",
+        f"Read {count_rows('data/shapes.txt')} rows",
+    ]
 
     with CapturingInputOutput() as output:
         load_shape_data(route_data)
@@ -229,9 +476,12 @@ def test_load_shape_data_default_path(monkeypatch, route_data, valid_data_path):
     assert output == expected
 
 
-def test_load_disruptions_data_valid_path(monkeypatch, route_data, valid_data_path):
+def test_load_disruptions_data_valid_path(monkeypatch, route_data, valid_data_path, fixed_load_stats):
     monkeypatch.setattr("builtins.input", lambda prompt="": "data/traffic_disruptions.txt")
-    expected = ["Enter a filename: Data from data/traffic_disruptions.txt loaded"]
+    expected = [
+        "Enter a filename: Data from data/traffic_disruptions.txt loaded",
+        f"Read {count_rows('data/traffic_disruptions.txt')} rows",
+    ]
 
     with CapturingInputOutput() as output:
         load_disruptions_data(route_data)
@@ -249,9 +499,12 @@ def test_load_disruptions_data_invalid_path(monkeypatch, route_data, valid_data_
     assert output == expected
 
 
-def test_load_disruptions_data_default_path(monkeypatch, route_data, valid_data_path):
+def test_load_disruptions_data_default_path(monkeypatch, route_data, valid_data_path, fixed_load_stats):
     monkeypatch.setattr("builtins.input", lambda prompt="": "")
-    expected = ["Enter a filename: Data from data/traffic_disruptions.txt loaded"]
+    expected = [
+        "Enter a filename: Data from data/traffic_disruptions.txt loaded",
+        f"Read {count_rows('data/traffic_disruptions.txt')} rows",
+    ]
 
     with CapturingInputOutput() as output:
         load_disruptions_data(route_data)
@@ -259,6 +512,38 @@ def test_load_disruptions_data_default_path(monkeypatch, route_data, valid_data_
     assert output == expected
 
 
+def test_load_stats(disruptions_data):
+    stats = disruptions_data.load_stats()
+    assert list(stats) == ["disruptions"]
+    stats = stats["disruptions"]
+    assert stats.rows == count_rows("tests/test_files/data/traffic_disruptions.txt")
+    assert stats.bytes_read == os.path.getsize("tests/test_files/data/traffic_disruptions.txt")
+    assert stats.wall_time > 0 and stats.rows_per_second() > 0
+    # The sampled phase times are estimates scaled up to every row, so only their presence is checked
+    assert set(stats.phases) == {"parse", "convert", "build"}
+    assert all(seconds >= 0 for seconds in stats.phases.values())
+    assert stats.to_dict()["rows"] == stats.rows
+    assert stats.to_dict()["rss_growth_bytes"] == stats.rss_growth
+    assert stats.summary()[0].startswith(f"Read {stats.rows} rows")
+
+    old = pickle.loads(pickle.dumps(stats))
+    del old.rss_growth
+    assert pickle.loads(pickle.dumps(old)).rss_growth is None
+
+
+def test_disruption_start_dates(disruptions_data):
+    disruptions = disruptions_data.get_disruptions()
+    assert all(disruption.start_date <= disruption.finish_date for disruption in disruptions)
+
+
+def test_disruption_unpickles_without_start_date():
+    disruption = Disruption(date(2025, 1, 1), Coordinates(53.5, -113.5), date(2024, 1, 1))
+    del disruption.start_date
+    restored = pickle.loads(pickle.dumps(disruption))
+    assert restored.start_date is None
+    assert restored.finish_date == date(2025, 1, 1)
+
+
 def test_print_shape_ids_not_loaded(monkeypatch, route_data):
     monkeypatch.setattr("builtins.input", lambda prompt="": "")
     expected = ["Route data hasn't been loaded yet"]
@@ -385,6 +670,771 @@ def test_print_longest_shape_not_found(monkeypatch, complete_route_data):
     assert output == expected
 
 
+def test_get_shape_length(synthetic_route_data):
+    # 0.1 degrees of latitude is roughly 11.12 km
+    assert synthetic_route_data.get_shape_length("901-2-Long") == pytest.approx(11.12, abs=0.01)
+    assert synthetic_route_data.get_shape_length("901-1-Dense") == pytest.approx(0.33, abs=0.01)
+    assert synthetic_route_data.get_shape_length("missing") is None
+
+
+def test_get_position_at_distance(synthetic_route_data):
+    length = synthetic_route_data.get_shape_length("901-2-Long")
+    middle = synthetic_route_data.get_position_at_distance("901-2-Long", length / 2)
+    assert middle.get_coords() == pytest.approx((53.55, -113.50))
+
+    end = synthetic_route_data.get_position_at_distance("901-2-Long", length * 2)
+    assert end.get_coords() == pytest.approx((53.60, -113.50))
+    assert synthetic_route_data.get_position_at_distance("missing", 1) is None
+
+
+def test_get_longest_shape_by_distance(synthetic_route_data):
+    # Counting coordinates and measuring distance disagree on route 901
+    assert synthetic_route_data.get_longest_shape_from_route_id("901") == ("901-1-Dense", 4)
+    shape_id, length = synthetic_route_data.get_longest_shape_by_distance_from_route_id("901")
+    assert shape_id == "901-2-Long"
+    assert length == pytest.approx(11.12, abs=0.01)
+    assert synthetic_route_data.get_longest_shape_by_distance_from_route_id("999") is None
+
+
+def test_print_longest_shape_by_distance_found(monkeypatch, synthetic_route_data):
+    monkeypatch.setattr("builtins.input", lambda prompt="": "901")
+    expected = ["Enter route ID: The longest shape for 901 is 901-2-Long at 11.12 km"]
+
+    with CapturingInputOutput() as output:
+        find_longest_shape_by_distance(synthetic_route_data)
+
+    assert output == expected
+
+
+def test_print_longest_shape_by_distance_not_loaded(route_data):
+    expected = ["Route data hasn't been loaded yet"]
+
+    with CapturingInputOutput() as output:
+        find_longest_shape_by_distance(route_data)
+
+    assert output == expected
+
+
+def test_get_top_shapes(synthetic_route_data):
+    top = synthetic_route_data.get_top_shapes(2)
+    assert [shape_id for shape_id, _ in top] == ["901-2-Long", "902-1-Loop"]
+    assert top[0][1] == pytest.approx(11.12, abs=0.01)
+
+    assert synthetic_route_data.get_top_shapes(1, by="coordinates") == [("901-1-Dense", 4)]
+    assert len(synthetic_route_data.get_top_shapes(100)) == 3
+    with pytest.raises(ValueError):
+        synthetic_route_data.get_top_shapes(1, by="colour")
+    with pytest.raises(ValueError):
+        synthetic_route_data.get_top_shapes(-1)
+
+
+def test_get_top_routes_by_shape_count(synthetic_route_data):
+    assert synthetic_route_data.get_top_routes_by_shape_count(5) == [("901", 2), ("902", 1)]
+    assert synthetic_route_data.get_top_routes_by_shape_count(0) == []
+    with pytest.raises(ValueError):
+        synthetic_route_data.get_top_routes_by_shape_count(-1)
+
+
+def test_rankings_rebuilt_after_reload(synthetic_route_data):
+    assert synthetic_route_data.get_top_shapes(1)[0][0] == "901-2-Long"
+    with open("data/shapes.txt", "a") as f:
+        f.write("902-1-Loop,53.55,-112.0,4\n")
+    with Mute():
+        synthetic_route_data.load_shapes_data("data/shapes.txt")
+    assert synthetic_route_data.get_top_shapes(1)[0][0] == "902-1-Loop"
+
+
+def test_print_rankings(monkeypatch, synthetic_route_data):
+    answers = iter(["1", ""])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    expected = [
+        "Enter number of results: Rank shapes by (d)istance or (c)oordinates: Top 1 longest shapes",
+        "\t1. 901-2-Long at 11.12 km",
+        "Top 1 routes by shape variants",
+        "\t1. 901 [Downtown - University] with 2 shapes",
+    ]
+
+    with CapturingInputOutput() as output:
+        print_rankings(synthetic_route_data)
+
+    assert output == expected
+
+
+def test_print_rankings_by_coordinates(monkeypatch, synthetic_route_data):
+    answers = iter(["2", "c"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    expected = [
+        "Enter number of results: Rank shapes by (d)istance or (c)oordinates: Top 2 shapes by coordinates",
+        "\t1. 901-1-Dense with 4 coordinates",
+        "\t2. 902-1-Loop with 3 coordinates",
+        "Top 2 routes by shape variants",
+        "\t1. 901 [Downtown - University] with 2 shapes",
+        "\t2. 902 [Downtown] with 1 shapes",
+    ]
+
+    with CapturingInputOutput() as output:
+        print_rankings(synthetic_route_data)
+
+    assert output == expected
+
+
+def test_cli_shapes(synthetic_data_path):
+    with Capturing() as output:
+        status = cli(["shapes", "901", "902"])
+
+    assert status == 0
+    assert output == ["901\t901-1-Dense", "901\t901-2-Long", "902\t902-1-Loop"]
+
+
+def test_cli_ids_from_stdin_and_file(monkeypatch, synthetic_data_path):
+    (synthetic_data_path / "ids.txt").write_text("902\n\n")
+    monkeypatch.setattr("sys.stdin", StringIO("901\n"))
+    with Capturing() as output:
+        status = cli(["--format", "json", "longest", "-", "--file", "ids.txt", "--by", "distance"])
+
+    assert status == 0
+    records = [json.loads(line) for line in output]
+    assert [record["shape_id"] for record in records] == ["902-1-Loop", "901-2-Long"]
+
+
+def test_cli_not_found(synthetic_data_path, capsys):
+    status = cli(["coords", "901-2-Long", "missing"])
+    out, err = capsys.readouterr()
+
+    assert status == 1
+    assert out.splitlines() == ["901-2-Long\t53.5\t-113.5", "901-2-Long\t53.6\t-113.5"]
+    assert err == "missing: ** NOT FOUND **\n"
+
+
+def test_cli_closed_pipe(monkeypatch, synthetic_data_path, capsys):
+    class ClosedPipe:
+        """Stands in for stdout once a reader like head has exited"""
+
+        def __init__(self, f):
+            self.f = f
+
+        def write(self, text):
+            raise BrokenPipeError(32, "Broken pipe")
+
+        def flush(self):
+            pass
+
+        def fileno(self):
+            return self.f.fileno()
+
+    with open("stdout.txt", "w") as f:
+        monkeypatch.setattr(sys, "stdout", ClosedPipe(f))
+        status = cli(["shapes", "901", "902"])
+
+    assert status == 1
+    assert capsys.readouterr().err == ""
+
+
+def test_cli_unopened_files(monkeypatch, synthetic_data_path, capsys):
+    assert cli(["--snapshot", "data/missing.p", "shapes", "901"]) == 1
+    assert capsys.readouterr().err == "IOError: Couldn't open data/missing.p\n"
+
+    def fail(self, path):
+        raise OSError(5, "Input/output error")
+
+    monkeypatch.setattr(RouteData, "load_trips_data", fail)
+    assert cli(["shapes", "901"]) == 1
+    assert capsys.readouterr().err == "IOError: Input/output error\n"
+
+
+def test_cli_snapshot(synthetic_data_path):
+    shutil.copy(Path(__file__).parent / "test_files/data/traffic_disruptions.txt", "data")
+    with Capturing() as output:
+        assert cli(["snapshot", "save", "data/snap.p"]) == 0
+        assert cli(["--snapshot", "data/snap.p", "shapes", "902"]) == 0
+        assert cli(["snapshot", "load", "data/snap.p"]) == 0
+
+    assert output[:2] == ["saved\tdata/snap.p", "902\t902-1-Loop"]
+    assert output[3:5] == ["routes\t2", "shapes\t3"]
+
+
+def test_cli_snapshot_without_shapes(synthetic_data_path, capsys):
+    data = RouteData()
+    with Mute():
+        data.load_trips_data("data/trips.txt")
+    with open("data/routes.p", "wb") as f:
+        pickle.dump(data, f)
+
+    assert cli(["snapshot", "load", "data/routes.p"]) == 0
+    # The routes name 3 shapes, but none were loaded
+    assert "shapes\t0" in capsys.readouterr().out.splitlines()
+
+    assert cli(["--snapshot", "data/routes.p", "longest", "901"]) == 1
+    assert capsys.readouterr() == ("", "Shape ID data hasn't been loaded yet\n")
+
+
+def test_cli_ids_from_terminal(monkeypatch, synthetic_data_path, capsys):
+    class Terminal:
+        def isatty(self):
+            return True
+
+    monkeypatch.setattr(sys, "stdin", Terminal())
+    with pytest.raises(SystemExit) as exit_info:
+        cli(["shapes"])
+    assert exit_info.value.code == 2
+    assert "shapes: give IDs, --file, or pipe IDs on stdin" in capsys.readouterr().err
+
+
+def test_cli_active_disruptions(valid_data_path):
+    with Capturing() as output:
+        status = cli(["--format", "json", "disruptions", "active", "--date", "2025-01-01"])
+
+    assert status == 0
+    finish_dates = [json.loads(line)["finish_date"] for line in output]
+    assert finish_dates == sorted(finish_dates)
+    assert finish_dates[0] >= "2025-01-01"
+
+
+def test_cli_active_disruptions_have_started(synthetic_data_path):
+    # The second disruption starts after the chosen day. Both latitudes end in 0,
+    # since Coordinates.parse drops the character before the closing bracket.
+    (synthetic_data_path / "data" / "traffic_disruptions.txt").write_text(
+        "Disruption ID,Date Issued,Start Date,Finish Date,Status,Closure,On Street,From Street,"
+        "To Street,Impact,Duration,Details,Description,Activity Type,Traffic District,Infrastructure,point\n"
+        '1,"Dec 01, 2024","Dec 01, 2024","Jan 10, 2025",Current,,,,,,,,,,,,POINT (-113.5 53.50)\n'
+        '2,"Dec 01, 2024","Jan 05, 2025","Jan 10, 2025",Current,,,,,,,,,,,,POINT (-113.4 53.60)\n'
+    )
+    data = RouteData()
+    with Mute():
+        data.load_disruptions_data("data/traffic_disruptions.txt")
+    assert InteractiveMap.get_active_disruptions(data, date(2025, 1, 1)) == [(53.5, -113.5)]
+
+    with Capturing() as output:
+        status = cli(
+            ["--disruptions", "data/traffic_disruptions.txt", "disruptions", "active", "--date", "2025-01-01"]
+        )
+    assert status == 0
+    assert output == ["2025-01-10\t53.5\t-113.5"]
+
+
+def test_cli_metrics(synthetic_data_path):
+    metrics.registry.reset()
+    with Capturing():
+        assert cli(["--metrics", "metrics.json", "longest", "901", "902"]) == 0
+        assert cli(["--metrics", "metrics.prom", "shapes", "901"]) == 0
+
+    assert not metrics.registry.enabled
+    assert not hasattr(RouteData.get_shape_ids_from_route_id, "__wrapped__")
+    operations = json.loads(Path("metrics.json").read_text())["operations"]
+    assert operations["RouteData.get_longest_shape_from_route_id"]["calls"] == 2
+    text = Path("metrics.prom").read_text()
+    assert 'ets_operation_calls_total{operation="RouteData.get_shape_ids_from_route_id"} 3' in text
+    metrics.registry.reset()
+
+
+def test_toggle_and_save_metrics(monkeypatch, synthetic_route_data, tmp_path):
+    metrics.registry.reset()
+    monkeypatch.setattr("builtins.input", lambda prompt="": str(tmp_path / "metrics.json"))
+    with Capturing() as output:
+        toggle_metrics()
+        InteractiveMap.search(synthetic_route_data.get_routes(), "nowhere", "nowhere")
+        toggle_metrics()
+        InteractiveMap.search(synthetic_route_data.get_routes(), "nowhere", "nowhere")
+        save_metrics()
+
+    assert output == [
+        "Timing queries",
+        "Stopped timing queries",
+        f"Query timings written to {tmp_path / 'metrics.json'}",
+    ]
+    operations = json.loads((tmp_path / "metrics.json").read_text())["operations"]
+    assert operations["InteractiveMap.search"]["calls"] == 1
+    metrics.registry.reset()
+
+
+def test_cli_profile(synthetic_data_path, capsys):
+    assert cli(["--profile", "profiles", "shapes", "901"]) == 0
+    out, err = capsys.readouterr()
+
+    assert out.splitlines() == ["901\t901-1-Dense", "901\t901-2-Long"]
+    assert err.startswith("Profile of shapes saved to profiles/001-shapes.pstats")
+    stats = pstats.Stats("profiles/001-shapes.pstats")
+    assert "__load_trips_data" in {name for _, _, name in stats.stats}
+
+
+def test_main_profiles_next_command(monkeypatch, synthetic_data_path):
+    inputs = iter(["14", "n", "1", "data/trips.txt", "1", "data/trips.txt", "0"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(inputs))
+    with Capturing() as output:
+        main()
+
+    assert "Profiling the next command into profiles" in output
+    assert sum(line.startswith("Profile of option-1 saved to profiles/001-option-1.pstats") for line in output) == 1
+    assert sorted(os.listdir("profiles")) == ["001-option-1.pstats"]
+
+
+def test_memory_report(synthetic_route_data):
+    report = build_memory_report(synthetic_route_data)
+    rows = {row["part"]: row for row in report}
+
+    assert list(rows) == [
+        "routes", "shape coordinates", "disruptions", "distance index", "rankings", "load stats", "total"
+    ]
+    assert rows["routes"]["count"] == 2
+    assert rows["shape coordinates"]["count"] == 9
+    assert rows["disruptions"]["count"] == 0
+    assert rows["shape coordinates"]["bytes_per_entity"] > 0
+    assert rows["total"]["deep_bytes"] == sum(row["deep_bytes"] for row in report[:-1])
+
+    with Capturing() as output:
+        print_memory_report(synthetic_route_data)
+    assert output[0].split() == ["Part", "Count", "Unit", "Deep", "size", "Traced", "Per", "entity"]
+    assert output[2].split()[:4] == ["shape", "coordinates", "9", "coordinates"]
+    assert output[7].startswith("total")
+
+
+def test_cli_memory(synthetic_data_path):
+    shutil.copy(Path(__file__).parent / "test_files/data/traffic_disruptions.txt", "data")
+    with Capturing() as output:
+        assert cli(["--format", "json", "memory", "--build-caches"]) == 0
+
+    rows = {row["part"]: row for row in map(json.loads, output)}
+    assert rows["rankings"]["count"] == 8
+    assert rows["disruptions"]["count"] > 0
+
+
+def test_cli_memory_tsv(synthetic_data_path):
+    shutil.copy(Path(__file__).parent / "test_files/data/traffic_disruptions.txt", "data")
+    with Capturing() as output:
+        assert cli(["memory"]) == 0
+
+    rows = [line.split("\t") for line in output]
+    assert {len(row) for row in rows} == {6}
+    assert rows[-1][:3] == ["total", "", ""]
+    assert rows[-1][-1] == ""
+
+
+def test_cli_missing_file(synthetic_data_path, capsys):
+    assert cli(["--trips", "missing.txt", "shapes", "901"]) == 1
+    assert capsys.readouterr().err == "IOError: Couldn't open missing.txt\n"
+
+
+def test_cli_render(synthetic_data_path):
+    shutil.copy(Path(__file__).parent / "test_files/data/traffic_disruptions.txt", "data")
+    with Capturing() as output:
+        status = cli(["render", "--all", "--out", "data", "--image-format", "svg", "--no-background"])
+
+    assert status == 0
+    assert output == ["901\tdata/route_901.svg", "902\tdata/route_902.svg"]
+    svg = (synthetic_data_path / "data/route_901.svg").read_text()
+    # Route 901 is drawn from its shape with the most coordinates, like the interactive map
+    assert svg.count("<polyline") == 1
+
+
+def test_render_routes_raster(synthetic_route_data, tmp_path):
+    with Mute():
+        synthetic_route_data.load_disruptions_data(
+            str(Path(__file__).parent / "test_files/data/traffic_disruptions.txt")
+        )
+    paths = MapRenderer.render_routes(
+        synthetic_route_data, ["902", "999"], str(tmp_path), "ppm", background=False, day=date(2025, 1, 1)
+    )
+    assert paths == {"902": str(tmp_path / "route_902.ppm")}
+    content = (tmp_path / "route_902.ppm").read_bytes()
+    assert content.startswith(b"P6\n800 920\n255\n")
+    assert bytes([0, 0, 255]) in content
+    assert bytes([255, 0, 0]) in content
+
+
+def test_map_session_binds_events(map_session):
+    map_session.run()
+    assert map_session.win.mouse_handler == map_session.on_click
+    assert map_session.win.wheel_handler == map_session.on_wheel
+    assert map_session.win.drag_handler == map_session.on_drag
+    assert set(map_session.win.keys) == {"Return", "Escape", "h"}
+    # Pressing on the controls doesn't pan the map
+    assert not map_session.win.starts_drag(100, 115)
+    assert map_session.win.starts_drag(400, 115)
+    assert map_session.win.starts_drag(100, 600)
+
+
+def test_map_session_keeps_controls_on_top(map_session):
+    from graphics4 import Point
+
+    for _ in range(2):
+        map_session.from_entry_box.setText("university")
+        map_session.to_entry_box.setText("downtown")
+        map_session.on_click(Point(100, 115))
+        map_session.on_clear()
+    map_session.from_entry_box.setText("university")
+    map_session.to_entry_box.setText("downtown")
+    map_session.on_click(Point(100, 115))
+    assert map_session.win.raised[-2:] == ["layer:route:901", "ui"]
+
+    map_session.redraw()
+    assert map_session.win.raised[-1] == "ui"
+    assert "ui" in map_session.win.items[map_session.trace_label.id][2]
+
+
+def test_map_session_trace_invalid_path(map_session, capsys):
+    map_session.trace_path = "missing/trace.json"
+    map_session.run()
+    assert capsys.readouterr().out == "IOError: Couldn't save to missing/trace.json\n"
+
+
+def test_map_session_traces_redraws(map_session):
+    map_session.redraw()
+    map_session.redraw()
+
+    tracer = map_session.redraw_tracer
+    assert tracer.histograms["total"].count == 2
+    assert set(tracer.last) == set(MapSession.redraw_stages) | {"total"}
+    assert map_session.trace_label.getText().splitlines()[-1].startswith("redraw p95 ")
+    assert map_session.trace_label.getText().endswith(f"of {MapSession.frame_budget_ms} ms")
+
+
+def test_map_session_search(map_session):
+    from graphics4 import Point
+
+    map_session.from_entry_box.setText(" University ")
+    map_session.to_entry_box.setText("downtown")
+    map_session.on_click(Point(100, 115))
+
+    assert map_session.drawn == ["901"]
+    assert map_session.feedback_label.get() == "Drawing route 901"
+
+
+def test_map_session_traces_search(map_session, tmp_path):
+    from graphics4 import Point
+
+    map_session.from_entry_box.setText("university")
+    map_session.to_entry_box.setText("downtown")
+    map_session.on_click(Point(100, 115))
+    map_session.on_click(Point(100, 115))
+    map_session.from_entry_box.setText("nowhere")
+    map_session.on_click(Point(100, 115))
+
+    tracer = map_session.tracer
+    assert tracer.histograms["total"].count == 3
+    assert tracer.histograms["longest shape"].count == 1
+    assert tracer.histograms["search"].count == 3
+    assert set(tracer.last) == {"search", "flush", "total"}
+    assert map_session.win.flushes == 3
+    lines = map_session.trace_label.getText().splitlines()
+    assert [line.split()[0] for line in lines] == ["stage", "search", "longest", "projection", "canvas", "flush", "total"]
+    assert lines[2].split()[2] == "-"
+
+    map_session.trace_path = str(tmp_path / "trace.json")
+    map_session.run()
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [event["name"] for event in events if event["cat"] == "frame"] == ["Search"] * 3
+    assert {event["name"] for event in events if event["cat"] == "stage"} == set(MapSession.trace_stages)
+
+
+def test_map_session_reuses_drawn_routes(map_session):
+    map_session.from_entry_box.setText("downtown")
+    map_session.on_search()
+    map_session.on_clear()
+    assert map_session.layers.has("route:902")
+    assert not map_session.layers.isVisible("route:902")
+
+    map_session.from_entry_box.setText("downtown")
+    map_session.on_search()
+    assert map_session.drawn == ["902"]
+    assert map_session.layers.isVisible("route:902")
+    assert map_session.feedback_label.get() == "Showing route 902"
+
+
+def test_map_session_search_not_found(map_session):
+    map_session.from_entry_box.setText("nowhere")
+    map_session.on_search()
+
+    assert map_session.drawn == []
+    assert map_session.feedback_label.get() == "NOT FOUND"
+
+
+def test_map_session_clear(map_session):
+    from graphics4 import Point
+
+    map_session.from_entry_box.setText("downtown")
+    map_session.feedback_label.setText("NOT FOUND")
+    map_session.on_click(Point(100, 140))
+
+    assert map_session.from_entry_box.get() == ""
+    assert map_session.feedback_label.get() == ""
+
+
+def route_lines(session, route_id):
+    """Return the coordinates of the drawn lines of a route in a MapSession with a FakeWin"""
+    return [coords for kind, coords, tags in session.win.items.values() if f"layer:route:{route_id}" in tags]
+
+
+def test_viewport_zoom_and_pan():
+    viewport = Viewport(800, 920)
+    assert not viewport.zoom_at(400, 460, -1)
+
+    # The point under the mouse stays in place
+    assert viewport.zoom_at(400, 460, 1)
+    assert (viewport.zoom, viewport.x, viewport.y) == (2, 400, 460)
+    assert viewport.zoom_at(400, 460, 5)
+    assert (viewport.zoom, viewport.x, viewport.y) == (4, 1200, 1380)
+    assert viewport.get_bounds() == (1200, 1380, 2000, 2300)
+
+    # The window can't be moved past the edges of the map
+    assert viewport.pan(100000, -100000)
+    assert (viewport.x, viewport.y) == (0, 2760)
+    assert not viewport.pan(1, 0)
+    assert viewport.zoom_at(0, 0, -5)
+    assert (viewport.zoom, viewport.x, viewport.y) == (1, 0, 0)
+
+
+def test_shape_index_visible_lines():
+    index = ShapeIndex([(53.55, -113.45), (53.55, -113.40), (53.55, -113.45)])
+    viewport = Viewport(800, 920)
+    assert index.get_visible_lines(viewport) == [[540, 374, 640, 374, 540, 374]]
+
+    # Zoomed into the top left corner, the shape is off screen
+    viewport.zoom_at(0, 0, 1)
+    assert index.get_visible_lines(viewport) == []
+    viewport.pan(-600, -400)
+    assert index.get_visible_lines(viewport) == [[481, 348, 681, 348, 481, 348]]
+
+
+def test_shape_index_simplifies_hidden_detail():
+    # The middle points are less than a pixel from the straight line at every zoom level
+    index = ShapeIndex([(53.50, -113.50), (53.501, -113.50), (53.502, -113.50), (53.503, -113.50)])
+    viewport = Viewport(800, 920)
+    assert len(index.get_visible_lines(viewport)[0]) == 4
+    viewport.zoom_at(400, 460, 2)
+    assert len(index.get_visible_lines(viewport)[0]) == 4
+
+
+def test_point_index_visible_clusters():
+    index = PointIndex({0: (53.55, -113.45), 1: (53.553, -113.45), 2: (53.40, -113.70)}, 800, 920)
+    viewport = Viewport(800, 920)
+    assert index.get_visible_clusters(viewport) == [(40, 898, 1), (540, 368, 2)]
+
+    # Zoomed in, the two close points are split and the far point is culled
+    viewport.zoom_at(540, 374, 1)
+    assert index.get_visible_clusters(viewport) == [(541, 353, 1), (541, 374, 1)]
+
+
+def test_point_index_add_remove():
+    index = PointIndex({0: (53.55, -113.45)}, 800, 920)
+    viewport = Viewport(800, 920)
+    assert index.get_visible_clusters(viewport) == [(540, 374, 1)]
+    index.add(1, (53.553, -113.45))
+    assert index.get_visible_clusters(viewport) == [(540, 368, 2)]
+    index.remove(0)
+    assert index.get_visible_clusters(viewport) == [(540, 363, 1)]
+
+
+def test_map_session_clusters_disruptions(monkeypatch, map_session):
+    today = date.today()
+    disruptions = {
+        Disruption(today, Coordinates(53.55, -113.45)),
+        Disruption(today, Coordinates(53.5501, -113.4501)),
+        Disruption(today, Coordinates(53.40, -113.70)),
+        Disruption(date(2000, 1, 1), Coordinates(53.45, -113.60)),
+    }
+    monkeypatch.setattr(map_session.data, "get_disruptions", lambda: disruptions)
+    map_session.load_disruptions()
+    map_session.draw_disruptions()
+
+    items = [(kind, coords) for kind, coords, tags in map_session.win.items.values() if "layer:disruptions" in tags]
+    assert sorted(items) == [
+        ("oval", [37, 895, 43, 901]),
+        ("oval", [531, 365, 549, 383]),
+        ("text", [540, 374]),
+    ]
+
+
+def test_disruption_timeline():
+    disruptions = [
+        Disruption(date(2025, 1, 10), Coordinates(53.5, -113.5), date(2025, 1, 1)),
+        Disruption(date(2025, 1, 5), Coordinates(53.5, -113.5), date(2025, 1, 5)),
+        # A disruption without a start date is in effect until it finishes
+        Disruption(date(2025, 1, 3), Coordinates(53.5, -113.5)),
+    ]
+    timeline = DisruptionTimeline(disruptions, date(2024, 12, 31))
+    assert timeline.active == {2}
+    assert timeline.get_bounds() == (date(2025, 1, 1), date(2025, 1, 10))
+
+    assert timeline.set_day(date(2025, 1, 5)) == ([0, 1], [2])
+    assert timeline.set_day(date(2025, 1, 6)) == ([], [1])
+    # Disruptions that start and finish between both days aren't reported
+    assert timeline.set_day(date(2025, 1, 2)) == ([2], [])
+    assert timeline.active == {0, 2}
+    assert timeline.set_day(date(2025, 2, 1)) == ([], [0, 2])
+    assert timeline.set_day(date(2025, 1, 1)) == ([0, 2], [])
+
+    # Every other view of active disruptions agrees with the timeline
+    for offset in range(-2, 14):
+        day = date(2025, 1, 1) + timedelta(days=offset)
+        timeline.set_day(day)
+        assert timeline.active == {i for i, disruption in enumerate(disruptions) if disruption.is_in_effect(day)}
+
+
+def test_map_session_set_day(monkeypatch, map_session):
+    today = date.today()
+    disruptions = [
+        Disruption(today + timedelta(days=1), Coordinates(53.55, -113.45), today - timedelta(days=1)),
+        Disruption(today + timedelta(days=10), Coordinates(53.40, -113.70), today + timedelta(days=5)),
+    ]
+    monkeypatch.setattr(map_session.data, "get_disruptions", lambda: disruptions)
+    map_session.load_disruptions()
+
+    def markers():
+        map_session.draw_disruptions()
+        return [coords for kind, coords, tags in map_session.win.items.values() if "layer:disruptions" in tags]
+
+    assert markers() == [[537, 371, 543, 377]]
+    map_session.on_day(7)
+    assert map_session.day == today + timedelta(days=7)
+    assert markers() == [[37, 895, 43, 901]]
+    map_session.on_day(0)
+    assert markers() == [[537, 371, 543, 377]]
+
+
+def test_map_session_zoom_redraws_routes(map_session):
+    from graphics4 import Point
+
+    map_session.from_entry_box.setText("downtown")
+    map_session.on_search()
+    assert route_lines(map_session, "902") == [[540, 374, 640, 374, 540, 374]]
+
+    # Zooming into the top left corner culls the route
+    map_session.on_wheel(Point(0, 0), 1)
+    assert map_session.viewport.zoom == 2
+    assert route_lines(map_session, "902") == []
+
+    # A hidden route is redrawn for the new viewport when it is shown again
+    map_session.on_clear()
+    map_session.on_drag(-600, -400)
+    assert "route:902" in map_session.stale
+    map_session.from_entry_box.setText("downtown")
+    map_session.on_search()
+    assert route_lines(map_session, "902") == [[481, 348, 681, 348, 481, 348]]
+    assert map_session.drawn == ["902"]
+    assert not map_session.redraw_pending
+
+
+def test_map_session_heatmap(monkeypatch, map_session):
+    from graphics4 import Image, Text
+
+    overlays = []
+
+    def from_data(p, data, scale):
+        overlays.append((p.getX(), p.getY(), scale))
+        return Text(p, "")
+
+    monkeypatch.setattr(Image, "fromData", staticmethod(from_data))
+    map_session.on_heatmap()
+    assert map_session.heatmap_mode == "disruptions"
+    # There are no disruptions to draw
+    assert overlays == []
+
+    map_session.on_heatmap()
+    assert map_session.feedback_label.get() == "Heatmap of routes"
+    assert overlays == [(400, 460, 4)]
+    xs, ys = map_session.get_heatmap_points()
+    # Both routes are sampled every 4 pixels along their longest shape
+    assert len(xs) > 50
+    assert min(xs) >= 0 and max(ys) <= 920
+
+    map_session.on_heatmap()
+    assert map_session.heatmap_mode is None
+    assert not map_session.layers.has("heatmap")
+
+
+def test_map_session_heatmap_key_ignores_typing(map_session):
+    import tkinter
+    from types import SimpleNamespace
+
+    map_session.run()
+    # An Entry without a display, since only its type is checked
+    entry = tkinter.Entry.__new__(tkinter.Entry)
+    # Typing "southgate heritage" sends two h presses
+    for _ in range(2):
+        map_session.win.keys["h"](SimpleNamespace(widget=entry))
+    assert map_session.heatmap_mode is None
+
+    map_session.win.keys["h"](SimpleNamespace(widget=map_session.win))
+    assert map_session.heatmap_mode == map_session.heatmap_modes[1]
+
+
+def test_map_session_heatmap_releases_images(monkeypatch, map_session):
+    from graphics4 import GraphicsObject, Image
+
+    def from_data(p, data, scale):
+        # An Image holding the PNG bytes instead of a Tk photo image, which needs a display
+        image = Image.__new__(Image)
+        GraphicsObject.__init__(image, [])
+        image.anchor = p.clone()
+        image.imageId = Image.idCount
+        Image.idCount += 1
+        image.img = data
+        return image
+
+    monkeypatch.setattr(Image, "fromData", staticmethod(from_data))
+    monkeypatch.setattr(Image, "imageCache", {})
+    map_session.heatmap_mode = "routes"
+    for _ in range(3):
+        map_session.redraw()
+        assert len(Image.imageCache) == 1
+
+    map_session.on_heatmap()
+    assert map_session.heatmap_mode is None
+    assert Image.imageCache == {}
+
+
+def test_background_loader(monkeypatch, synthetic_data_path):
+    monkeypatch.setattr(RouteData, "progress_rows", 2)
+    data = RouteData()
+    loader = BackgroundLoader(data)
+    loader.start([("trips", "data/trips.txt"), ("shapes", "missing.txt"), ("shapes", "data/shapes.txt")])
+    loader.thread.join()
+
+    messages = loader.poll()
+    size = os.path.getsize("data/trips.txt")
+    last_row = len("902,1,3,Downtown,0,1,902-1-Loop\n")
+    assert messages[:3] == [
+        ("progress", "trips", size - last_row, size, 2),
+        ("progress", "trips", size, size, 3),
+        ("loaded", "trips", "data/trips.txt"),
+    ]
+    assert ("error", "shapes", "missing.txt", "IOError: Couldn't open missing.txt") in messages
+    assert messages[-2:] == [("loaded", "shapes", "data/shapes.txt"), ("done",)]
+    assert data.routes_loaded() and data.shapes_loaded()
+    assert loader.poll() == []
+
+
+def test_background_loader_reports_malformed_files(synthetic_data_path):
+    Path("bad_shapes.txt").write_text("shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n1,north,west,1\n")
+    data = RouteData()
+    loader = BackgroundLoader(data)
+    loader.start([("shapes", "bad_shapes.txt"), ("trips", "data/trips.txt")])
+    loader.thread.join()
+
+    messages = loader.poll()
+    assert messages[0] == (
+        "error",
+        "shapes",
+        "bad_shapes.txt",
+        "Couldn't load bad_shapes.txt: ValueError: could not convert string to float: 'north'",
+    )
+    assert messages[-2:] == [("loaded", "trips", "data/trips.txt"), ("done",)]
+    assert not data.shapes_loaded()
+
+
+def test_map_session_loads_in_background(synthetic_data_path, map_session):
+    # The window opens before any data is loaded
+    map_session.data = RouteData()
+    map_session.load_in_background([("trips", "data/trips.txt"), ("shapes", "missing.txt")])
+    map_session.loader.thread.join()
+    map_session.win.run_scheduled()
+
+    assert map_session.loader is None
+    assert map_session.data.routes_loaded()
+    assert map_session.progress_label.getText() == "IOError: Couldn't open missing.txt"
+    assert map_session.win.scheduled == []
+
+
 def test_save_routes_valid_path(monkeypatch, complete_route_data, empty_data_path):
     monkeypatch.setattr("builtins.input", lambda prompt="": "data/etsdata.p")
     expected = [
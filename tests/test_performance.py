@@ -0,0 +1,61 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from perf_gate import QUICK_RUNS, QUICK_THRESHOLD, absolute_time, collect, compare, load_baseline, relative_time
+
+
+def test_compare_flags_only_regressions_past_threshold():
+    baseline = {"threshold": 0.25, "metrics": {"load_s": 1.0, "query_s": 2.0, "dropped_s": 1.0}}
+    current = {"load_s": 1.2, "query_s": 2.6, "new_s": 5.0}
+
+    regressions = compare(current, baseline)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("query_s: 2.6 is 30% above the baseline 2")
+
+
+def test_compare_timing_threshold():
+    baseline = {"threshold": 0.25, "metrics": {"load_ref": 1.0, "load_s": 1.0, "bytes_per_coordinate": 100}}
+    current = {"load_ref": 1.9, "load_s": 2.1, "bytes_per_coordinate": 130}
+
+    regressions = compare(current, baseline, 1.0)
+    # Timings may double, but memory still has the baseline's threshold
+    assert [line.split(":")[0] for line in regressions] == ["load_s", "bytes_per_coordinate"]
+
+
+def test_relative_time_is_per_operation():
+    calls = []
+    ratio = relative_time(lambda: calls.append(1), 3, ops=10)
+    # One warm up call and three timed calls, each far quicker than the reference workload
+    assert len(calls) == 4
+    assert 0 <= ratio < 0.01
+
+
+def test_absolute_time_is_per_call():
+    calls = []
+    seconds = absolute_time(lambda: calls.append(1), 3)
+    assert len(calls) == 4
+    assert 0 <= seconds < 0.01
+
+
+def test_no_relative_performance_regressions():
+    # Timings relative to the reference workload and memory hold on any machine, so they always run
+    baseline = load_baseline()
+    metrics = collect(baseline["scale"], QUICK_RUNS, absolute=False)
+    assert not any(name.endswith("_s") for name in metrics)
+    regressions = compare(metrics, baseline, QUICK_THRESHOLD)
+    assert not regressions, "\n".join(regressions)
+
+
+@pytest.mark.skipif(
+    not os.environ.get("ETS_PERF"), reason="set ETS_PERF=1 to also compare load times in seconds with the baseline"
+)
+def test_no_performance_regressions():
+    baseline = load_baseline()
+    metrics = collect(baseline["scale"], baseline["runs"])
+    regressions = compare(metrics, baseline)
+    assert not regressions, "\n".join(regressions)
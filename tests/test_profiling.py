@@ -0,0 +1,51 @@
+import cProfile
+import io
+import pstats
+
+from profiling import CommandProfiler, hot_functions
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+def test_profiler_off_runs_normally(tmp_path):
+    profiler = CommandProfiler(str(tmp_path / "profiles"))
+    assert profiler.run("busy", busy, 10) == 285
+    assert not (tmp_path / "profiles").exists()
+
+
+def test_profiler_next_then_off(tmp_path):
+    stream = io.StringIO()
+    profiler = CommandProfiler(str(tmp_path), "next", stream)
+    assert profiler.run("first", busy, 1000) == busy(1000)
+    assert profiler.mode is None
+    profiler.run("second", busy, 1000)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["001-first.pstats"]
+    lines = stream.getvalue().splitlines()
+    assert lines[0].startswith(f"Profile of first saved to {tmp_path / '001-first.pstats'}")
+    assert len(lines) <= 2 + CommandProfiler.top
+    assert any("busy" in line for line in lines[2:])
+
+
+def test_profiler_all_saves_on_error(tmp_path):
+    profiler = CommandProfiler(str(tmp_path), "all", io.StringIO())
+    profiler.run("one", busy, 10)
+    try:
+        profiler.run("two", busy, "10")
+    except TypeError:
+        pass
+
+    assert profiler.mode == "all"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["001-one.pstats", "002-two.pstats"]
+
+
+def test_hot_functions_sorted_by_own_time():
+    profile = cProfile.Profile()
+    profile.runcall(busy, 20000)
+    lines = hot_functions(pstats.Stats(profile), 2)
+
+    assert len(lines) == 2
+    own_times = [float(line.split()[0]) for line in lines]
+    assert own_times == sorted(own_times, reverse=True)
@@ -0,0 +1,98 @@
+# type: ignore
+from renderer import *
+import struct
+import zlib
+import pytest
+
+
+def test_to_rgb():
+    assert to_rgb("red") == (255, 0, 0)
+    assert to_rgb("#10ff20") == (16, 255, 32)
+    assert to_rgb((1, 2, 3)) == (1, 2, 3)
+
+
+def test_png_round_trip(tmp_path):
+    canvas = RasterCanvas(20, 10, color="white")
+    canvas.draw_polyline([(0, 5), (19, 5)], "blue", 1)
+    canvas.draw_circle(10, 2, 1, "red")
+    path = str(tmp_path / "out.png")
+    canvas.save(path)
+
+    width, height, pixels = read_png(path)
+    assert (width, height) == (20, 10)
+    assert pixels == bytes(canvas.pixels)
+
+
+def test_read_png_undoes_filters(tmp_path):
+    # Hand encode one RGBA row for each filter type and check they decode the same
+    width = 3
+    rows = [bytes([10, 20, 30, 255] * width)] * 5
+    raw = b"\x00" + rows[0]
+    raw += b"\x01" + bytes([10, 20, 30, 255] + [0, 0, 0, 0] * (width - 1))
+    raw += b"\x02" + bytes(4 * width)
+    raw += b"\x03" + bytes([5, 10, 15, 128] + [0, 0, 0, 0] * (width - 1))
+    raw += b"\x04" + bytes(4 * width)
+    png = encode_png(width, 5, b"", channels=4)
+    # Swap in the filtered image data
+    header = png[: png.index(b"IDAT") - 4]
+    body = zlib.compress(raw)
+    chunk = struct.pack(">I", len(body)) + b"IDAT" + body + struct.pack(">I", zlib.crc32(b"IDAT" + body))
+    path = tmp_path / "filters.png"
+    path.write_bytes(header + chunk + png[png.index(b"IEND") - 4 :])
+
+    _, _, pixels = read_png(str(path))
+    assert pixels == bytes([10, 20, 30] * width * 5)
+
+
+def test_thick_polyline_and_outlined_circle():
+    canvas = RasterCanvas(10, 10, color="white")
+    canvas.draw_polyline([(5, 0), (5, 9)], "blue", 4)
+    blue = [x for x in range(10) if canvas.pixels[(3 * 10 + x) * 3 : (3 * 10 + x) * 3 + 3] == bytes([0, 0, 255])]
+    assert blue == [3, 4, 5, 6]
+
+    canvas = RasterCanvas(10, 10, color="white")
+    canvas.draw_circle(5, 5, 3, "red", outline="black")
+    assert canvas.pixels[(5 * 10 + 5) * 3 : (5 * 10 + 5) * 3 + 3] == bytes([255, 0, 0])
+    assert canvas.pixels[(5 * 10 + 2) * 3 : (5 * 10 + 2) * 3 + 3] == bytes([0, 0, 0])
+    assert canvas.pixels[:3] == bytes([255, 255, 255])
+
+
+def test_drawing_off_canvas_is_clipped():
+    canvas = RasterCanvas(5, 5)
+    canvas.draw_polyline([(-10, -10), (20, 20)], "red", 4)
+    canvas.draw_circle(-2, 7, 3, "blue")
+    assert len(canvas.pixels) == 5 * 5 * 3
+
+
+def test_ppm(tmp_path):
+    canvas = RasterCanvas(4, 3, color="red")
+    path = str(tmp_path / "out.ppm")
+    canvas.save(path)
+    with open(path, "rb") as f:
+        assert f.read() == b"P6\n4 3\n255\n" + bytes([255, 0, 0]) * 12
+
+
+def test_svg(tmp_path):
+    # A background wider and shorter than the drawing is centred on it without scaling, like RasterCanvas
+    (tmp_path / "map.png").write_bytes(encode_png(120, 30, bytes(120 * 30 * 3)))
+    canvas = SvgCanvas(100, 50, background=str(tmp_path / "map.png"))
+    canvas.draw_polyline([(1, 2), (3, 4)], "blue", 4)
+    copy = canvas.copy()
+    copy.draw_circle(5, 6, 3, "red", outline="black")
+    path = str(tmp_path / "out.svg")
+    copy.save(path)
+
+    content = open(path).read()
+    assert '<image href="map.png" x="-10" y="10" width="120" height="30"/>' in content
+    assert '<polyline points="1,2 3,4" fill="none" stroke="blue" stroke-width="4"' in content
+    assert '<circle cx="5" cy="6" r="3" fill="red" stroke="black"/>' in content
+    assert len(canvas.elements) == 1
+
+
+def test_read_png_without_header(tmp_path):
+    path = tmp_path / "broken.png"
+    path.write_bytes(PNG_SIGNATURE + struct.pack(">I", 0) + b"IEND" + struct.pack(">I", zlib.crc32(b"IEND")))
+    with pytest.raises(ValueError, match="has no PNG header"):
+        read_png(str(path))
+    with pytest.raises(ValueError, match="has no PNG header"):
+        read_png_size(str(path))
@@ -0,0 +1,40 @@
+import hashlib
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from CMPT_Milestone2_EP_HM import RouteData
+from synthetic_feed import feed_size, write_feed
+
+
+def digest(paths):
+    return {kind: hashlib.sha256(Path(path).read_bytes()).hexdigest() for kind, path in paths.items()}
+
+
+def test_feed_is_deterministic(tmp_path):
+    first = write_feed(str(tmp_path / "a"), 0.05, seed=3)
+    second = write_feed(str(tmp_path / "b"), 0.05, seed=3)
+    other = write_feed(str(tmp_path / "c"), 0.05, seed=4)
+
+    assert digest(first) == digest(second)
+    assert digest(first) != digest(other)
+
+
+def test_feed_loads(monkeypatch, tmp_path):
+    paths = write_feed(str(tmp_path), 0.05)
+    size = feed_size(0.05)
+    monkeypatch.chdir(tmp_path)
+    data = RouteData()
+    data.load_trips_data(paths["trips"])
+    data.load_shapes_data(paths["shapes"])
+    data.load_disruptions_data(paths["disruptions"])
+
+    stats = data.load_stats()
+    assert stats["trips"].rows == size["trip_rows"]
+    assert stats["shapes"].rows == size["shape_rows"]
+    assert len(data.get_routes()) == size["routes"]
+    assert len(data.get_disruptions()) == size["disruptions"]
+    assert all(route.locations for route in data.get_routes())
+    shape_id, points = data.get_longest_shape_from_route_id("001")
+    assert shape_id.startswith("001-")
@@ -0,0 +1,68 @@
+import json
+
+from tracing import FrameTracer
+
+
+def test_stages_outside_of_a_frame_are_not_timed():
+    tracer = FrameTracer(["draw"])
+    with tracer.stage("draw"):
+        pass
+
+    assert tracer.end() is None
+    assert tracer.histograms["draw"].count == 0
+    assert tracer.breakdown()[1].split() == ["draw", "-", "-"]
+
+
+def test_frame_times_add_up_repeated_stages():
+    tracer = FrameTracer(["search", "draw"])
+    tracer.begin("Search")
+    with tracer.stage("draw"):
+        pass
+    with tracer.stage("draw"):
+        pass
+    times = tracer.end()
+
+    assert set(times) == {"draw", "total"}
+    assert times["draw"] <= times["total"]
+    assert tracer.histograms["draw"].count == 1
+    assert tracer.histograms["search"].count == 0
+    assert [line.split()[0] for line in tracer.breakdown()] == ["stage", "search", "draw", "total"]
+    assert tracer.breakdown()[1].split() == ["search", "-", "-"]
+
+
+def test_begin_ends_the_unfinished_frame():
+    tracer = FrameTracer(["search"])
+    tracer.begin("first")
+    tracer.begin("second")
+    tracer.end()
+
+    assert [frame[0] for frame in tracer.frames] == ["first", "second"]
+    assert tracer.histograms["total"].count == 2
+
+
+def test_chrome_trace(tmp_path):
+    tracer = FrameTracer(["search"])
+    tracer.begin("Search")
+    with tracer.stage("search"):
+        pass
+    tracer.end()
+    tracer.write(str(tmp_path / "trace.json"))
+
+    frame, stage = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert (frame["name"], frame["cat"], frame["ph"]) == ("Search", "frame", "X")
+    assert (stage["name"], stage["cat"]) == ("search", "stage")
+    assert frame["ts"] <= stage["ts"]
+    assert stage["ts"] + stage["dur"] <= frame["ts"] + frame["dur"]
+
+
+def test_chrome_trace_of_several_tracers(tmp_path):
+    searches = FrameTracer(["search"])
+    redraws = FrameTracer(["flush"])
+    searches.begin("Search")
+    searches.end()
+    redraws.begin("Redraw")
+    redraws.end()
+    searches.write(str(tmp_path / "trace.json"), redraws)
+
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [event["name"] for event in events] == ["Search", "Redraw"]
@@ -0,0 +1,184 @@
+"""Stage timings of interactive frames, such as drawing a searched route
+
+A frame is one response to the user, timed from when it begins to when it
+ends, split into named stages. The time of each stage is kept in a latency
+histogram so the last frame can be compared with the 95th percentile, and
+the most recent frames can be written in the Chrome trace event format for
+chrome://tracing or Perfetto.
+"""
+
+import json
+import os
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter_ns
+from typing import Iterator, Sequence
+
+from metrics import Histogram
+
+
+class FrameTracer:
+    """Times the stages of each frame with perf_counter_ns"""
+
+    # The number of most recent frames kept for the trace log
+    keep = 500
+
+    def __init__(self, stages: Sequence[str]):
+        """
+        purpose:
+            Constructs a FrameTracer object
+        parameters:
+            stages: The names of the stages in the order they are shown
+        returns:
+            None
+        """
+        self.stages = tuple(stages)
+        # Maps each stage and "total" with the histogram of its time in nanoseconds
+        self.histograms: dict[str, Histogram] = {name: Histogram() for name in self.stages + ("total",)}
+        # The (name, start, end, [(stage, start, end), ...]) times of the most recent frames
+        self.frames: deque[tuple[str, int, int, list[tuple[str, int, int]]]] = deque(maxlen=self.keep)
+        # The name, start time and stage spans of the frame being timed
+        self.current: tuple[str, int, list[tuple[str, int, int]]] | None = None
+        # The time of each stage of the last finished frame
+        self.last: dict[str, int] = {}
+
+    def __repr__(self) -> str:
+        return f"FrameTracer({list(self.stages)!r})"
+
+    def begin(self, name: str) -> None:
+        """
+        purpose:
+            Starts timing a frame. A frame that is still being timed is ended first.
+        parameters:
+            name: The name of the frame in the trace log
+        returns:
+            None
+        """
+        if self.current:
+            self.end()
+        self.current = (name, perf_counter_ns(), [])
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        purpose:
+            Times the body of a with block as a stage of the current frame.
+            Nothing is timed when no frame has begun, so shared drawing code can always use it.
+        parameters:
+            name: The name of the stage
+        returns:
+            A context manager
+        """
+        if self.current is None:
+            yield
+            return
+        spans = self.current[2]
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            spans.append((name, start, perf_counter_ns()))
+
+    def end(self) -> dict[str, int] | None:
+        """
+        purpose:
+            Finishes timing the current frame
+        parameters:
+            None
+        returns:
+            The nanoseconds spent in each stage of the frame and its "total".
+            Returns None if no frame has begun.
+        """
+        if self.current is None:
+            return None
+        name, start, spans = self.current
+        end = perf_counter_ns()
+        self.current = None
+
+        times: dict[str, int] = {}
+        for stage, stage_start, stage_end in spans:
+            times[stage] = times.get(stage, 0) + stage_end - stage_start
+        times["total"] = end - start
+        for stage, time in times.items():
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.record(time)
+        self.frames.append((name, start, end, spans))
+        self.last = times
+        return times
+
+    def breakdown(self) -> list[str]:
+        """
+        purpose:
+            Formats the last frame and the 95th percentile of every frame in milliseconds
+        parameters:
+            None
+        returns:
+            A header line, then one line for each stage and one for the total.
+            Stages missing from the last frame show "-".
+        """
+        lines = [f"{'stage':<13}{'last':>7}{'p95':>7}"]
+        for stage in self.stages + ("total",):
+            histogram = self.histograms[stage]
+            last = f"{self.last[stage] / 1e6:.1f}" if stage in self.last else "-"
+            p95 = f"{histogram.percentile(95) / 1e6:.1f}" if histogram.count else "-"
+            lines.append(f"{stage:<13}{last:>7}{p95:>7}")
+        return lines
+
+    def to_chrome(self) -> dict:
+        """
+        purpose:
+            Converts the kept frames into Chrome trace events. Each frame is a complete event
+            with its stages nested inside it. Times are in microseconds.
+        parameters:
+            None
+        returns:
+            A dictionary in the JSON object format of the trace event format
+        """
+        pid = os.getpid()
+        events = []
+        for name, start, end, spans in self.frames:
+            events.append(self.__event(name, "frame", start, end, pid))
+            for stage, stage_start, stage_end in spans:
+                events.append(self.__event(stage, "stage", stage_start, stage_end, pid))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: str, *others: "FrameTracer") -> None:
+        """
+        purpose:
+            Writes the kept frames to a Chrome trace event JSON file
+        parameters:
+            path: The path of the file
+            others: More tracers whose frames are written to the same file
+        returns:
+            None
+        """
+        trace = self.to_chrome()
+        for other in others:
+            trace["traceEvents"].extend(other.to_chrome()["traceEvents"])
+        with open(path, "w") as f:
+            json.dump(trace, f)
+
+    @staticmethod
+    def __event(name: str, category: str, start: int, end: int, pid: int) -> dict:
+        """
+        purpose:
+            Creates a complete trace event
+        parameters:
+            name: The name shown on the event
+            category: The category of the event
+            start, end: The perf_counter_ns times the event started and ended
+            pid: The process ID
+        returns:
+            The event dictionary
+        """
+        return {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start / 1000,
+            "dur": (end - start) / 1000,
+            "pid": pid,
+            "tid": 0,
+        }